@@ -19,6 +19,7 @@ from b3.core.composite import Composite
 from b3.core.decorator import Decorator
 from b3.core.action import Action
 from b3.core.condition import Condition
+from b3.core.profiler import Profiler
 
 # COMPOSITES
 from b3.composites.sequence import Sequence
@@ -26,6 +27,8 @@ from b3.composites.priority import Priority
 from b3.composites.mempriority import MemPriority
 from b3.composites.memsequence import MemSequence
 from b3.composites.ornode import OrNode
+from b3.composites.parallelornode import ParallelOrNode
+from b3.composites.utilitypriority import UtilityPriority
 
 # ACTIONS
 from b3.actions.succeeder import Succeeder
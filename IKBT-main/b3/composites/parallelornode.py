@@ -0,0 +1,257 @@
+import b3
+import copy
+import itertools
+import multiprocessing as mp
+
+# OrNode whose children run at the same time in worker processes
+#
+#   Like OrNode, every child is ticked and the result is SUCCESS if any
+#   child succeeds.  The children must not depend on each other's writes
+#   (e.g. tan and sincos ID+solve, which only add their own solutions to
+#   the current unknown).
+#
+#   Each worker is fork()ed, so it starts with a copy of the blackboard as
+#   it was before any child ran.  It ticks one child and sends back what
+#   it changed:
+#
+#     - the objects under the `merge` blackboard keys (list items appended,
+#       text appended to strings, items added to sets, other attributes
+#       set), or the new object if the key was set to a different one
+#     - the 'TotalCost' added by the nodes
+#     - the node memory (e.g. is_open) of the child's subtree
+#     - the entries added to the `memos` dicts (module level memos, e.g.
+#       helperfunctions.expr_index_memo)
+#     - the node statistics of the child's subtree
+#     - with a tree profiler, the timings of the child's subtree (the
+#       worker has a b3.Profiler of its own, merged into the tree's one)
+#
+#   Setting any other blackboard key to a different object raises
+#   ValueError.  Changes made in place to objects under other keys are
+#   not seen, so are lost: put their keys in `merge`.
+#
+#   The changes are applied child by child in the children's order, so
+#   the result does not depend on which worker finishes first, and is the
+#   same as running the children one after the other.  The one thing a
+#   child can't see is text an earlier child appended to a string (e.g.
+#   u.solvemethod, where the leaves add ', ' if it is not empty): text
+#   appended by a later child is joined on with `separator`.
+#
+#   The workers are forked on every tick (they need the blackboard as it
+#   is now), which costs some 30 ms: only worth it when the children are
+#   slow.  Without fork() (or inside a worker) the children run serially.
+
+__all__ = ['ParallelOrNode']
+
+STAT_FIELDS = ['N_ticks', 'N_ticks_all', 'N_success']
+STAT_LISTS = ['N_tik2', 'N_suc2', 'T_tik2']
+
+_job = None    # (node, tick) of the current parallel tick, seen by the forked workers
+
+class ParallelOrNode(b3.Composite):
+    def __init__(self, children=None, merge=None, memos=None, nprocs=None):
+        super(ParallelOrNode, self).__init__(children)
+        self.Name = '*ParallelOrNode*'
+        self.merge = merge or []   # blackboard keys the children write
+        self.memos = memos or []   # memo dicts the children add to
+        self.nprocs = nprocs       # max worker processes (None: one per child)
+        self.separator = ', '      # between texts appended by two children
+
+    def parallel(self):
+        return (len(self.children) > 1 and (self.nprocs is None or self.nprocs > 1) and
+                'fork' in mp.get_all_start_methods() and
+                not mp.current_process().daemon)
+
+    def tick(self, tick):
+        global _job
+        self.Cost = 0
+        if not self.parallel():
+            results = [{'status': node._execute(tick)} for node in self.children]
+        else:
+            n = len(self.children)
+            if self.nprocs is not None:
+                n = min(n, self.nprocs)
+            _job = (self, tick)
+            try:
+                with mp.get_context('fork').Pool(n) as pool:
+                    results = pool.map(_run_child, range(len(self.children)), chunksize=1)
+            finally:
+                _job = None
+
+        status = b3.FAILURE
+        appended = set()    # (key, attr) strings appended to by a child
+        for (node, r) in zip(self.children, results):
+            if 'changes' in r:
+                self.apply(tick, node, r, appended)
+            self.Cost += node.Cost
+            if r['status'] != b3.FAILURE:
+                status = b3.SUCCESS
+        return status
+
+    # a worker's changes into this process
+    def apply(self, tick, node, r, appended):
+        bb = tick.blackboard
+        for (key, ops) in r['changes']:
+            if ops[0] == 'replace':
+                bb.set(key, ops[1])
+                continue
+            obj = bb.get(key)
+            for (op, attr, value) in ops[1]:
+                if op == 'extend':
+                    getattr(obj, attr).extend(value)
+                elif op == 'concat':
+                    text = getattr(obj, attr)
+                    if (key, attr) in appended and not value.startswith(self.separator):
+                        text += self.separator
+                    setattr(obj, attr, text + value)
+                    appended.add((key, attr))
+                elif op == 'union':
+                    getattr(obj, attr).update(value)
+                else:
+                    setattr(obj, attr, value)
+        if r['cost'] != 0:
+            bb.inc('TotalCost', r['cost'])
+        for (id, memory) in r['memory'].items():
+            for (key, value) in memory.items():
+                bb.set(key, value, tick.tree.id, id)
+        for (memo, entries) in zip(self.memos, r['memos']):
+            memo.update(entries)
+        add_stats(node, r['stats'])
+        tick._node_count += r['nodes']
+        if r['profile'] is not None and tick.profiler is not None:
+            tick.profiler.merge(r['profile'])
+
+
+# (in a worker) tick child k, return its changes (see the top of the file)
+def _run_child(k):
+    (self, tick) = _job
+    node = self.children[k]
+    bb = tick.blackboard
+    base0 = dict([(key, bb.get(key)) for key in bb.keys()])
+    before = {}
+    for key in self.merge:
+        before[key] = (bb.get(key), attributes(bb.get(key)))
+    marks = [memo_mark(m) for m in self.memos]
+    stats0 = [node_stats(n) for n in subtree(node)]
+    profiler = None
+    if tick.profiler is not None:
+        profiler = b3.Profiler(tick.profiler.context_key)
+    wtick = b3.Tick(tree=tick.tree, target=tick.target, blackboard=bb, profiler=profiler)
+    status = node._execute(wtick)
+
+    lost = [key for key in bb.keys() if key not in self.merge and key != 'TotalCost' and
+            (key not in base0 or bb.get(key) is not base0[key])]
+    if len(lost) > 0:
+        raise ValueError('ParallelOrNode: ' + node.Name + ' set blackboard keys ' +
+                         str(lost) + ' which are not in merge')
+    changes = []
+    for key in self.merge:
+        (obj0, attrs0) = before[key]
+        obj = bb.get(key)
+        if obj is not obj0 or attrs0 is None:
+            if obj is not obj0:
+                changes.append((key, ('replace', obj)))
+            continue
+        changes.append((key, ('update', diff(attrs0, obj))))
+    memory = {}
+    for n in subtree(node):
+        memory[n.id] = dict([(key, bb.get(key, tick.tree.id, n.id))
+                             for key in bb.keys(tick.tree.id, n.id)])
+    stats = []
+    for (n, s0) in zip(subtree(node), stats0):
+        stats.append(stats_delta(s0, node_stats(n)))
+        stats[-1]['Cost'] = n.Cost
+    return {'status': status,
+            'changes': changes,
+            'cost': bb.get('TotalCost') - base0['TotalCost'],
+            'memory': memory,
+            'memos': [memo_added(m, mark) for (m, mark) in zip(self.memos, marks)],
+            'stats': stats,
+            'nodes': wtick._node_count,
+            'profile': None if profiler is None else profiler.data()}
+
+# where the entries of memo end now (memos only add at the end, or clear)
+def memo_mark(memo):
+    return (len(memo), next(iter(memo), None))
+
+# entries added to memo since mark
+def memo_added(memo, mark):
+    (n, first) = mark
+    if len(memo) >= n and (n == 0 or next(iter(memo)) is first):
+        return dict(itertools.islice(memo.items(), n, None))
+    return dict(memo)    # (it was cleared)
+
+# copy of the attributes of obj (None if it has none)
+def attributes(obj):
+    if obj is None or not hasattr(obj, '__dict__'):
+        return None
+    attrs = {}
+    for (a, v) in obj.__dict__.items():
+        if isinstance(v, (list, set, dict)):
+            v = copy.copy(v)
+        attrs[a] = v
+    return attrs
+
+def same(a, b):
+    try:
+        return bool(a == b)
+    except Exception:
+        return False
+
+# changes from attributes attrs0 to the attributes of obj
+def diff(attrs0, obj):
+    ops = []
+    for (a, new) in obj.__dict__.items():
+        if a not in attrs0:
+            ops.append(('set', a, new))
+            continue
+        old = attrs0[a]
+        if isinstance(old, list) and isinstance(new, list) and len(new) >= len(old) \
+                and same(new[:len(old)], old):
+            if len(new) > len(old):
+                ops.append(('extend', a, new[len(old):]))
+        elif isinstance(old, str) and isinstance(new, str) and new.startswith(old):
+            if len(new) > len(old):
+                ops.append(('concat', a, new[len(old):]))
+        elif isinstance(old, set) and isinstance(new, set) and old <= new:
+            if len(new) > len(old):
+                ops.append(('union', a, new - old))
+        elif not same(new, old):
+            ops.append(('set', a, new))
+    return ops
+
+# node and all nodes below it (same order every time)
+def subtree(node):
+    nodes = [node]
+    if node.category == b3.COMPOSITE:
+        for c in node.children:
+            nodes += subtree(c)
+    elif node.category == b3.DECORATOR and getattr(node, 'child', None) is not None:
+        nodes += subtree(node.child)
+    return nodes
+
+def node_stats(node):
+    s = {}
+    for f in STAT_FIELDS:
+        s[f] = getattr(node, f)
+    for f in STAT_LISTS:
+        s[f] = list(getattr(node, f))
+    return s
+
+def stats_delta(s0, s1):
+    d = {}
+    for f in STAT_FIELDS:
+        d[f] = s1[f] - s0[f]
+    for f in STAT_LISTS:
+        d[f] = [b - a for (a, b) in zip(s0[f], s1[f])]
+    return d
+
+# worker's statistics into the (parent process) subtree
+def add_stats(node, stats):
+    for (n, d) in zip(subtree(node), stats):
+        for f in STAT_FIELDS:
+            setattr(n, f, getattr(n, f) + d[f])
+        for f in STAT_LISTS:
+            v = getattr(n, f)
+            for i in range(len(d[f])):
+                v[i] += d[f][i]
+        n.Cost = d['Cost']
@@ -0,0 +1,54 @@
+import b3
+
+__all__ = ['UtilityPriority']
+
+# A Priority (selector) which tries its children in order of their
+#   estimated utility instead of a fixed order:
+#
+#      utility = P(success | state) / mean time per tick (given state)
+#
+#   The state (0-3, the index into the BaseNode N_tik2/N_suc2 counters) is
+#   given by state(tick), e.g. the type of the current unknown.  Without
+#   a state function every tick is state 0.  A child which has never been
+#   ticked in the current state is tried first (in the original order),
+#   so all children get measured before the ordering is trusted.
+#   Children with the same utility keep their original order.
+#
+#   The order depends on the measured times, so results can differ from
+#   run to run (and with the stats of earlier runs loaded): b3.Priority is
+#   the default in ikSolver, this is opt-in.  The counters kept are the
+#   same as under b3.Priority.
+
+class UtilityPriority(b3.Composite):
+    def __init__(self, children=None, state=None):
+        super(UtilityPriority, self).__init__(children)
+        self.Name = '*UtilityPriority*'
+        self.state_fcn = state
+        self.min_time = 1.0e-4    # (s) floor for the mean time of a child
+
+    def utility(self, node, s):
+        if node.N_tik2[s] == 0:
+            return float('inf')
+        t = max(node.T_tik2[s] / node.N_tik2[s], self.min_time)
+        return node.prob_state()[s] / t
+
+    # children in the order they will be tried (for state s)
+    def order(self, s):
+        u = [self.utility(node, s) for node in self.children]
+        idx = sorted(range(len(self.children)), key=lambda i: (-u[i], i))
+        return [self.children[i] for i in idx]
+
+    def tick(self, tick):
+        s = 0
+        if self.state_fcn is not None:
+            s = self.state_fcn(tick)
+        self.Cost = 0
+        for node in self.order(s):
+            node.state = s     # BaseNode counts ticks, time and successes on state
+            status = node._execute(tick)
+            #Add in cost of selected leaf (requires zero cost for Seq node)
+            self.Cost += node.Cost
+            if status != b3.FAILURE:
+                return status
+
+        return b3.FAILURE
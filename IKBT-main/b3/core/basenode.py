@@ -1,5 +1,6 @@
 import b3
 import uuid
+import time
 
 
 __all__ = ['BaseNode']
@@ -26,6 +27,7 @@ class BaseNode(object):
         self.state = 0
         self.N_tik2 = [0, 0, 0, 0]  # number of ticks on each state
         self.N_suc2 = [0, 0, 0, 0]  # prob success conditioned on state
+        self.T_tik2 = [0.0, 0.0, 0.0, 0.0]  # time (s) spent in ticks on each state
         self.Ps = 0.0               # basic P(success)
         self.P_selector = 0.0       # probability selected by selector S02
         self.Cost = 0               # Cost of ticking this leaf (INT!)
@@ -102,6 +104,7 @@ class BaseNode(object):
       self.Ps = 0
       self.N_tik2 = [0.0,0.0,0.0,0.0]
       self.N_suc2 = [0.0,0.0,0.0,0.0]
+      self.T_tik2 = [0.0,0.0,0.0,0.0]
       
       
       #  report your stats
@@ -129,7 +132,7 @@ class BaseNode(object):
         if (status != b3.RUNNING):
             self._close(tick)
 
-        self._exit(tick)
+        self._exit(tick, status)
 
         return status
 
@@ -149,7 +152,13 @@ class BaseNode(object):
             print('basenode: ', self.Name, " ticked ")
         #BH count the ticks
         self.N_ticks_all += 1
+        #   ticks and time on the current state (state is set by the parent,
+        #   e.g. b3.UtilityPriority, 0 otherwise)
+        state = self.state
+        t0 = time.perf_counter()
         status = self.tick(tick)
+        self.T_tik2[state] += time.perf_counter() - t0
+        self.N_tik2[state] += 1
         #BH count the total cost 
         tick.blackboard.inc('TotalCost',self.Cost)
         
@@ -175,8 +184,8 @@ class BaseNode(object):
         tick.blackboard.set('is_open', False, tick.tree.id, self.id)
         self.close(tick)
 
-    def _exit(self, tick):
-        tick._exit_node(self)
+    def _exit(self, tick, status=None):
+        tick._exit_node(self, status)
         self.exit(tick)
 
     def enter(self, tick): pass
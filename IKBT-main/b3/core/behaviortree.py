@@ -1,9 +1,30 @@
 import b3
 import uuid
 import itertools
+import json
+import os
 
 __all__ = ['BehaviorTree']
 
+STATS_VERSION = 1
+STATS_FIELDS = ['N_ticks', 'N_ticks_all', 'N_success', 'N_tik2', 'N_suc2', 'T_tik2']
+
+def stats_label(node):
+    name = getattr(node, 'Name', None)
+    if name is None or name == '--unnamed--':
+        name = node.name
+    return name.replace('/', '|')
+
+def is_number(x):
+    return isinstance(x, (int, float)) and not isinstance(x, bool) and x >= 0
+
+# a stats value from a file can replace the node's value (same shape)
+def valid_stat(value, new):
+    if isinstance(value, list):
+        return (isinstance(new, list) and len(new) == len(value)
+                and all([is_number(x) for x in new]))
+    return is_number(new)
+
 class BehaviorTree(object):
     def __init__(self):
         self.id = str(uuid.uuid1())
@@ -15,6 +36,7 @@ class BehaviorTree(object):
         self.tick_count = 0
         self.log_flag = 0       # write a log of node results 1 = SUCCESS only 2 = both S+F
         self.log_file = None    # file object
+        self.profiler = None    # b3.Profiler() to time the nodes
 
     def load(self, data, names=None):
         names = names or {}
@@ -106,6 +128,76 @@ class BehaviorTree(object):
         return data
 
 
+    # (path, node) for every node of the tree.  The path is made of node
+    #   names (Name, or the class name) from the root, so it is the same
+    #   in every run (node ids are not).
+    def node_paths(self):
+        result = []
+        if not self.root:
+            return result
+        stack = [(self.root, stats_label(self.root))]
+        while len(stack) > 0:
+            (node, path) = stack.pop()
+            result.append((path, node))
+            children = []
+            if node.category == b3.COMPOSITE and hasattr(node, 'children'):
+                children = node.children
+            elif node.category == b3.DECORATOR and getattr(node, 'child', None) is not None:
+                children = [node.child]
+            seen = {}
+            for c in children:
+                label = stats_label(c)
+                seen[label] = seen.get(label, 0) + 1
+                if seen[label] > 1:     # same name twice under one parent
+                    label += '#' + str(seen[label])
+                stack.append((c, path + '/' + label))
+        return result
+
+    #  Node statistics (success counters, tick times) kept across runs:
+    #    load_stats() when the tree has been built, save_stats() after solving.
+    #    Nodes which are not in the file (or in the tree) are left alone.
+    def load_stats(self, filename):
+        if not os.path.isfile(filename):
+            return 0
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except ValueError:
+            print('BehaviorTree.load_stats: ignoring bad stats file ', filename)
+            return 0
+        if not isinstance(data, dict) or data.get('version') != STATS_VERSION:
+            return 0
+        nodes = data.get('nodes', {})
+        if not isinstance(nodes, dict):
+            return 0
+        n = 0
+        for (path, node) in self.node_paths():
+            s = nodes.get(path)
+            if isinstance(s, dict):
+                for field in STATS_FIELDS:
+                    if valid_stat(getattr(node, field), s.get(field)):
+                        setattr(node, field, s[field])
+                n += 1
+        return n
+
+    def save_stats(self, filename):
+        data = {'version': STATS_VERSION, 'nodes': {}}
+        if os.path.isfile(filename):    # keep nodes of other trees
+            try:
+                with open(filename) as f:
+                    old = json.load(f)
+                if (isinstance(old, dict) and old.get('version') == STATS_VERSION
+                        and isinstance(old.get('nodes'), dict)):
+                    data = old
+            except ValueError:
+                pass
+        for (path, node) in self.node_paths():
+            data['nodes'][path] = dict([(field, getattr(node, field)) for field in STATS_FIELDS])
+        tmp = filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        os.replace(tmp, filename)   # (a crash never leaves half a file)
+
     def tick(self, target, blackboard):
 
         self.tick_count += 1
@@ -115,9 +207,14 @@ class BehaviorTree(object):
         tick.blackboard = blackboard
         tick.tree = self
         tick.debug = self.debug
+        tick.profiler = self.profiler
 
         # Tick node
+        if self.profiler is not None:
+            self.profiler.begin(self)
         state = self.root._execute(tick)
+        if self.profiler is not None:
+            self.profiler.end(self, state)
         
         ###  BH Hacks
         #if state != b3.RUNNING:
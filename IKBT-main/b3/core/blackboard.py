@@ -1,57 +1,245 @@
-__all__ = ['Blackboard']
+__all__ = ['Blackboard', 'Snapshot']
+
+class Snapshot(object):
+    '''State of a Blackboard returned by `Blackboard.snapshot()`.'''
+    __slots__ = ['base_memory', 'tree_memory', 'version']
+
+    def __init__(self, base_memory, tree_memory, version):
+        self.base_memory = base_memory
+        self.tree_memory = tree_memory
+        self.version = version
+
+
+class _memory(dict):
+    '''A memory dict, tagged with the generation which may write to it.'''
+    __slots__ = ['gen']
+
 
 class Blackboard(object):
+    '''Blackboard Class.
+
+    Memory shared by the nodes of a tree (`set()`, `get()`), plus per tree
+    and per node memory (with `tree_scope` and `node_scope`).
+
+    Versions and transactions:
+
+    `version` goes up by one on every write of a shared (base memory) key,
+    except the `unversioned` bookkeeping keys ('TotalCost', which every
+    node tick adds to).  It never goes down (not even on `rollback()`), so
+    a value computed from the blackboard can be memoized on the version.
+
+    `snapshot()` is O(1): the memory dicts are shared with the snapshot
+    and copied (copy on write) the first time each one is written
+    afterwards.  `rollback(snap)` puts every key of every scope back to
+    the value it had at the snapshot, `commit(snap)` keeps the changes.
+
+    The values themselves are not copied by `get()`: an object changed in
+    place (e.g. an unknown, the Robot) must be fetched with `modify(key)`.
+    The first `modify()` of a key after a snapshot copies its value and the
+    snapshot keeps the original.  A shared value that is, or directly holds,
+    an object just copied is copied too (with the same memo), so curr_unk
+    stays the object in unknowns; other values are not copied.
+    Changes made in place to an object fetched with `get()` are not undone.
+    '''
+
     def __init__(self):
-        self._base_memory = {}
-        self._tree_memory = {}
+        self._gen = 0           # generation: bumped by every snapshot
+        self._base_memory = self._new_memory()
+        self._tree_memory = self._new_memory()
+        self._copies = {}       # copy_value() memo of the current generation
+        self._live = []         # snapshots not committed
+        self._copied = set()    # (key, tree_scope, node_scope) copied in this generation
+        self.version = 0
+        self.unversioned = set(['TotalCost'])
         self.set('TotalCost', 0)
 
+    def _new_memory(self, items=()):
+        memory = _memory(items)
+        memory.gen = self._gen
+        return memory
+
+    def _own(self, memory):
+        # memory, or a copy of it if it is shared with a snapshot
+        if memory.gen == self._gen:
+            return memory
+        return self._new_memory(memory)
+
     def _get_tree_memory(self, tree_scope):
+        self._tree_memory = self._own(self._tree_memory)
         if (tree_scope not in self._tree_memory):
-            self._tree_memory[tree_scope] = {
-                'node_memory': {},
+            memory = self._new_memory({
+                'node_memory': self._new_memory(),
                 'open_nodes': []
-            }
+            })
+        else:
+            memory = self._own(self._tree_memory[tree_scope])
+        self._tree_memory[tree_scope] = memory
 
-        return self._tree_memory[tree_scope]
+        return memory
 
     def _get_node_memory(self, tree_memory, node_scope):
-        memory = tree_memory['node_memory']
+        memory = self._own(tree_memory['node_memory'])
+        tree_memory['node_memory'] = memory
 
         if (node_scope not in memory):
-            memory[node_scope] = {}
+            memory[node_scope] = self._new_memory()
+        else:
+            memory[node_scope] = self._own(memory[node_scope])
 
         return memory[node_scope]
 
     def _get_memory(self, tree_scope, node_scope):
-        memory = self._base_memory
+        # memory to write to
+        if (tree_scope is None):
+            self._base_memory = self._own(self._base_memory)
+            return self._base_memory
+
+        memory = self._get_tree_memory(tree_scope)
 
-        if (tree_scope is not None):
-            memory = self._get_tree_memory(tree_scope)
+        if (node_scope is not None):
+            memory = self._get_node_memory(memory, node_scope)
 
-            if (node_scope is not None):
-                memory = self._get_node_memory(memory, node_scope)
+        return memory
 
+    def _read_memory(self, tree_scope, node_scope):
+        # memory to read from (nothing is created or copied)
+        if (tree_scope is None):
+            return self._base_memory
+        memory = self._tree_memory.get(tree_scope, {})
+        if (node_scope is not None):
+            memory = memory.get('node_memory', {}).get(node_scope, {})
         return memory
 
+    def _changed(self, key, tree_scope):
+        if tree_scope is None and key not in self.unversioned:
+            self.version += 1
+
     def set(self, key, value, tree_scope=None, node_scope=None):
         memory = self._get_memory(tree_scope, node_scope)
         memory[key] = value
+        self._changed(key, tree_scope)
 
     def get(self, key, tree_scope=None, node_scope=None):
-        memory = self._get_memory(tree_scope, node_scope)
+        memory = self._read_memory(tree_scope, node_scope)
         return memory.get(key)
- 
+
+    def modify(self, key, tree_scope=None, node_scope=None):
+        '''Get a value to change in place (a copy of it after a snapshot).'''
+        value = self.get(key, tree_scope, node_scope)
+        scope = (key, tree_scope, node_scope)
+        if len(self._live) > 0 and scope not in self._copied:
+            # first change in place since the snapshot
+            new = copy_value(value, self._copies)
+            if new is not value:
+                self._get_memory(tree_scope, node_scope)[key] = new
+                value = new
+                self._relink()
+            self._copied.add(scope)
+        self._changed(key, tree_scope)
+        return value
+
+    def _relink(self):
+        # shared values holding an object copied since the snapshot
+        memory = self._get_memory(None, None)
+        relinked = True
+        while relinked:       # a copy can make more copied objects
+            relinked = False
+            for (k, v) in list(memory.items()):
+                if (k, None, None) in self._copied:
+                    continue
+                if isinstance(v, (list, tuple)):
+                    items = v
+                elif isinstance(v, dict):
+                    items = v.values()
+                else:
+                    items = ()
+                if id(v) in self._copies or any(id(x) in self._copies for x in items):
+                    memory[k] = copy_value(v, self._copies)
+                    self._copied.add((k, None, None))
+                    relinked = True
+
+    def keys(self, tree_scope=None, node_scope=None):
+        return list(self._read_memory(tree_scope, node_scope).keys())
+
     #BH make it easier to increment a BB value
     def inc(self, key, value, tree_scope=None, node_scope=None):
         memory = self._get_memory(tree_scope, node_scope)
         a = 5
         if (type(a) == type(memory[key])):
            memory[key] += value
+           self._changed(key, tree_scope)
         else:
           print(type(memory[key]))
           print(type(a))
           print("Blackboard increment error - must be an int")
           quit()
-    
-      
+
+    def snapshot(self):
+        '''Current state of the blackboard, for `rollback()` or `commit()`.'''
+        snap = Snapshot(self._base_memory, self._tree_memory, self.version)
+        self._gen += 1
+        self._copies = {}
+        self._copied = set()
+        self._live.append(snap)
+        return snap
+
+    def rollback(self, snap):
+        '''Put the blackboard back to the snapshot and end it (and the
+        snapshots taken after it).'''
+        self._base_memory = snap.base_memory
+        self._tree_memory = snap.tree_memory
+        self._gen += 1
+        self._copies = {}
+        self._copied = set()
+        if snap in self._live:
+            self._live = self._live[:self._live.index(snap)]
+        self.version += 1
+
+    def commit(self, snap):
+        '''Keep the changes made since the snapshot.'''
+        if snap in self._live:
+            self._live.remove(snap)
+
+
+# values which are never changed in place
+IMMUTABLE = (str, bytes, int, float, complex, bool, tuple, frozenset, type(None))
+try:
+    import sympy
+    IMMUTABLE += (sympy.Basic,)     # expressions (and ImmutableMatrix)
+except ImportError:
+    pass
+
+# Copy of value for changing in place: lists, dicts, sets, mutable sympy
+#   matrices and objects with a __dict__ are copied (all the way down),
+#   IMMUTABLE values are shared.  memo maps id(original) -> (original, copy)
+#   so an object reached twice (from one value or from several calls) is
+#   copied once.
+def copy_value(value, memo):
+    if isinstance(value, IMMUTABLE):
+        return value
+    c = memo.get(id(value))
+    if c is not None:
+        return c[1]
+    if isinstance(value, list):
+        c = []
+        memo[id(value)] = (value, c)    # (keeps value alive, so its id isn't reused)
+        c.extend([copy_value(v, memo) for v in value])
+    elif isinstance(value, dict):
+        c = {}
+        memo[id(value)] = (value, c)
+        for (k, v) in value.items():
+            c[k] = copy_value(v, memo)
+    elif isinstance(value, set):
+        c = set(value)
+        memo[id(value)] = (value, c)
+    elif getattr(value, 'is_Matrix', False) is True:
+        c = value.copy()
+        memo[id(value)] = (value, c)
+    elif hasattr(value, '__dict__') and not isinstance(value, type) and not callable(value):
+        c = value.__class__.__new__(value.__class__)
+        memo[id(value)] = (value, c)
+        for (k, v) in value.__dict__.items():
+            c.__dict__[k] = copy_value(v, memo)
+    else:
+        return value
+    return c
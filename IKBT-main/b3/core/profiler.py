@@ -0,0 +1,212 @@
+import time
+
+__all__ = ['Profiler']
+
+class Profiler(object):
+    '''Profiler Class.
+
+    Opt-in timing of the nodes of a tree: set `tree.profiler = Profiler()`.
+    The Tick calls `enter()` and `exit()` for every node it enters and
+    exits, and the profiler records per node (and per node and context,
+    see `context_key`):
+
+        calls, SUCCESS/FAILURE/RUNNING/ERROR counts,
+        inclusive and exclusive wall clock time,
+        inclusive and exclusive CPU time.
+
+    Exclusive time is inclusive time minus the inclusive time of the
+    children.  Exclusive wall time is also summed per stack of node names,
+    which is the "collapsed stack" format of flame graph tools
+    (flamegraph.pl, speedscope): one line "root;child;leaf <microseconds>".
+
+    When the tree finishes (a `BehaviorTree.tick()` which does not return
+    RUNNING) the report and the collapsed stacks are written to
+    `report_file` and `collapsed_file` (if set), or at any time with
+    `write()`.
+
+    Nodes ticked in another process (b3.ParallelOrNode) are timed there by
+    a profiler of their own, whose `data()` is added in with `merge()`.
+    Their time runs at the same time as the parent's, so a parent's
+    exclusive time is never taken below zero.
+    '''
+
+    def __init__(self, context_key=None, report_file=None, collapsed_file=None):
+        '''Constructor.
+
+        :param context_key: blackboard key whose value (str()) is the context
+                            of a node tick, e.g. the current unknown.
+        :param report_file: file name for `report()` when the tree finishes.
+        :param collapsed_file: file name for `write_collapsed()` when the
+                               tree finishes.
+        '''
+        self.context_key = context_key
+        self.report_file = report_file
+        self.collapsed_file = collapsed_file
+        self.reset()
+
+    def reset(self):
+        '''Forget all measurements.'''
+        self.stats = {}       # node id -> stats dict
+        self.ctx_stats = {}   # (node id, context) -> stats dict
+        self.stacks = {}      # 'root;...;node' -> exclusive seconds
+        self.total = [0.0, 0.0]   # wall, cpu time of the top level nodes
+        self._frames = []
+
+    def _new_stats(self, name):
+        return {'name': name, 'calls': 0,
+                'status': {}, 'incl': 0.0, 'excl': 0.0,
+                'cpu_incl': 0.0, 'cpu_excl': 0.0}
+
+    def begin(self, tree):
+        '''Called by BehaviorTree at the start of a tick.'''
+        self._frames = []   # (in case the last tick raised an exception)
+
+    def enter(self, node, tick):
+        '''Called when entering a node (by Tick).
+
+        :param node: a node instance.
+        :param tick: the Tick.
+        '''
+        context = None
+        if self.context_key is not None:
+            context = tick.blackboard.get(self.context_key)
+            if context is not None:
+                context = str(context)
+        # [node, context, start, cpu start, children time, children cpu]
+        self._frames.append([node, context, time.perf_counter(), time.process_time(), 0.0, 0.0])
+
+    def exit(self, node, status):
+        '''Called when exiting a node (by Tick).
+
+        :param node: a node instance.
+        :param status: the status returned by the node.
+        '''
+        if len(self._frames) == 0 or self._frames[-1][0] is not node:
+            return
+        [node, context, t0, c0, tchild, cchild] = self._frames.pop()
+        incl = time.perf_counter() - t0
+        cpu = time.process_time() - c0
+        excl = max(incl - tchild, 0.0)
+        cpu_excl = max(cpu - cchild, 0.0)
+        if len(self._frames) > 0:
+            self._frames[-1][4] += incl
+            self._frames[-1][5] += cpu
+        else:
+            self.total[0] += incl
+            self.total[1] += cpu
+
+        records = [self.stats.setdefault(node.id, self._new_stats(node_label(node)))]
+        if context is not None:
+            records.append(self.ctx_stats.setdefault((node.id, context), self._new_stats(node_label(node))))
+        for s in records:
+            s['calls'] += 1
+            name = status_name(status)
+            s['status'][name] = s['status'].get(name, 0) + 1
+            s['incl'] += incl
+            s['excl'] += excl
+            s['cpu_incl'] += cpu
+            s['cpu_excl'] += cpu_excl
+
+        path = [node_label(f[0]) for f in self._frames] + [node_label(node)]
+        path = ';'.join(path)
+        self.stacks[path] = self.stacks.get(path, 0.0) + excl
+
+    def data(self):
+        '''The measurements (to `merge()` into another profiler).'''
+        return {'stats': self.stats, 'ctx_stats': self.ctx_stats,
+                'stacks': self.stacks, 'total': self.total}
+
+    def merge(self, data):
+        '''Add the measurements of another profiler, made below the node
+        being timed now (e.g. in a worker process of b3.ParallelOrNode).
+
+        :param data: `data()` of the other profiler.
+        '''
+        for (table, other) in [(self.stats, data['stats']), (self.ctx_stats, data['ctx_stats'])]:
+            for (key, s) in other.items():
+                t = table.setdefault(key, self._new_stats(s['name']))
+                t['calls'] += s['calls']
+                for (name, n) in s['status'].items():
+                    t['status'][name] = t['status'].get(name, 0) + n
+                for f in ['incl', 'excl', 'cpu_incl', 'cpu_excl']:
+                    t[f] += s[f]
+        prefix = ''.join([node_label(f[0]) + ';' for f in self._frames])
+        for (path, t) in data['stacks'].items():
+            self.stacks[prefix + path] = self.stacks.get(prefix + path, 0.0) + t
+        if len(self._frames) > 0:
+            self._frames[-1][4] += data['total'][0]
+            self._frames[-1][5] += data['total'][1]
+        else:
+            self.total[0] += data['total'][0]
+            self.total[1] += data['total'][1]
+
+    def end(self, tree, status=None):
+        '''Called by BehaviorTree at the end of a tick.
+
+        :param tree: the tree.
+        :param status: the status of the root node.
+        '''
+        import b3
+        if status != b3.RUNNING:
+            self.write()
+
+    def write(self):
+        '''Write the report and the collapsed stacks to their files (if set).'''
+        if self.report_file is not None:
+            with open(self.report_file, 'w') as f:
+                f.write(self.report())
+        if self.collapsed_file is not None:
+            self.write_collapsed(self.collapsed_file)
+
+    def report(self, sort='excl', contexts=True):
+        '''Table of the node statistics as a string.
+
+        :param sort: column to sort on (largest first): 'excl', 'incl',
+                     'cpu_excl', 'cpu_incl' or 'calls'.
+        :param contexts: also list each (node, context) pair.
+        '''
+        lines = []
+        head = '{:40} {:>7} {:>10} {:>10} {:>10} {:>10}  {}'.format(
+            'node', 'calls', 'incl(s)', 'excl(s)', 'cpu_incl', 'cpu_excl', 'status')
+        rows = [(s['name'], s) for s in self.stats.values()]
+        tables = [('Per node', rows)]
+        if contexts and len(self.ctx_stats) > 0:
+            rows = [(s['name'] + ' [' + c + ']', s) for ((id, c), s) in self.ctx_stats.items()]
+            tables.append(('Per node and ' + str(self.context_key), rows))
+        for (title, rows) in tables:
+            lines.append(title)
+            lines.append(head)
+            rows.sort(key=lambda r: r[1][sort], reverse=True)
+            for (name, s) in rows:
+                st = ' '.join(['{}:{}'.format(k, s['status'][k]) for k in sorted(s['status'].keys())])
+                lines.append('{:40} {:7} {:10.4f} {:10.4f} {:10.4f} {:10.4f}  {}'.format(
+                    name[:40], s['calls'], s['incl'], s['excl'], s['cpu_incl'], s['cpu_excl'], st))
+            lines.append('')
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        '''Collapsed stack lines (exclusive wall time in microseconds).'''
+        lines = []
+        for path in sorted(self.stacks.keys()):
+            us = int(round(self.stacks[path]*1.0e6))
+            if us > 0:
+                lines.append(path + ' ' + str(us))
+        return lines
+
+    def write_collapsed(self, filename):
+        with open(filename, 'w') as f:
+            for line in self.collapsed():
+                f.write(line + '\n')
+
+
+def node_label(node):
+    # Name if the node has been given one, else its class name
+    #  (no ';' or ' ': they separate the fields of a collapsed stack)
+    name = getattr(node, 'Name', None)
+    if name is None or name == '--unnamed--':
+        name = node.name
+    return name.replace(';', ',').replace(' ', '_')
+
+def status_name(status):
+    import b3
+    return {b3.SUCCESS: 'S', b3.FAILURE: 'F', b3.RUNNING: 'R', b3.ERROR: 'E'}.get(status, str(status))
@@ -17,18 +17,20 @@ class Tick(object):
     node state to the debug if the last is provided.
     '''
 
-    def __init__(self, tree=None, target=None, blackboard=None, debug=None):
+    def __init__(self, tree=None, target=None, blackboard=None, debug=None, profiler=None):
         '''Constructor.
     
         :param tree: a BehaviorTree instance.
         :param target: a target object.
         :param blackboard: a Blackboard instance.
         :param debug: a debug instance.
+        :param profiler: a Profiler instance (None: no timing).
         '''
         self.tree = tree
         self.target = target
         self.blackboard = blackboard
         self.debug = debug
+        self.profiler = profiler
 
         self._open_nodes = []
         self._node_count = 0
@@ -40,6 +42,8 @@ class Tick(object):
         '''
         self._node_count += 1
         self._open_nodes.append(node)
+        if self.profiler is not None:
+            self.profiler.enter(node, self)
 
     def _open_node(self, node):
         '''Called when opening a node (called by BaseNode).
@@ -62,9 +66,11 @@ class Tick(object):
         '''
         self._open_nodes.pop()
 
-    def _exit_node(self, node):
+    def _exit_node(self, node, status=None):
         '''Called when exiting a node (called by BaseNode).
 
         :param node: a node instance.
+        :param status: the status the node returned.
         '''
-        pass
\ No newline at end of file
+        if self.profiler is not None:
+            self.profiler.exit(node, status)
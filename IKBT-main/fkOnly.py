@@ -32,6 +32,7 @@ import ikbtfunctions.output_latex as ol
 import ikbtfunctions.output_python as op
 import ikbtfunctions.output_cpp as oc
 from   ikbtfunctions.ik_robots import *   # a bunch of robot models: probs to solve
+from ikbtbasics.fk_cache import kinematics_cache
 
 #from ikbtbasics import *
 #from ikbtleaves.assigner_leaf import assigner
@@ -105,21 +106,17 @@ print('')
 #
 #     Set up robot equations for further solution by BT
 #
-#   Check for a pickle file of pre-computed Mech object. If the pickle
-#       file is not there, compute the kinematic equations
+#   Re-use any stages of the kinematic equations which are in the FK cache
+#       (fk_eqns/), compute the rest
 
 testing = False
-[M, R, unknowns] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, testing)
+[M, R, unknowns] = kinematics_cache(robot, dh, params, pvals, vv, unknowns, testing)
 print('GOT HERE (after FK): robot name: ', R.name)
 
 R.name = robot
 R.params = params
 R.variables = unknowns
 
-##   check the pickle in case DH params were changed
-dhp = M.DH
-check_the_pickle(dhp, dh)   # check that two mechanisms have identical DH params
-
 print('Generating Python code ...')
 op.output_FK_python_code(R)  # should do it all(!)
 
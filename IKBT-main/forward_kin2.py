@@ -29,6 +29,7 @@ import b3 as b3          # behavior trees
 import ikbtfunctions.helperfunctions as hf
 from ikbtfunctions.ik_robots import * 
 from ikbtbasics import *
+from ikbtbasics.fk_cache import kinematics_cache
 
 
 TEST_DATA_GENERATION = False
@@ -88,13 +89,9 @@ print('')
 #
 #     Set up robot equations for further solution by BT
 #
-#   Check for a pickle file of pre-computed Mech object. If the pickle
-#       file is not there, compute the kinematic equations
+#   Read the kinematic equations from the FK cache, or compute them
+#       (the cache is keyed on the DH params, so changed params are recomputed)
 
 testing = False
-[M, R, unknowns] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, testing)
-
-##   check the pickle in case DH params were changed
-dhp = M.DH
-check_the_pickle(dhp, dh)   # check that two mechanisms have identical DH params
+[M, R, unknowns] = kinematics_cache(robot, dh, params, pvals, vv, unknowns, testing)
  
@@ -29,6 +29,7 @@ import b3 as b3          # behavior trees
 import ikbtfunctions.helperfunctions as hf
 from ikbtfunctions.ik_robots import * 
 from ikbtbasics import *
+from ikbtbasics.fk_cache import kinematics_cache
 
 
 TEST_DATA_GENERATION = False
@@ -91,9 +92,9 @@ use_pickle = False
 
 if use_pickle:
 
-    # using pickle
+    # using the FK cache
     testing = False
-    [M, R, unknowns] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, testing)
+    [M, R, unknowns] = kinematics_cache(robot, dh, params, pvals, vv, variables, testing)
     print('GOT HERE (use pickle): robot name: ', R.name)
 
     M.forward_kinematics()
@@ -33,7 +33,8 @@ import ikbtfunctions.output_cpp as oc
 from   ikbtfunctions.ik_robots import *
 
 from ikbtbasics import *
-from ikbtleaves.assigner_leaf import assigner
+from ikbtbasics.fk_cache import kinematics_cache
+from ikbtleaves.assigner_leaf import assigner, unknown_state
 from ikbtleaves.rank_leaf import rank
 from ikbtleaves.algebra_solver import *
 from ikbtleaves.tan_solver import *
@@ -41,9 +42,11 @@ from ikbtleaves.sincos_solver import *
 from ikbtleaves.sinANDcos_solver import *
 from ikbtleaves.x2y2_transform import *
 from ikbtleaves.sub_transform import *
+from ikbtleaves.updateL import equation_lists
 #from ikbtleaves.sum_transform import *  # replaced by sum_id() + Algebra node.
 from ikbtleaves.sum_id import *      # detect and sub sum-of-angles
 from ikbtleaves.two_eqn_m7 import *
+from ikbtleaves.expand_leaf import expand_mequations
 
 TEST_DATA_GENERATION = False
 
@@ -100,22 +103,27 @@ print('')
 #
 #     Set up robot equations for further solution by BT
 #
-#   Check for a pickle file of pre-computed Mech object. If the pickle
-#       file is not there, compute the kinematic equations
+#   Re-use any stages of the kinematic equations which are in the FK cache
+#       (fk_eqns/), compute the rest
 
 testing = False
 print('Solver:  unknowns:', unknowns)
 
-[M, R, unknowns] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, testing)
+#   MEQUATION_START = n: start with the first n matrix equations, more are
+#     added (expandM below) only if the solver gets stuck.
+#     (None: all the equations from the start)
+MEQUATION_START = None
+#   SIMPLIFY: trigsimp the matrix equations, NPROCS: in this many worker
+#     processes (T_06 too)
+SIMPLIFY = False
+NPROCS = 1
+[M, R, unknowns] = kinematics_cache(robot, dh, params, pvals, vv, unknowns, testing, mequations=MEQUATION_START,
+                                    simplify=SIMPLIFY, nprocs=NPROCS)
 print('GOT HERE (Fk completed): robot name: ', R.name)
 
 R.name = robot
 R.params = params
 
-##   check the pickle in case DH params were changed
-dhp = M.DH
-check_the_pickle(dhp, dh)   # check that two mechanisms have identical DH params
-
 ####################################################################################
 ##
 #                                   Set up the BT Leaves
@@ -185,7 +193,10 @@ sacSol.BHdebug = SolverDebug
 
 # x^2 + y^2 trick from Craig (eqn 4.65)
 #  needed for Puma and KawasakiRS007L
-x2z2_Solver = x2z2_transform()
+#   x2z2 simplify() budget per tick (number of sums of squares, seconds)
+X2Z2_MAX_SIMPLIFY = 8
+X2Z2_TIME_BUDGET = 60.0
+x2z2_Solver = x2z2_transform(X2Z2_MAX_SIMPLIFY, X2Z2_TIME_BUDGET)
 x2z2_Solver.Name = 'X2Y2 transform'
 x2z2_Solver.BHdebug = False
 
@@ -219,6 +230,10 @@ updateL.Name = "updateL Transform"
 updateL.BHdebug = False
 
 
+expandM = expand_mequations()
+expandM.Name = "Expand Matrix Equations"
+expandM.BHdebug = False
+
 compDetect = comp_det()
 compDetect.Name = "Completion Detect"
 compDetect.BHdebug = True
@@ -227,18 +242,35 @@ compDetect.BHdebug = True
 #   Higher level BT nodes here
 #
 
-sc_tan = b3.Sequence([b3.OrNode([tanSol, scSol]), rankNode])
+#  tan and sincos ID+solve are independent (each adds its own solutions to
+#    curr_unk for rankNode): they can run in two worker processes
+#    (forked on every tick, so only worth it for slow robots)
+PARALLEL_ID = False
+if PARALLEL_ID:
+    tan_or_sc = b3.ParallelOrNode([tanSol, scSol], merge=['curr_unk', 'assumptions'],
+                                  memos=[hf.expr_index_memo, hf.trig_terms_memo, hf.is_zero_memo])
+else:
+    tan_or_sc = b3.OrNode([tanSol, scSol])
+sc_tan = b3.Sequence([tan_or_sc, rankNode])
 
 
 # this is the current working version
 # it's also possible to build customized BT
-worktools = b3.Priority([algSol, sc_tan, Simu_Eqn_Sol, sacSol, x2z2_Solver])
+#   (UTILITY_ORDER: try the solvers in order of measured utility for the
+#    type of unknown, warm started from the stats of earlier solves.
+#    The solutions can then depend on earlier runs.)
+UTILITY_ORDER = False
+if UTILITY_ORDER:
+    worktools = b3.UtilityPriority([algSol, sc_tan, Simu_Eqn_Sol, sacSol, x2z2_Solver], state=unknown_state)
+else:
+    worktools = b3.Priority([algSol, sc_tan, Simu_Eqn_Sol, sacSol, x2z2_Solver])
 
 #  we have to ID the SOA cases to generate equations for algSol to work on SOA variables
 subtree = b3.RepeatUntilSuccess(b3.Sequence([asgn, sumOfAnglesID, worktools]), 6)
-solveRoutine = b3.Sequence([sub_trans, subtree,  updateL, compDetect])
+solveRoutine = b3.Sequence([expandM, sub_trans, subtree,  updateL, compDetect])
 
-topnode = b3.RepeatUntilSuccess(solveRoutine, 10) #max 10 loops
+#max 10 loops (plus one for each matrix equation still to add)
+topnode = b3.RepeatUntilSuccess(solveRoutine, 10 + len(M.mequation_pending))
 
 ikbt.root = topnode
 
@@ -247,6 +279,20 @@ logdir = 'logs/'
 if not os.path.isdir(logdir):  # if this doesn't exist, create it.
     os.mkdir(logdir)
 
+#   Node statistics (success counts, tick times) from earlier solves
+#     warm start the utility ordering of worktools (UTILITY_ORDER)
+STATS_FILE = logdir + 'bt_node_stats.json'
+if UTILITY_ORDER:
+    ikbt.load_stats(STATS_FILE)
+
+#   Node timing (per node and per node+unknown), and a collapsed stack file
+#     for flame graphs (e.g. flamegraph.pl logs/<robot>_bt_stacks.txt > bt.svg)
+PROFILE = False
+if PROFILE:
+    ikbt.profiler = b3.Profiler('curr_unk',
+                                report_file = logdir + robot + '_bt_profile.txt',
+                                collapsed_file = logdir + robot + '_bt_stacks.txt')
+
 #
 #     Logging setup    ###   Enable these for future debugging
 ##
@@ -319,10 +365,11 @@ if not os.path.isdir(logdir):  # if this doesn't exist, create it.
 #    Set up the blackboard for solution
 #
 bb = b3.Blackboard()
+hf.clear_memos()    # expression memos from an earlier solve
 
 
 ##   Generate the lists of soln candidate equations from the matrix equations
-[L1, L2, L3p] = R.scan_for_equations(unknowns)  # lists of 1unk and 2unk equations
+[L1, L2, L3p] = equation_lists(R, unknowns)  # lists of 1unk and 2unk equations (kept in R)
 bb.set('eqns_1u', L1)   # eqns with one unk
 bb.set('eqns_2u', L2)   #           two unks
 bb.set('eqns_3pu', L3p)   #        three or more unks
@@ -333,6 +380,7 @@ bb.set('eqns_3pu', L3p)   #        three or more unks
 
 bb.set('Robot', R)
 bb.set('unknowns', unknowns)
+bb.set('assumptions', hf.assumption_context())   # facts for this solve only
 
 
 
@@ -346,6 +394,11 @@ bb.set('unknowns', unknowns)
 print("Ticking IK BT for ", R.name, " -------------------------\n\n")
 
 ikbt.tick("Test a full solver", bb)
+hf.clear_memos()
+if UTILITY_ORDER:
+    ikbt.save_stats(STATS_FILE)
+if PROFILE:
+    print(ikbt.profiler.report())
 
 print('\n\n           Processing Results \n\n')
 
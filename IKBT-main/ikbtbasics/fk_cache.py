@@ -0,0 +1,510 @@
+#!/usr/bin/python
+#
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import unittest
+import os
+import shutil
+import tempfile
+import hashlib
+import pickle
+import mmap
+import struct
+import io
+import sympy as sp
+
+import ikbtbasics.kin_cl as kc
+
+######################################################################
+#
+#   Content addressed cache for the forward kinematics derivation
+#
+#   Each stage of the derivation ('links', 'T_06', 'jacobian', 'mequations',
+#   'soa' = the whole Robot after sum-of-angles) is pickled under a key
+#   which is a hash of exactly the inputs that stage depends on.  Editing
+#   a DH table (or vv, pvals, ...) therefore misses the cache by itself;
+#   there is no need to delete stale files by hand or to check the DH
+#   parameters of a loaded pickle.
+#
+
+FK_CACHE_DIR = 'fk_eqns/'
+FK_CACHE_VERSION = 2   # bump if the layout of any stored stage changes
+
+# inputs which each stage of the derivation depends on
+STAGE_INPUTS = {
+    'links':           ['dh', 'params'],
+    'T_06':            ['dh', 'params'],
+    'mequations':      ['dh', 'params'],
+    'mequations_simp': ['dh', 'params'],
+    'jacobian':        ['dh', 'params', 'vv'],
+    'soa':             ['dh', 'params', 'vv', 'pvals', 'unknowns'],
+    'soa_simp':        ['dh', 'params', 'vv', 'pvals', 'unknowns'],
+    }
+#  variants (see mechanism.stage_name()):  stage + '_poly' (poly_mode) also
+#   depends on vv (the polynomial variables are the rotary joint angles,
+#   see mechanism.get_trig_poly()), stage + '_num' (numeric_params) also depends on pvals,
+#   'soa_lazy' (kinematics_cache(mequations=n)) also depends on n
+
+# stages which hold matrix equations ([list of matrix_equations, T_06], and
+#   the Robot).  These go in an equation_store file so each entry of an
+#   equation is only unpickled when it is used.
+EQUATION_STAGES = ['mequations', 'mequations_simp', 'soa', 'soa_simp']
+
+# split a stage name into [base stage, extra inputs]
+def stage_base(stage):
+    extra = []
+    if stage.endswith('_num'):
+        stage = stage[:-len('_num')]
+        extra = ['pvals']
+    if stage.endswith('_lazy'):
+        stage = stage[:-len('_lazy')]
+        extra.append('mstart')
+    if stage.endswith('_poly'):
+        stage = stage[:-len('_poly')]
+        if 'vv' not in STAGE_INPUTS[stage]:
+            extra.append('vv')
+    return [stage, extra]
+
+class stage_cache:
+    def __init__(self, dh, params, vv, pvals=None, unknowns=None, dir=FK_CACHE_DIR, mstart=None):
+        self.dir = dir
+        # text form of every input which may go into a key
+        self.inputs = {}
+        self.inputs['dh'] = sp.srepr(sp.Matrix(dh))
+        self.inputs['params'] = sp.srepr(list(params))
+        self.inputs['vv'] = str(list(vv))
+        if pvals is None:
+            pvals = {}
+        self.inputs['pvals'] = str(sorted([(str(k), str(pvals[k])) for k in pvals.keys()]))
+        if unknowns is None:
+            unknowns = []
+        self.inputs['unknowns'] = str([(str(u.symbol), u.n) for u in unknowns])
+        self.inputs['mstart'] = str(mstart)
+        self.keys = {}   # stage -> key
+
+    def key(self, stage):
+        if stage not in self.keys:
+            h = hashlib.sha1()
+            h.update(('IKBT FK cache v' + str(FK_CACHE_VERSION) + '\n').encode())
+            h.update(('sympy ' + sp.__version__ + '\n').encode())
+            h.update((stage + '\n').encode())
+            [base, extra] = stage_base(stage)
+            for name in STAGE_INPUTS[base] + extra:
+                h.update((name + ': ' + self.inputs[name] + '\n').encode())
+            self.keys[stage] = h.hexdigest()
+        return self.keys[stage]
+
+    def filename(self, stage):
+        ext = '.p'
+        if stage_base(stage)[0] in EQUATION_STAGES:
+            ext = '.eqs'
+        return os.path.join(self.dir, stage + '_' + self.key(stage) + ext)
+
+    # stored data for a stage, or None if it has not been computed
+    def load(self, stage):
+        name = self.filename(stage)
+        if not os.path.isfile(name):
+            return None
+        try:
+            if stage_base(stage)[0] in EQUATION_STAGES:
+                return load_equations(name)
+            with open(name, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:   # truncated or unreadable: just recompute it
+            print('FK cache: ignoring unreadable file ', name, ' (', e, ')')
+            return None
+
+    def store(self, stage, data):
+        if not os.path.isdir(self.dir):   # if this doesn't exist, create it.
+            print('Creating a new FK cache directory: ./' + self.dir)
+            os.makedirs(self.dir)
+        name = self.filename(stage)
+        # write a temp file then rename so a killed run never leaves a partial file
+        fd, tmpname = tempfile.mkstemp(dir=self.dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if stage_base(stage)[0] in EQUATION_STAGES:
+                    write_equations(f, data)
+                else:
+                    pickle.dump(data, f)
+            os.replace(tmpname, name)
+        except Exception:
+            if os.path.isfile(tmpname):
+                os.remove(tmpname)
+            raise
+
+
+######################################################################
+#
+#   Equation store: the data of a stage is pickled with every matrix
+#     equation in it (e.g. R.mequation_list) taken out and stored entry by
+#     entry, with an index:
+#
+#      header line
+#      blobs: each Td/Ts entry (first 3 rows) of each matrix equation,
+#             the other attributes of each matrix equation (auxeqns, ...),
+#             the data
+#      pickled index: {'data': (offset, length),
+#                      'mequations': [{'Td': [12 x (offset, length)], 'Ts': [...],
+#                                      'rest': (offset, length),
+#                                      'symbols': [12 x free symbols of entry]}, ...]}
+#      8 byte offset of the index
+#
+#   The file is mmap'ed.  Loading the data gives stored_mequations, whose
+#   entries are unpickled one at a time when they are used (entry(),
+#   Td/Ts), and whose free symbols are known without unpickling anything
+#   (entry_symbols()).
+#
+
+EQS_HEADER = b'IKBT equation store v2\n'
+
+IJ = [(i,j) for i in range(0,3) for j in range(0,4)]
+
+# pickles everything but the matrix equations, which it numbers
+class store_pickler(pickle.Pickler):
+    def __init__(self, f):
+        super(store_pickler, self).__init__(f)
+        self.mequations = []
+        self.numbers = {}   # id(matrix equation) -> number
+
+    def persistent_id(self, obj):
+        if isinstance(obj, kc.matrix_equation):
+            k = self.numbers.get(id(obj))
+            if k is None:
+                k = len(self.mequations)
+                self.numbers[id(obj)] = k
+                self.mequations.append(obj)
+            return ('mequation', k)
+        return None
+
+class store_unpickler(pickle.Unpickler):
+    def __init__(self, f, store):
+        super(store_unpickler, self).__init__(f)
+        self.store = store
+        self.mequations = {}
+
+    def persistent_load(self, pid):
+        k = pid[1]
+        if k not in self.mequations:
+            self.mequations[k] = stored_mequation(self.store, k)
+        return self.mequations[k]
+
+def write_equations(f, data):
+    buf = io.BytesIO()
+    p = store_pickler(buf)
+    p.dump(data)
+    f.write(EQS_HEADER)
+    offset = [len(EQS_HEADER)]
+    def write(blob):
+        f.write(blob)
+        offset[0] += len(blob)
+        return (offset[0] - len(blob), len(blob))
+
+    index = {'mequations': []}
+    for m in p.mequations:
+        entries = [m.entry(i,j) for (i,j) in IJ]
+        mi = {}
+        mi['Td'] = [write(pickle.dumps(e[0])) for e in entries]
+        mi['Ts'] = [write(pickle.dumps(e[1])) for e in entries]
+        mi['rest'] = write(pickle.dumps(mequation_rest(m)))
+        mi['symbols'] = [m.entry_symbols(i,j) for (i,j) in IJ]
+        index['mequations'].append(mi)
+    index['data'] = write(buf.getvalue())
+    ioffset = offset[0]
+    f.write(pickle.dumps(index))
+    f.write(struct.pack('<Q', ioffset))
+
+class equation_store:
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        assert self.mm[0:len(EQS_HEADER)] == EQS_HEADER, 'equation_store: not an equation store: ' + filename
+        (ioffset,) = struct.unpack('<Q', self.mm[-8:])
+        self.index = pickle.loads(self.mm[ioffset:-8])
+
+    def __len__(self):
+        return len(self.index['mequations'])
+
+    def blob(self, where):
+        (offset, length) = where
+        return pickle.loads(self.mm[offset:offset+length])
+
+    def data(self):
+        (offset, length) = self.index['data']
+        return store_unpickler(io.BytesIO(self.mm[offset:offset+length]), self).load()
+
+    # side ('Td' or 'Ts') entry (i,j) of matrix equation k
+    def entry(self, k, side, i, j):
+        return self.blob(self.index['mequations'][k][side][4*i+j])
+
+    def entry_symbols(self, k, i, j):
+        return self.index['mequations'][k]['symbols'][4*i+j]
+
+    def rest(self, k):
+        return self.blob(self.index['mequations'][k]['rest'])
+
+# attributes kept by stored_mequation for the store
+STORE_ATTRS = ['Td', 'Ts', 'store', 'k', 'entries', 'rest_loaded']
+
+#  attributes of a matrix equation other than Td and Ts
+def mequation_rest(m):
+    if isinstance(m, stored_mequation):
+        m.load_rest()
+    rest = {}
+    for (a, v) in m.__dict__.items():
+        if a not in STORE_ATTRS and a != 'version':   # (version counts changes in this run)
+            rest[a] = v
+    return rest
+
+#  a matrix_equation whose entries are read from an equation_store when
+#   first used.  Attributes which are set (e.g. m.Ts = ...) are never
+#   overwritten by what is in the store.
+class stored_mequation(kc.matrix_equation):
+    def __init__(self, store, k):
+        self.store = store
+        self.k = k
+        self.entries = {}   # (side, i, j) -> entry read so far
+
+    def __getattr__(self, name):
+        # (only called when normal attribute lookup fails)
+        if 'store' in self.__dict__ and not name.startswith('__'):
+            if name in ['Td', 'Ts']:
+                M = sp.zeros(4)
+                for (i,j) in IJ:
+                    M[i,j] = self.stored_entry(name, i, j)
+                M[3,3] = 1
+                self.__dict__[name] = M
+                self.release()
+                return M
+            self.load_rest()
+            self.release()
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError("'stored_mequation' object has no attribute '" + name + "'")
+
+    def stored_entry(self, side, i, j):
+        e = self.entries.get((side, i, j))
+        if e is None:
+            e = self.store.entry(self.k, side, i, j)
+            self.entries[(side, i, j)] = e
+        return e
+
+    def load_rest(self):
+        if 'store' in self.__dict__ and 'rest_loaded' not in self.__dict__:
+            for (a, v) in self.store.rest(self.k).items():
+                self.__dict__.setdefault(a, v)
+            self.rest_loaded = True
+
+    # everything has been read: drop the store (the mmap can't be pickled)
+    def release(self):
+        d = self.__dict__
+        if 'Td' in d and 'Ts' in d and 'rest_loaded' in d:
+            for a in ['store', 'k', 'entries', 'rest_loaded']:
+                del d[a]
+
+    def load(self):
+        if 'store' in self.__dict__:
+            self.load_rest()
+            self.Td
+            self.Ts
+
+    def entry(self, i, j):
+        e = []
+        for side in ['Td', 'Ts']:
+            if side in self.__dict__:
+                e.append(self.__dict__[side][i,j])
+            else:
+                e.append(self.stored_entry(side, i, j))
+        return e
+
+    def entry_symbols(self, i, j):
+        if 'store' in self.__dict__ and 'Td' not in self.__dict__ and 'Ts' not in self.__dict__:
+            return self.store.entry_symbols(self.k, i, j)
+        return super(stored_mequation, self).entry_symbols(i, j)
+
+    def __getstate__(self):
+        self.load()
+        return self.__dict__.copy()
+
+def load_equations(filename):
+    return equation_store(filename).data()
+
+
+#
+#   Set up a Robot (kinematic equations, sum of angles, solution nodes)
+#    re-using any stages which are in the FK cache.
+#    (replaces kinematics_pickle() and check_the_pickle())
+#
+#    numeric: substitute the pvals (as exact rationals) for the constant
+#      parameters before deriving anything (mechanism.numeric_params)
+#    mequations: start the Robot with only this many matrix equations
+#      (mechanism.mequation_start, the rest are added by expand_mequations)
+#    simplify: trigsimp the matrix equations (get_mequation_set(simplify=True))
+#    nprocs: worker processes for the trigsimp of T_06 and the equations
+#      (mechanism.nprocs, the results are the same for any nprocs)
+#
+def kinematics_cache(rname, dh, constants, pvals, vv, unks, test=False, numeric=False, mequations=None,
+                     simplify=False, nprocs=1):
+    from ikbtbasics.ik_classes import Robot
+
+    cache = stage_cache(dh, constants, vv, pvals, unks, mstart=mequations)
+    soa = 'soa'
+    if simplify:
+        soa += '_simp'
+    if mequations is not None:
+        soa += '_lazy'
+    if numeric:
+        soa += '_num'
+
+    stage = cache.load(soa)
+    if stage is not None:
+        print('Read cached kinematic equations for: ', rname)
+        [m, R, unks] = stage
+        m.nprocs = nprocs    # (the rest of a lazy set may still be simplified)
+        m.fk_cache = cache   # e.g. for the Jacobian, if it is needed later
+        return [m, R, unks]
+
+    print('Computing kinematic equations for: ', rname)
+    m = kc.mechanism(dh, list(constants), vv)
+    m.pvals = pvals
+    m.numeric_params = numeric
+    m.mequation_start = mequations
+    m.mequation_simplify = simplify
+    m.nprocs = nprocs
+    m.fk_cache = cache
+    m.forward_kinematics()
+    R = Robot(m, rname)
+    R.scan_for_equations(unks)
+    R.sum_of_angles_transform(unks)
+    R.generate_solution_nodes(unks)
+
+    m.fk_cache = None   # don't pickle the cache into itself
+    cache.store(soa, [m, R, unks])
+    m.fk_cache = cache
+    return [m, R, unks]
+
+
+class TestSolver011(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        sp.var('a_2 d_3 th_1 th_2 th_3 th_4 th_5 th_6')
+        self.dh = sp.Matrix([
+            [  0,        0,   0, th_1],
+            [-sp.pi/2,   0,   0, th_2],
+            [  0,      a_2, d_3, th_3],
+            [-sp.pi/2,   0,   0, th_4],
+            [ sp.pi/2,   0,   0, th_5],
+            [-sp.pi/2,   0,   0, th_6]
+            ])
+        self.params = [a_2, d_3]
+        self.vv = [1,1,1,1,1,1]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_keys(self):
+        c1 = stage_cache(self.dh, self.params, self.vv, dir=self.dir)
+        c2 = stage_cache(self.dh, self.params, [1,1,0,1,1,1], dir=self.dir)
+        self.assertEqual(c1.key('T_06'), c2.key('T_06'))  # vv not used for T_06
+        self.assertNotEqual(c1.key('jacobian'), c2.key('jacobian'))
+        self.assertNotEqual(c1.key('links'), c1.key('T_06'))
+        dh2 = sp.Matrix(self.dh)
+        dh2[2,1] = 0
+        c3 = stage_cache(dh2, self.params, self.vv, dir=self.dir)
+        self.assertNotEqual(c1.key('links'), c3.key('links'))
+        # numeric_params stages also depend on pvals
+        c4 = stage_cache(self.dh, self.params, self.vv, {a_2: 1}, dir=self.dir)
+        self.assertEqual(c1.key('links'), c4.key('links'))
+        # the lazy Robot depends on the number of equations it starts with
+        c5 = stage_cache(self.dh, self.params, self.vv, dir=self.dir, mstart=3)
+        self.assertEqual(c1.key('soa'), c5.key('soa'))
+        self.assertNotEqual(c1.key('soa_lazy'), c5.key('soa_lazy'))
+        self.assertNotEqual(c1.key('soa_simp'), c1.key('soa'))
+        self.assertNotEqual(c1.key('soa_simp_lazy'), c5.key('soa_simp_lazy'))
+        self.assertNotEqual(c1.key('links_num'), c4.key('links_num'))
+        self.assertEqual(c1.key('T_06_poly'), c4.key('T_06_poly'))
+        # poly_mode simplification depends on which joints are rotary
+        self.assertEqual(c1.key('T_06'), c2.key('T_06'))
+        self.assertNotEqual(c1.key('T_06_poly'), c2.key('T_06_poly'))
+        self.assertNotEqual(c1.key('mequations_simp_poly'), c2.key('mequations_simp_poly'))
+        self.assertNotEqual(c1.key('T_06_poly_num'), c4.key('T_06_poly_num'))
+
+    def test_stages(self):
+        c = stage_cache(self.dh, self.params, self.vv, dir=self.dir)
+        self.assertTrue(c.load('T_06') is None)
+
+        m = kc.mechanism(self.dh, list(self.params), self.vv)
+        m.fk_cache = c
+        m.forward_kinematics()
+        L = m.get_mequation_set()
+        self.assertFalse(os.path.isfile(c.filename('jacobian')))  # not derived yet
+        J = m.J66
+        for stage in ['links', 'T_06', 'jacobian', 'mequations']:
+            self.assertTrue(os.path.isfile(c.filename(stage)), stage)
+
+        # a second mechanism gets everything from the cache
+        m2 = kc.mechanism(self.dh, list(self.params), self.vv)
+        m2.fk_cache = stage_cache(self.dh, self.params, self.vv, dir=self.dir)
+        m2.forward_kinematics()
+        L2 = m2.get_mequation_set()
+        self.assertEqual(m2.T_06, m.T_06)
+        self.assertEqual(m2.J66, J)
+        self.assertEqual(len(L2), len(L))
+        self.assertEqual(L2[3].Ts, L[3].Ts)
+
+        # equations are only unpickled when used, entry by entry
+        self.assertTrue(isinstance(L2[5], stored_mequation))
+        self.assertTrue('Ts' not in L2[5].__dict__)
+        self.assertEqual(L2[5].entry_symbols(1,3), L[5].entry_symbols(1,3))
+        self.assertEqual(len(L2[5].entries), 0)
+        self.assertEqual(L2[5].entry(1,3), L[5].entry(1,3))
+        self.assertEqual(len(L2[5].entries), 2)
+        self.assertEqual(L2[5].Ts, L[5].Ts)
+        self.assertEqual(L2[5].Td, L[5].Td)
+        self.assertEqual(L2[5].auxeqns, [])
+        self.assertTrue('store' not in L2[5].__dict__)   # all read
+        self.assertTrue('Ts' not in L2[6].__dict__)
+        L3 = pickle.loads(pickle.dumps(L2))
+        self.assertEqual(L3[6].Ts, L[6].Ts)
+
+        # a matrix set before it is read is kept
+        L2[7].Ts = sp.eye(4)
+        self.assertEqual(L2[7].Td, L[7].Td)
+        self.assertEqual(L2[7].Ts, sp.eye(4))
+        self.assertEqual(L2[7].entry(0,0), [L[7].Td[0,0], 1])
+
+        # any stage data: every matrix equation in it is stored entry by entry
+        c.store('soa', {'mequation_list': L[0:2], 'first': L[0], 'n': 2})
+        d = c.load('soa')
+        self.assertTrue(c.filename('soa').endswith('.eqs'))
+        self.assertTrue(isinstance(d['first'], stored_mequation))
+        self.assertTrue(d['first'] is d['mequation_list'][0])
+        self.assertEqual(d['mequation_list'][1].Ts, L[1].Ts)
+        self.assertEqual(d['n'], 2)
+
+        # a damaged file is recomputed
+        with open(c.filename('T_06'), 'wb') as f:
+            f.write(b'junk')
+        self.assertTrue(c.load('T_06') is None)
+
+
+def run_test():
+    print('\n\n===============  Test fk_cache.py =====================')
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSolver011)
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
+
+if __name__ == "__main__":
+    run_test()
@@ -19,17 +19,25 @@ import unittest
 import re   # regular expressions for output conversions
 import sympy as sp
 import numpy as np
+import multiprocessing as mp
 
 from ikbtbasics.pykinsym import *
 
 from ikbtbasics.solutionGraphV3 import *
 
+from ikbtbasics.polytrig import trig_poly
+
 import ikbtfunctions.helperfunctions as hf
 
 
-#
-#  Configure here for speed if jacobian is not needed
-JACOBIAN = True       #  False = disable velocity calculations for FK speed
+# results of velocity_propagation().  They are derived (or read from the
+#   FK cache) the first time any of them is used, e.g. M.J66
+#   (per-link lists; the old names R_01, w_33 etc. still work, see
+#    mechanism.velocity_names())
+JACOBIAN_ATTRS = ['Rs', 'Ps', 'ws', 'vs', 'qdot', 'J66']
+
+# FK cache stages whose result depends on mechanism.poly_mode
+POLY_STAGES = ['T_06', 'jacobian', 'mequations_simp']
 
 # joint velocities of each link (qd stands for q-dot)
 (qd_0, qd_1, qd_2, qd_3, qd_4, qd_5, qd_6) = sp.symbols(('qd_0','qd_1','qd_2','qd_3','qd_4','qd_5','qd_6'))
@@ -45,12 +53,76 @@ JACOBIAN = True       #  False = disable velocity calculations for FK speed
 sp.init_printing()
 sp.var('x')
 
+#
+#   trigsimp() a list of expressions.  If nprocs > 1 the expressions are
+#   independent jobs in a pool of worker processes.  trigsimp is
+#   deterministic so the results are identical to the serial loop.
+#
+def trigsimp_list(exprs, nprocs=1):
+    if nprocs <= 1 or len(exprs) < 2:
+        return [sp.trigsimp(e) for e in exprs]
+    if 'fork' not in mp.get_all_start_methods():
+        # spawned workers would re-run the calling script (e.g. ikSolver.py)
+        print('trigsimp_list: no fork() on this platform, simplifying serially')
+        return [sp.trigsimp(e) for e in exprs]
+    with mp.get_context('fork').Pool(min(nprocs, len(exprs))) as pool:
+        return pool.map(sp.trigsimp, exprs, chunksize=1)
+
+# trigsimp() a 4x4 homogeneous transform (only the top 3 rows are non-trivial)
+#   same result as sp.trigsimp(T)
+def trigsimp_transform(T, nprocs=1):
+    if nprocs <= 1:
+        return sp.trigsimp(T)
+    T = sp.Matrix(T)
+    ij = [(i,j) for i in range(0,3) for j in range(0,4)]
+    simp = trigsimp_list([T[i,j] for (i,j) in ij], nprocs)
+    for k in range(len(ij)):
+        T[ij[k]] = simp[k]
+    T[3,:] = T[3,:].applyfunc(sp.trigsimp)
+    return sp.ImmutableMatrix(T)
+
 #  Kinematic Equation class
+#
+#   The canonical form of an equation is  RHS-LHS  (sign normalized,
+#     sympy keeps the terms in its own order).  Equations with the sides
+#     swapped or the signs flipped have the same form, which is computed
+#     once.  It is a key for removing duplicates (see updateL), == and
+#     hash() are not changed by it.
+#
 class kequation:
+    _string = None       # (class defaults also cover pickles from before)
+    _canonical = None
+
     def __init__(self,LHS=x,RHS=x):
         self.LHS = LHS
         self.RHS = RHS
-        self.string = str(LHS) + ' = '+ str(RHS)
+        self._string = None
+        self._canonical = None
+
+    # str() of a big expression is slow, so only make it when asked for
+    @property
+    def string(self):
+        if self._string is None:
+            self._string = str(self.LHS) + ' = '+ str(self.RHS)
+        return self._string
+
+    @string.setter
+    def string(self, s):
+        self._string = s
+
+    def canonical(self):
+        if self._canonical is None:
+            e = sp.sympify(self.RHS - self.LHS)
+            if e.could_extract_minus_sign():
+                e = -e
+            self._canonical = e
+        return self._canonical
+
+    # same relation, but maybe in another form?  (see hf.is_zero)
+    def equivalent(self, other, confirm=True):
+        d = self.canonical()
+        o = other.canonical()
+        return hf.is_zero(d - o, confirm) or hf.is_zero(d + o, confirm)
 
     def prt(self):
         print(self.LHS, ' = ', self.RHS)
@@ -295,6 +367,8 @@ class unknown(object):
 
 
 class matrix_equation:
+    version = 0   # goes up on every change of Td, Ts (see changed())
+
     def __init__(self, Td=sp.zeros(4), Ts=sp.zeros(4)):
         self.Td = sp.zeros(4)  # LHS (T desired)
         self.Ts = sp.zeros(4)  # RHS (T symbolic)
@@ -306,6 +380,19 @@ class matrix_equation:
                 self.Ts[i,j] = Ts[i,j]
         self.Td[3,3] = 1  # handle row 4
         self.Ts[3,3] = 1
+    # Td or Ts has been changed (by a transform): anything kept about this
+    #   equation (e.g. the equation lists) is out of date
+    def changed(self):
+        self.version += 1
+
+    # [Td[i,j], Ts[i,j]]
+    def entry(self, i, j):
+        return [self.Td[i,j], self.Ts[i,j]]
+
+    # free symbols of entry (i,j) (both sides)
+    def entry_symbols(self, i, j):
+        return hf.expr_index(self.Td[i,j])[0] | hf.expr_index(self.Ts[i,j])[0]
+
     # put the matrix elements (Td,Ts) into a list of equations
     def get_kequation_list(self):
         list = []
@@ -327,30 +414,99 @@ class mechanism:
     def __init__(self, dh, params, varvect):
         self.DH = dh
         self.vv = varvect
+        self.nlinks = dh.shape[0]   # number of links (rows of the DH table)
         self.params = params    # constant parameters a_4 etc
         self.pvals = {}         # dict for numerical param values
         self.jlims = np.array([ # numerical joint limits
-        [-np.pi, np.pi],
-        [-np.pi, np.pi],
-        [-np.pi, np.pi],
-        [-np.pi, np.pi],
-        [-np.pi, np.pi],
-        [-np.pi, np.pi]
-        ])
-        self.jnum = np.matrix(np.zeros(36).reshape(6,6))  # a place to store numerical Jacobian
+            [-np.pi, np.pi] for i in range(self.nlinks)
+            ])
+        ndof = len([i for i in range(self.nlinks) if not self.is_pruned(i)])  # (= len(self.joint_vars()))
+        self.jnum = np.zeros((1,6,ndof))  # numerical Jacobians of the last jacobian_numeric() batch
+        self.chain_cache = {}   # memoized link chain products (see get_mequation())
+        self.nprocs = 1         # >1: trigsimp T_06 and equations in a process pool
+        self.poly_mode = False  # True: simplify with s_i/c_i polynomials instead of trigsimp
+        self.numeric_params = False  # True: substitute exact pvals for params before the products
+        self.fk_cache = None    # a fk_cache.stage_cache to save/reload derivation stages
+        self.mequation_start = None  # n: get_mequation_set() gives the first n only (see next_mequation())
+        self.mequation_simplify = False  # True: get_mequation_set() simplifies the equations (by default)
+        self.mequation_pending = []  # the rest of the set, in order
+        self.fk_compiled = None # numpy version of T_06 (see fk_numeric())
+        self.jac_compiled = None # numpy version of J66 (see jacobian_numeric())
+
+    # compiled (lambdified) functions can't be pickled: they are rebuilt when needed
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['fk_compiled'] = None
+        state['jac_compiled'] = None
+        return state
+
+    # fetch a stage of the derivation from the FK cache (None if not there)
+    def load_stage(self, stage):
+        if self.fk_cache is None:
+            return None
+        return self.fk_cache.load(self.stage_name(stage))
+
+    def store_stage(self, stage, data):
+        if self.fk_cache is not None:
+            self.fk_cache.store(self.stage_name(stage), data)
+
+    # polynomial simplification gives different (equivalent) results and
+    #   numeric_params results depend on pvals: keep them apart
+    def stage_name(self, stage):
+        if self.poly_mode and stage in POLY_STAGES:
+            stage += '_poly'
+        if self.numeric_params:
+            stage += '_num'
+        return stage
+
+    # params with a value in pvals -> exact (rational) values
+    def numeric_param_subs(self):
+        subs = {}
+        for p in self.params:
+            if p in self.pvals:
+                subs[p] = exact_value(self.pvals[p])
+        return subs
+
+    #  s_i/c_i polynomial simplifier for this mechanism's joint angles
+    #   (consecutive rotary joints with alpha = 0 or pi have parallel axes)
+    def get_trig_poly(self):
+        angles = []
+        parallel = []
+        prev = None    # angle of previous link if it is rotary
+        for i in range(self.nlinks):
+            if self.pruned[i]:
+                continue
+            th = self.DH[i,3]
+            if self.vv[i] == 1 and th.is_Symbol:
+                angles.append(th)
+                if prev is not None and (self.DH[i,0] == 0 or self.DH[i,0] == sp.pi):
+                    parallel.append((prev, th))
+                prev = th
+            else:
+                prev = None
+        return trig_poly(angles, parallel)
+
+    # simplify a transform (T_06) with trigsimp or polynomial reduction
+    def simplify_transform(self, T):
+        if self.poly_mode:
+            return sp.ImmutableMatrix(self.get_trig_poly().simplify_matrix(T))
+        return trigsimp_transform(T, self.nprocs)
+
+    #  A DH row of all zeros (used to pad robots with < 6 DOF) is the
+    #   identity transform.  Such links are left out of all symbolic products.
+    def is_pruned(self, i):
+        for j in range(4):
+            if self.DH[i,j] != 0:
+                return False
+        return True
 
 
     ###############  compute kinematic transforms and equations for the manipulator (including Jacobian)
     def forward_kinematics(self):
 
-        ###   set up symbolic variables
-        if(JACOBIAN):
-            # angular velocities of each link
-            (self.w_00, self.w_11, self.w_22, self.w_33, self.w_44, self.w_55, self.w_66) =           sp.symbols(('self.w_00','self.w_11','self.w_22','self.w_33','self.w_44','self.w_55','self.w_66'))
-
-            # linear velocities of each link
-            (self.v_00, self.v_11, self.v_22, self.v_33, self.v_44, self.v_55, self.v_66) =           sp.symbols(('self.v_00','self.v_11','self.v_22','self.v_33','self.v_44','self.v_55','self.v_66'))
-
+        # links are about to change: drop any Jacobian derived from the old ones
+        for name in JACOBIAN_ATTRS:
+            self.__dict__.pop(name, None)
 
         # standardize on the order "alpha N-1, a N-1, d N, theta N' for the DH table columns.
         al = 0   # Alpha_{n-1)
@@ -358,76 +514,160 @@ class mechanism:
         d = 2    # d_n
         th = 3   # th_n
 
-        # find any alphas which are not n*90deg
-        alpha_subs = {}
-        for i in range(6):
-            alpha_i = self.DH[i,al]
-            if not (sp.sin(alpha_i) == 0 or sp.cos(alpha_i) == 0):  # alpha is not "nice"
-                tmpvc = sp.var(f'ca{i}')  # create new parameter for cos(al)-> ca1, ca2, etc
-                tmpvs = sp.var(f'sa{i}')  # create new parameter for sin(al)
-
-                self.params.append(tmpvc)   #
-                self.params.append(tmpvs)   #
-                self.pvals[tmpvc] = f'np.cos({alpha_i})'
-                self.pvals[tmpvs] = f'np.sin({alpha_i})'
-
-                alpha_subs[sp.cos(alpha_i)] = tmpvc  # we will make these subs in the T matrics
-                alpha_subs[sp.sin(alpha_i)] = tmpvs
-
-        #  symbolic 4x4 transforms for each link
-        self.T_01 = Link_S(self.DH[0,al], self.DH[0,a], self.DH[0,d], self.DH[0,th])
-        self.T_12 = Link_S(self.DH[1,al], self.DH[1,a], self.DH[1,d], self.DH[1,th])
-        self.T_23 = Link_S(self.DH[2,al], self.DH[2,a], self.DH[2,d], self.DH[2,th])
-        self.T_34 = Link_S(self.DH[3,al], self.DH[3,a], self.DH[3,d], self.DH[3,th])
-        self.T_45 = Link_S(self.DH[4,al], self.DH[4,a], self.DH[4,d], self.DH[4,th])
-        self.T_56 = Link_S(self.DH[5,al], self.DH[5,a], self.DH[5,d], self.DH[5,th])
-
-        # there a fairly rare class of robots in which cos(al)/sin(al) does not
-        #evaluate to  {-1,0,1}! (Raven-II is a member!)
-        # We would like to substitute in numerical value instead of 'cos(al_1)' etc.
-        #  for better simplification downstream
-
-        if True:
-            # replace not-nice sin/cos(alpha) with constants
-            self.T_01 = self.T_01.subs(alpha_subs).doit()
-            self.T_12 = self.T_12.subs(alpha_subs).doit()
-            self.T_23 = self.T_23.subs(alpha_subs).doit()
-            self.T_34 = self.T_34.subs(alpha_subs).doit()
-            self.T_45 = self.T_45.subs(alpha_subs).doit()
-            self.T_56 = self.T_56.subs(alpha_subs).doit()
-        else:
-            # replace all constant parameters with numerical values
-            self.T_01 = self.T_01.subs(self.pvals).doit()
-            self.T_12 = self.T_12.subs(self.pvals).doit()
-            self.T_23 = self.T_23.subs(self.pvals).doit()
-            self.T_34 = self.T_34.subs(self.pvals).doit()
-            self.T_45 = self.T_45.subs(self.pvals).doit()
-            self.T_56 = self.T_56.subs(self.pvals).doit()
-            # (too many float constants in generated code so this is disabled)
-
-        #  here is the full FK derivation:
-        self.T_06 = sp.trigsimp(self.T_01 * self.T_12 * self.T_23 * self.T_34 * self.T_45 * self.T_56)
+        self.pruned = [self.is_pruned(i) for i in range(self.nlinks)]
+
+        stage = self.load_stage('links')   # link transforms from the FK cache
+        if stage is None:
+            # find any alphas which are not n*90deg
+            alpha_subs = {}
+            alpha_params = []
+            alpha_pvals = {}
+            for i in range(self.nlinks):
+                alpha_i = self.DH[i,al]
+                if not (sp.sin(alpha_i) == 0 or sp.cos(alpha_i) == 0):  # alpha is not "nice"
+                    tmpvc = sp.var(f'ca{i}')  # create new parameter for cos(al)-> ca1, ca2, etc
+                    tmpvs = sp.var(f'sa{i}')  # create new parameter for sin(al)
+
+                    alpha_params.append(tmpvc)   #
+                    alpha_params.append(tmpvs)   #
+                    alpha_pvals[tmpvc] = f'np.cos({alpha_i})'
+                    alpha_pvals[tmpvs] = f'np.sin({alpha_i})'
+
+                    alpha_subs[sp.cos(alpha_i)] = tmpvc  # we will make these subs in the T matrics
+                    alpha_subs[sp.sin(alpha_i)] = tmpvs
+
+            #  symbolic 4x4 transforms for each link
+            # there a fairly rare class of robots in which cos(al)/sin(al) does not
+            #evaluate to  {-1,0,1}! (Raven-II is a member!)
+            # We would like to substitute in numerical value instead of 'cos(al_1)' etc.
+            #  for better simplification downstream
+            #  With numeric_params the constant parameters are replaced too, by
+            #  exact rationals (floats from pvals gave too much float clutter
+            #  in the generated code) so the products are much smaller.
+            if self.numeric_params:
+                param_subs = self.numeric_param_subs()
+            Ts = []
+            for i in range(self.nlinks):
+                if self.pruned[i]:
+                    Ts.append(sp.eye(4))
+                else:
+                    T = Link_S(self.DH[i,al], self.DH[i,a], self.DH[i,d], self.DH[i,th])
+                    # replace not-nice sin/cos(alpha) with constants
+                    T = T.subs(alpha_subs).doit()
+                    if self.numeric_params:
+                        T = T.subs(param_subs)
+                    Ts.append(T)
+
+            stage = {'T': Ts, 'alpha_params': alpha_params, 'alpha_pvals': alpha_pvals}
+            self.store_stage('links', stage)
+
+        for p in stage['alpha_params']:
+            self.params.append(p)
+        self.pvals.update(stage['alpha_pvals'])
 
         # list of T_ij matrices (used in inverse kinematics update
-        self.Ts = [self.T_01, self.T_12, self.T_23, self.T_34, self.T_45, self.T_56]
-
-        if(JACOBIAN):
-            # Rotation sub matrices:
-            self.R_01 = self.T_01[0:3, 0:3]
-            self.R_12 = self.T_12[0:3, 0:3]
-            self.R_23 = self.T_23[0:3, 0:3]
-            self.R_34 = self.T_34[0:3, 0:3]
-            self.R_45 = self.T_45[0:3, 0:3]
-            self.R_56 = self.T_56[0:3, 0:3]
-
-            # position offset vectors
-            self.P_01 = self.T_01[0:3, 3]
-            self.P_12 = self.T_12[0:3, 3]
-            self.P_23 = self.T_23[0:3, 3]
-            self.P_34 = self.T_34[0:3, 3]
-            self.P_45 = self.T_45[0:3, 3]
-            self.P_56 = self.T_56[0:3, 3]
+        self.Ts = stage['T']
+        for i in range(self.nlinks):   # also as self.T_01, self.T_12, ...
+            setattr(self, f'T_{i}{i+1}', self.Ts[i])
+        self.chain_cache = {}   # links have changed: forget old chain products
+        self.fk_compiled = None
+        self.jac_compiled = None
+
+        #  here is the full FK derivation (T_06 is base to tool for any number of links):
+        stage = self.load_stage('T_06')
+        if stage is None:
+            stage = self.simplify_transform(self.link_product(0, self.nlinks))
+            self.store_stage('T_06', stage)
+        self.T_06 = stage
+
+    # joint variables (th_n for rotary, d_n for prismatic) of the links which
+    #   are not pruned, in order.  These are the columns of a pose array q.
+    def joint_vars(self):
+        jv = []
+        for i in range(self.nlinks):
+            if not self.pruned[i]:
+                if self.vv[i] == 1:
+                    jv.append(self.DH[i,3])
+                else:
+                    jv.append(self.DH[i,2])
+        return jv
+
+    #
+    #  Numerical FK for a batch of poses:
+    #    q:      (N, ndof) array of joint values, columns in joint_vars() order
+    #    params: {a_2: 5, d_4: 4, ...}
+    #    returns (N, 4, 4) array of T_06
+    #
+    #  T_06 is compiled into a numpy function the first time and re-used.
+    #
+    def fk_numeric(self, q, params):
+        if self.fk_compiled is None:
+            self.fk_compiled = compile_matrix(self.T_06, self.joint_vars())
+        return eval_compiled(self.fk_compiled, (4,4), q, params)
 
+    #
+    #  Numerical Jacobian for a batch of poses (q, params as in fk_numeric())
+    #    returns (N, 6, ndof) array, also kept in self.jnum
+    #    (columns of pruned links are left out, rows are v, w in link N coords)
+    #
+    def jacobian_numeric(self, q, params):
+        if self.jac_compiled is None:
+            cols = [i for i in range(self.nlinks) if not self.pruned[i]]
+            self.jac_compiled = compile_matrix(self.J66[:, cols], self.joint_vars())
+        self.jnum = eval_compiled(self.jac_compiled, (6, len(self.joint_vars())), q, params)
+        return self.jnum
+
+    #
+    #  The Jacobian (and the link velocities it comes from) are only derived
+    #   when one of them is asked for.  IK-only runs never pay for them.
+    #
+    def __getattr__(self, name):
+        # (only called when normal attribute lookup fails)
+        if 'Ts' in self.__dict__:
+            if name in JACOBIAN_ATTRS:
+                self.derive_jacobian()
+                return self.__dict__[name]
+            names = self.velocity_names()
+            if name in names:    #  e.g. self.w_33 is self.ws[3]
+                self.derive_jacobian()
+                [lname, i] = names[name]
+                return self.__dict__[lname][i]
+        raise AttributeError("'mechanism' object has no attribute '" + name + "'")
+
+    # per-link names of the velocity propagation results
+    def velocity_names(self):
+        names = {}
+        for i in range(self.nlinks):
+            names[f'R_{i}{i+1}'] = ['Rs', i]
+            names[f'P_{i}{i+1}'] = ['Ps', i]
+        for i in range(self.nlinks+1):
+            names[f'w_{i}{i}'] = ['ws', i]
+            names[f'v_{i}{i}'] = ['vs', i]
+        return names
+
+    def derive_jacobian(self):
+        stage = self.load_stage('jacobian')
+        if stage is None:
+            self.velocity_propagation()
+            stage = {}
+            for name in JACOBIAN_ATTRS:
+                stage[name] = self.__dict__[name]
+            self.store_stage('jacobian', stage)
+        for name in stage.keys():
+            setattr(self, name, stage[name])
+
+
+    #
+    #  Velocity propagation (link by link) for the Jacobian matrix J66
+    #   uses the link transforms computed in forward_kinematics()
+    #   (J66 is 6 x nlinks)
+    #
+    def velocity_propagation(self):
+        al = 0   # Alpha_{n-1) column of DH table
+        N = self.nlinks
+        # Rotation sub matrices and position offset vectors
+        self.Rs = [T[0:3, 0:3] for T in self.Ts]
+        self.Ps = [T[0:3, 3] for T in self.Ts]
 
         ###################################################
         #
@@ -438,96 +678,47 @@ class mechanism:
         #   if \theta_j =0, then we should look for sin(theta_j-1 + theta_j) etc.
         #
 
-        simp = np.zeros(6)
-        for j in range(1,5):  # we will only trigsimp if \alpha_N-1 == {0,pi} signifying
-                            # parallel axes
+        simp = np.zeros(N)
+        for j in range(1,N-1):  # we will only trigsimp if \alpha_N-1 == {0,pi} signifying
+                        # parallel axes
             if(self.DH[j,al] == 0 or self.DH[j,al] ==  sp.pi):
                 simp[j] = 1
 
-
-        if(JACOBIAN):
-            # velocity propagation for the Jacobian matrix
-            ##########################
-            # angular
-            self.v_00 = sp.Matrix([0,0,0])
-            self.w_00 = sp.Matrix([0,0,0])
-
-            self.w_11 = self.R_01.T * self.w_00
-            if(self.vv[0] == 1):
-                self.w_11 += sp.Matrix([0,0,qd_1])
-
-            self.w_22 = self.R_12.T * self.w_11
-            if(self.vv[1] == 1):
-                self.w_22 += sp.Matrix([0,0,qd_2])
-            if(simp[1]):
-                self.w_22 = sp.trigsimp(self.w_22)
-
-            self.w_33 = self.R_23.T * self.w_22
-            if(self.vv[2] == 1):
-                self.w_33 += sp.Matrix([0,0,qd_3])
-            if(simp[2]):
-                self.w_33 = sp.trigsimp(self.w_33)
-
-            self.w_44 = self.R_34.T * self.w_33
-            if(self.vv[3] == 1):
-                self.w_44 += sp.Matrix([0,0,qd_4])
-            if(simp[3]):
-                self.w_44 = sp.trigsimp(self.w_44)
-
-            self.w_55 = self.R_45.T * self.w_44
-            if(self.vv[4] == 1):
-                self.w_55 += sp.Matrix([0,0,qd_5])
-            if(simp[4]):
-                self.w_55 = sp.trigsimp(self.w_55)
-
-            self.w_66 = self.R_56.T * self.w_55
-            if(self.vv[5] == 1):
-                self.w_66 += sp.Matrix([0,0,qd_6])
-            if(simp[5]):
-                self.w_66 = sp.trigsimp(self.w_66)
-
-            #########################
-            ###linear
-            self.v_00 = sp.Matrix([0,0,0])
-
-            self.v_11 = self.R_01.T*(self.v_00 + self.w_00.cross(self.P_01))
-            if(self.vv[0] == 0):
-                self.v_11 += sp.Matrix([0,0,qd_1])
-
-            self.v_22 = self.R_12.T*(self.v_11 + self.w_11.cross(self.P_12))
-            if(self.vv[1] == 0):
-                self.v_22 += sp.Matrix([0,0,qd_2])
-            if(simp[1]):
-                self.v_22 = sp.trigsimp(self.v_22)
-
-            self.v_33 = self.R_23.T*(self.v_22 + self.w_22.cross(self.P_23))
-            if(self.vv[2] == 0):
-                self.v_33 += sp.Matrix([0,0,qd_3])
-            if(simp[2]):
-                self.v_33 = sp.trigsimp(self.v_33)
-
-            self.v_44 = self.R_34.T*(self.v_33 + self.w_33.cross(self.P_34))
-            if(self.vv[3] == 0):
-                self.v_44 += sp.Matrix([0,0,qd_4])
-            if(simp[3]):
-                self.v_44 = sp.trigsimp(self.v_44)
-
-            self.v_55 = self.R_45.T*(self.v_44 + self.w_44.cross(self.P_45))
-            if(self.vv[4] == 0):
-                self.v_55 += sp.Matrix([0,0,qd_5])
-            if(simp[4]):
-                self.v_55 = sp.trigsimp(self.v_55)
-
-            self.v_66 = self.R_56.T*(self.v_55 + self.w_55.cross(self.P_56))
-            if(self.vv[5] == 0):
-                self.v_66 += sp.Matrix([0,0,qd_6])
-            if(simp[5]):
-                self.v_66 = sp.trigsimp(self.v_66)
-
-            self.qdot = sp.Matrix([qd_1, qd_2, qd_3, qd_4, qd_5, qd_6])
-
-            self.J66  = ManipJacobian_S(self.v_66, self.w_66, self.qdot)
-
+        # joint velocities
+        qd = [qd_1, qd_2, qd_3, qd_4, qd_5, qd_6]
+        for i in range(len(qd), N):
+            qd.append(sp.var(f'qd_{i+1}'))
+        self.qdot = sp.Matrix(qd[0:N])
+
+        tp = None
+        if self.poly_mode:
+            tp = self.get_trig_poly()
+
+        # velocity propagation for the Jacobian matrix
+        #   link i+1 angular (w) and linear (v) velocity from link i
+        self.ws = [sp.Matrix([0,0,0])]
+        self.vs = [sp.Matrix([0,0,0])]
+        for i in range(N):
+            w = self.ws[i]
+            v = self.vs[i]
+            if not self.pruned[i]:    # (a pruned link has R = I, P = 0 and no joint)
+                v = self.Rs[i].T*(v + w.cross(self.Ps[i]))
+                w = self.Rs[i].T * w
+                if(self.vv[i] == 1):
+                    w = w + sp.Matrix([0,0,qd[i]])
+                else:
+                    v = v + sp.Matrix([0,0,qd[i]])
+            if(simp[i]):
+                if tp is None:
+                    w = sp.trigsimp(w)
+                    v = sp.trigsimp(v)
+                else:
+                    w = tp.simplify_matrix(w)
+                    v = tp.simplify_matrix(v)
+            self.ws.append(w)
+            self.vs.append(v)
+
+        self.J66  = ManipJacobian_S(self.vs[N], self.ws[N], self.qdot)
 
     ###################################################
     #
@@ -544,49 +735,208 @@ class mechanism:
     #    T10*Td*T65 = T12*T23*T34*T45  (needed for UR5)
     #    T21*T10*Td*T65*T54 = T23*T34
     #
+    #  (shown for 6 links; any number of links works the same way)
+    #
 
 
-    def get_mequation_set(self):
+    def get_mequation_set(self, simplify=None):
+        if simplify is None:
+            simplify = getattr(self, 'mequation_simplify', False)
         self.Td = hf.ik_lhs()
+        stagename = 'mequations'
+        if simplify:
+            stagename = 'mequations_simp'
+        stage = self.load_stage(stagename)
+        start = getattr(self, 'mequation_start', None)
+        self.mequation_simplify = simplify
+        if stage is not None:
+            [list, self.T_06] = stage
+            if start is not None:
+                self.mequation_pending = list[start:]
+                list = list[:start]
+            return list
+
+        order = self.mequation_order()
+        if start is not None:
+            #  the rest are made by next_mequation() when they are needed
+            #   (a partial set is not stored in the fk cache)
+            self.mequation_pending = order[start:]
+            order = order[:start]
         list = []
-        lhs = self.Td
-        rhs = self.T_01*self.T_12*self.T_23*self.T_34*self.T_45*self.T_56
-        list.append(matrix_equation(lhs,rhs))
-
-        self.T_06 = rhs
-
-        lhs = H_inv_S(self.T_01)*self.Td
-        rhs =           self.T_12*self.T_23*self.T_34*self.T_45*self.T_56
-        list.append(matrix_equation(lhs,rhs))
+        for (nl, nr) in order:
+            list.append(self.get_mequation(nl, nr))
 
-        lhs = H_inv_S(self.T_12)*H_inv_S(self.T_01)*self.Td
-        rhs =                 self.T_23*self.T_34*self.T_45*self.T_56
-        list.append(matrix_equation(lhs,rhs))
+        self.T_06 = self.link_product(0, self.nlinks)
 
-        lhs = H_inv_S(self.T_23)*H_inv_S(self.T_12)*H_inv_S(self.T_01)*self.Td
-        rhs =                           self.T_34*self.T_45*self.T_56
-        list.append(matrix_equation(lhs,rhs))
+        if simplify:
+            self.simplify_mequations(list)
 
-        lhs = H_inv_S(self.T_34)*H_inv_S(self.T_23)*H_inv_S(self.T_12)*H_inv_S(self.T_01)*self.Td
-        rhs =                                     self.T_45*self.T_56
-        list.append(matrix_equation(lhs,rhs))
-
-        lhs = H_inv_S(self.T_45)*H_inv_S(self.T_34)*H_inv_S(self.T_23)*H_inv_S(self.T_12)*H_inv_S(self.T_01)*self.Td
-        rhs =                                               self.T_56
-        list.append(matrix_equation(lhs,rhs))
+        if start is None:
+            self.store_stage(stagename, [list, self.T_06])
+        return list
 
+    #  (n_left, n_right) for each equation of the set: number of link inverses
+    #    moved to the left (from the base end) and right (from the tool end) of Td
+    #    Moving pruned links gives the same equation again (or one with an
+    #    identity RHS), so each is given once, with pruned links left in place.
+    def mequation_order(self):
+        N = self.nlinks
+        order = []
+        def add(nl, nr):
+            nl = self.unpruned_end(nl)
+            nr = N - self.unpruned_start(N - nr)
+            if self.unpruned_start(nl) < N - nr and (nl, nr) not in order:
+                order.append((nl, nr))
+        for nl in range(0,N):
+            add(nl, 0)
         # Aug 18 new equations added
+        for n in [1, 2]:
+            if n + n < N:
+                add(n, n)
+        return order
+
+    #  next matrix equation of a lazy set (mequation_start), None when all
+    #    have been given out.  They come from the shared chain products.
+    def next_mequation(self):
+        pending = getattr(self, 'mequation_pending', [])
+        if len(pending) == 0:
+            return None
+        m = pending.pop(0)
+        if isinstance(m, tuple):
+            m = self.get_mequation(m[0], m[1])
+            if self.mequation_simplify:
+                self.simplify_mequations([m])
+        return m
+
+    # trigsimp every entry (both sides) of a list of matrix equations
+    #   (or use polynomial simplification in poly_mode)
+    #   all entries of all the equations go to the pool as one batch
+    def simplify_mequations(self, mlist):
+        ij = [(i,j) for i in range(0,3) for j in range(0,4)]
+        exprs = []
+        for m in mlist:
+            exprs += [m.Td[i,j] for (i,j) in ij]
+            exprs += [m.Ts[i,j] for (i,j) in ij]
+        if self.poly_mode:
+            tp = self.get_trig_poly()
+            simp = [tp.simplify(e) for e in exprs]
+        else:
+            simp = trigsimp_list(exprs, self.nprocs)
+        k = 0
+        for m in mlist:
+            for (i,j) in ij:
+                m.Td[i,j] = simp[k]
+                k += 1
+            for (i,j) in ij:
+                m.Ts[i,j] = simp[k]
+                k += 1
+            m.changed()
+        return mlist
 
-        lhs = H_inv_S(self.T_01)*self.Td*H_inv_S(self.T_56)
-        rhs =                     self.T_12*self.T_23*self.T_34*self.T_45
-        list.append(matrix_equation(lhs,rhs))
-
-        lhs = H_inv_S(self.T_12)*H_inv_S(self.T_01)*self.Td*H_inv_S(self.T_56)*H_inv_S(self.T_45)
-        rhs =                          self.T_23*self.T_34
-        list.append(matrix_equation(lhs,rhs))
-
+    #
+    #   One matrix equation of the family above:
+    #
+    #    T(nl-1,nl)^-1 ... T01^-1 * Td * T65^-1 ... = T(nl,nl+1) ... T(N-1-nr,N-nr)
+    #
+    #   Both sides come from memoized partial products, so each product of
+    #   adjacent links is computed only once for the whole set.  The products
+    #   are grouped left to right, ((T01*T12)*T23)..., as written above (the
+    #   grouping changes the form of the result), so they share prefixes:
+    #     RHS: link_product(), prefixes of the chains starting at link nl
+    #     LHS: inverse_product()*Td, then one more T^-1 on the right for each nr
+    #   Pruned (all zero DH row) links are identities and are left out.
+    #
+    def get_mequation(self, nl, nr):
+        N = self.nlinks
+        assert (nl + nr < N), 'get_mequation: no links left for the RHS'
+        if not hasattr(self, 'Td'):
+            self.Td = hf.ik_lhs()
+        nl = self.unpruned_end(nl)
+        nr = N - self.unpruned_start(N - nr)
+        lhs = self.lhs_product(nl, nr)
+        rhs = self.link_product(nl, N-nr)
+        return matrix_equation(lhs, rhs)
+
+    # smallest j <= i with only pruned links in j..i-1 (same product as i)
+    def unpruned_end(self, i):
+        while i > 0 and self.pruned[i-1]:
+            i -= 1
+        return i
+
+    # largest j >= i with only pruned links in i..j-1
+    def unpruned_start(self, i):
+        while i < self.nlinks and self.pruned[i]:
+            i += 1
+        return i
+
+    # one product for the chain cache (n_products counts them)
+    def chain_mul(self, A, B):
+        self.n_products = getattr(self, 'n_products', 0) + 1
+        return A * B
+
+    def link_inverse(self, i):
+        key = ('Tinv', i)
+        inv = self.chain_cache.get(key)
+        if inv is None:
+            inv = H_inv_S(self.Ts[i])
+            self.chain_cache[key] = inv
+        return inv
 
-        return list
+    #
+    #  T_(i,i+1) * ... * T_(n-1,n), grouped left to right:
+    #    ((T_(i,i+1) * T_(i+1,i+2)) * ...) * T_(n-1,n), memoized on (i, n)
+    #  so all the chains starting at link i share their prefixes.
+    #
+    def link_product(self, i, n):
+        i = self.unpruned_start(i)
+        n = self.unpruned_end(n)
+        if i >= n:     # e.g. a chain of pruned links
+            return sp.eye(4)
+        k = self.unpruned_end(n-1)
+        if k <= i:
+            return self.Ts[i]
+        key = ('T', i, n)
+        prod = self.chain_cache.get(key)
+        if prod is None:
+            prod = self.chain_mul(self.link_product(i, k), self.Ts[n-1])
+            self.chain_cache[key] = prod
+        return prod
+
+    #  T_(nl-1,nl)^-1 * ... * T_01^-1  (nl > 0), grouped left to right
+    #    (chains with a different nl have no common prefix)
+    def inverse_product(self, nl):
+        nl = self.unpruned_end(nl)
+        key = ('Tinv*', nl)
+        prod = self.chain_cache.get(key)
+        if prod is None:
+            for i in reversed(range(nl)):
+                if self.pruned[i]:
+                    continue
+                if prod is None:
+                    prod = self.link_inverse(i)
+                else:
+                    prod = self.chain_mul(prod, self.link_inverse(i))
+            self.chain_cache[key] = prod
+        return prod
+
+    #  LHS T_(nl-1,nl)^-1 ... T_01^-1 * Td * T_(N-1,N)^-1 ... T_(N-nr,N-nr+1)^-1,
+    #    grouped left to right: the one for nr-1 times T_(N-nr,N-nr+1)^-1
+    def lhs_product(self, nl, nr):
+        N = self.nlinks
+        nl = self.unpruned_end(nl)
+        nr = N - self.unpruned_start(N - nr)
+        if nl == 0 and nr == 0:
+            return self.Td
+        key = ('L', nl, nr)
+        prod = self.chain_cache.get(key)
+        if prod is None:
+            if nr > 0:
+                k = N - self.unpruned_start(N - nr + 1)
+                prod = self.chain_mul(self.lhs_product(nl, k), self.link_inverse(N-nr))
+            else:
+                prod = self.chain_mul(self.inverse_product(nl), self.Td)
+            self.chain_cache[key] = prod
+        return prod
 
 
 #########################################################################################
@@ -594,20 +944,85 @@ class mechanism:
 #      Numerical Functions
 #
 
+#
+#   Compile the entries of a symbolic matrix A into one numpy function of
+#     (joint variables, constant parameters)
+#   returns [function, list of parameter symbols]
+#
+def compile_matrix(A, jvars):
+    psyms = sorted(A.free_symbols - set(jvars), key=str)
+    f = sp.lambdify(list(jvars) + psyms, list(A), modules='numpy', cse=True)
+    return [f, psyms]
+
+# numerical value of a parameter
+#   (pvals can contain strings like 'np.cos(pi/3)' for alpha constants)
+def param_value(v):
+    if isinstance(v, str):
+        v = sp.sympify(v.replace('np.', ''))
+    return float(v)
+
+# exact sympy value of a parameter: 0.4318 -> 2159/5000
+def exact_value(v):
+    if isinstance(v, str):
+        return sp.sympify(v.replace('np.', ''))
+    return sp.nsimplify(v, rational=True)
+
+#
+#   Evaluate a compiled matrix for a batch of joint values
+#     q: (N, ndof) array (one pose per row, a single pose may be 1D)
+#     params: dict of parameter values (keyed by symbol or by name)
+#     returns an (N,) + shape array
+#
+def eval_compiled(compiled, shape, q, params):
+    [f, psyms] = compiled
+    q = np.atleast_2d(np.asarray(q, dtype=float))
+    pv = []
+    for p in psyms:
+        if p in params:
+            pv.append(param_value(params[p]))
+        elif str(p) in params:
+            pv.append(param_value(params[str(p)]))
+        else:
+            assert False, 'eval_compiled: no numerical value for parameter ' + str(p)
+    vals = f(*([q[:,k] for k in range(q.shape[1])] + pv))
+    out = np.empty((q.shape[0],) + shape)
+    ncols = shape[1]
+    for k in range(len(vals)):
+        out[:, k // ncols, k % ncols] = vals[k]     # (constant entries are broadcast)
+    return out
+
 # sample pose: {th_1: 30*deg, th_2: 45*deg}
 # sample params: {a_1: 2, l_4: 10}
 # M: a mechanism
 
-def forward_kinematics_N(M, pose, params):
-    pp = pose.copy()
-    pp.update(params)    # combine the pose and the params
-    T1 = sp.N(M.T_06.subs(pp))    # substitute for all symbols (including sp.pi)
-
-    # test to make sure all symbols are substituted with numeric values
-    Num_check(T1)     # this quits if fails
+#
+#   Yoshikawa manipulability sqrt(det(J J^T)) of each Jacobian in a batch
+#     J: (N, 6, ndof) e.g. from mechanism.jacobian_numeric()
+#     (uses J^T J for robots with fewer than 6 joints)
+#
+def manipulability(J):
+    J = np.asarray(J)
+    Jt = np.swapaxes(J, -1, -2)
+    if J.shape[-1] < J.shape[-2]:
+        A = Jt @ J
+    else:
+        A = J @ Jt
+    return np.sqrt(np.abs(np.linalg.det(A)))
+
+#   condition number (max/min singular value) of each Jacobian in a batch
+#     (inf at a singularity)
+def condition_number(J):
+    sv = np.linalg.svd(np.asarray(J), compute_uv=False)
+    with np.errstate(divide='ignore'):
+        return sv[..., 0] / sv[..., -1]
 
-    T2 = np.matrix(T1)   # convert from sympy to numpy matrix
-    return T2
+def forward_kinematics_N(M, pose, params):
+    q = []
+    for v in M.joint_vars():
+        assert v in pose, 'forward_kinematics_N: no value for joint variable ' + str(v)
+        q.append(param_value(pose[v]))
+    T = M.fk_numeric(q, params)
+    return np.matrix(T[0])   # numpy matrix like before
 
 
 
@@ -644,6 +1059,18 @@ class TestSolver008(unittest.TestCase):    # change TEMPLATE to unique name (2 p
     def a_test_kequation(self):   # another kequation test in ik_classes
         e1 = kequation(th_2, sp.sin(th_1)*l_1 + sp.sqrt(l_4))
         e2 = kequation(th_2, sp.sin(th_1)*l_1 / sp.sqrt(l_4))
+        fs = 'kequation canonical form  FAIL'
+        e3 = kequation(sp.sin(th_1)*l_1 + sp.sqrt(l_4), th_2)          # sides swapped
+        e4 = kequation(-th_2, -sp.sin(th_1)*l_1 - sp.sqrt(l_4))        # signs flipped
+        e5 = kequation(0, th_2 - sp.sin(th_1)*l_1 - sp.sqrt(l_4) + l_3 - l_3)
+        for e in [e3, e4, e5]:
+            self.assertTrue(e.canonical() == e1.canonical(), fs)
+        self.assertTrue(len(set([e.canonical() for e in [e1, e2, e3, e4, e5]])) == 2, fs)
+        self.assertTrue(e1 != e2 and e3 != e1 and e4 != e1, fs)   # (== is unchanged)
+        self.assertTrue(kequation(th_2, sp.sin(th_1)*l_1 + sp.sqrt(l_4)) == e1, fs)
+        self.assertTrue(e1.string == 'th_2 = l_1*sin(th_1) + sqrt(l_4)', fs)
+        e6 = kequation(th_2, l_1*(sp.sin(th_1)*sp.cos(th_3)**2 + sp.sin(th_1)*sp.sin(th_3)**2) + sp.sqrt(l_4))
+        self.assertTrue(e6 != e1 and e6.equivalent(e1) and not e6.equivalent(e2), fs)
         print('>>-----------------------------<<')
         print(e1)
         print(e1.LaTexOutput())
@@ -695,6 +1122,79 @@ class TestSolver008(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         self.assertTrue(m[1,2]== -1, fs)
         self.assertTrue(m[1,3]== -h, fs)
 
+        #   Jacobian is only derived on demand
+        fs = 'lazy Jacobian FAIL'
+        self.assertFalse('J66' in M.__dict__, fs)
+        self.assertTrue(M.J66.shape == (6,6), fs)
+        self.assertTrue(M.w_11 == sp.Matrix([0,0,qd_1]), fs)
+        self.assertTrue('vs' in M.__dict__, fs)
+        with self.assertRaises(AttributeError):
+            M.not_an_attribute
+
+        #   compiled numerical FK
+        fs = 'numerical FK FAIL'
+        q = np.array([[0.1, 0.2, 0.3, 0.4], [-1.0, 2.0, 0.5, 3.0]])
+        self.assertTrue(M.joint_vars() == [th_1, th_2, th_3, th_4], fs)
+        T = M.fk_numeric(q, params)
+        self.assertTrue(T.shape == (2,4,4), fs)
+        for k in range(2):
+            pose = {th_1: q[k,0], th_2: q[k,1], th_3: q[k,2], th_4: q[k,3]}
+            pose.update(params)
+            Tsym = np.array(sp.N(M.T_06.subs(pose))).astype(float)
+            self.assertTrue(np.allclose(T[k], Tsym), fs)
+        T1 = forward_kinematics_N(M, {th_1: 0.1, th_2: 0.2, th_3: 0.3, th_4: 0.4}, params)
+        self.assertTrue(np.allclose(T1, T[0]), fs)
+
+        #   polynomial (s_i, c_i) simplification
+        fs = 'poly_mode FAIL'
+        Mp = mechanism(dh, {h:5, l_3: 2, l_4: 6}, v)
+        Mp.poly_mode = True
+        Mp.forward_kinematics()
+        self.assertTrue(Mp.T_06.has(sp.cos(th_1 + th_2)), fs)
+        self.assertTrue(np.allclose(Mp.fk_numeric(q, params), T), fs)
+
+        #   exact numerical parameters
+        fs = 'numeric_params FAIL'
+        Mn = mechanism(dh, [h, l_3, l_4], v)
+        Mn.pvals = {h: 5, l_3: 0.25, l_4: 6}
+        Mn.numeric_params = True
+        Mn.forward_kinematics()
+        self.assertTrue(Mn.T_06.free_symbols == {th_1, th_2, th_3, th_4}, fs)
+        self.assertTrue(Mn.T_06[2,3].has(sp.Rational(1,4)) or Mn.T_06[2,3].has(-sp.Rational(1,4)), fs)
+        self.assertTrue(np.allclose(Mn.fk_numeric(q, {}), M.fk_numeric(q, Mn.pvals)), fs)
+
+        #   padding (all zero) DH rows are pruned
+        fs = 'N link mechanism FAIL'
+        self.assertTrue(M.pruned == [False, False, False, False, True, True], fs)
+        self.assertTrue(M.T_56 == sp.eye(4), fs)
+        self.assertTrue(M.link_product(2, 6) == M.T_23*M.T_34, fs)
+        self.assertTrue(M.link_product(4, 6) == sp.eye(4), fs)
+        #   (no equations or joint velocities for the pruned links)
+        self.assertTrue(M.mequation_order() == [(0,0), (1,0), (2,0), (3,0)], fs)
+        self.assertTrue(sp.expand(M.w_66 - M.w_44) == sp.zeros(3, 1) and sp.expand(M.v_66 - M.v_44) == sp.zeros(3, 1), fs)
+        self.assertTrue(M.J66[:, 4:6] == sp.zeros(6, 2), fs)
+
+        #   4 link (unpadded) version of the same robot
+        M4 = mechanism(dh[0:4,:], {h:5, l_3: 2, l_4: 6}, [1,1,1,1])
+        M4.forward_kinematics()
+        self.assertTrue(M4.T_06 == M.T_06, fs)
+        self.assertTrue(M4.J66.shape == (6,4), fs)
+        self.assertTrue(len(M4.get_mequation_set()) == 4+1, fs)
+
+        #   7 links
+        th_7 = sp.var('th_7')
+        dh7 = sp.Matrix(dh)
+        dh7[4,:] = sp.Matrix([[0, l_1, 0, th_5]])
+        dh7[5,:] = sp.Matrix([[-sp.pi/2, 0, 0, th_6]])
+        dh7 = dh7.col_join(sp.Matrix([[sp.pi/2, 0, 0, th_7]]))
+        M7 = mechanism(dh7, {h:5, l_1:1, l_3: 2, l_4: 6}, [1,1,1,1,1,1,1])
+        M7.forward_kinematics()
+        self.assertTrue(M7.T_67[0,0] == sp.cos(th_7), fs)
+        self.assertTrue(len(M7.get_mequation_set()) == 7+2, fs)
+        self.assertTrue(M7.next_mequation() is None, fs)
+        self.assertTrue(M7.J66.shape == (6,7), fs)
+        self.assertTrue(M7.qdot[6] == sp.var('qd_7'), fs)
+
 
         #   Test eqn_set()
         L = M.get_mequation_set()
@@ -708,11 +1208,98 @@ class TestSolver008(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         self.assertTrue(L[2].Td[2,2] == -r_23, fs)
         self.assertTrue(L[2].Td[2,3] == -Py-h, fs)
 
-
-        if(JACOBIAN and False):    # reactivate this later
-            print(' --- Numerical Jacobian ---')
-            pose = {th_1: 20*deg, th_2:45*deg, th_3:15*deg, th_4:-21.7*deg}
-            M.Jacobian_N(pose)
+        #   Test the shared chain products
+        fs = 'chain product cache FAIL'
+        self.assertTrue(len(L) == 4, fs)
+        self.assertTrue(sp.expand(L[3].Td - H_inv_S(M.T_23)*H_inv_S(M.T_12)*H_inv_S(M.T_01)*M.Td) == sp.zeros(4), fs)
+        self.assertTrue(L[3].Ts == M.T_34, fs)
+        # T12*T23*T34*T45 is T12*...*T56 (pruned links): the same cached product
+        self.assertTrue(M.link_product(1, 5) is M.link_product(1, 6), fs)
+        #   the RHS chains share their prefixes:
+        #    T01*T12, (..)*T23, (..)*T34 (T_06, made by FK), T12*T23, (..)*T34, T23*T34
+        #    LHS T01^-1*Td, T12^-1*T01^-1, (..)*Td, T23^-1*T12^-1, (..)*T01^-1, (..)*Td
+        Mc = mechanism(dh, params, v)
+        Mc.forward_kinematics()
+        self.assertTrue(Mc.n_products == 3, fs)
+        Lc = Mc.get_mequation_set()
+        self.assertTrue(Mc.n_products == 3 + 3 + 6, fs)
+        Mc.get_mequation_set()
+        self.assertTrue(Mc.n_products == 3 + 3 + 6, fs)
+        #   the shared products are the same expressions as the products written
+        #    out left to right (as in the original equation set)
+        self.assertTrue(sp.srepr(Mc.T_06) == sp.srepr(Mc.link_product(0, 4)), fs)
+        self.assertTrue(sp.srepr(Mc.link_product(0, 4)) == sp.srepr(M.T_01*M.T_12*M.T_23*M.T_34*M.T_45*M.T_56), fs)
+        Mf = mechanism(dh, params, v)
+        Mf.forward_kinematics()
+        self.assertTrue(sp.srepr(Mf.T_06) == sp.srepr(sp.trigsimp(M.T_01*M.T_12*M.T_23*M.T_34*M.T_45*M.T_56)), fs)
+        for (Mx, Lx) in [(Mc, Lc), (M7, M7.get_mequation_set())]:
+            N = Mx.nlinks
+            for ((nl, nr), m) in zip(Mx.mequation_order(), Lx):
+                lhs = Mx.Td
+                if nl > 0:
+                    lhs = H_inv_S(Mx.Ts[nl-1])
+                    for i in reversed(range(nl-1)):
+                        lhs = lhs*H_inv_S(Mx.Ts[i])
+                    lhs = lhs*Mx.Td
+                for i in reversed(range(N-nr, N)):
+                    lhs = lhs*H_inv_S(Mx.Ts[i])
+                rhs = Mx.Ts[nl]
+                for i in range(nl+1, N-nr):
+                    rhs = rhs*Mx.Ts[i]
+                self.assertTrue(sp.srepr(m.Td) == sp.srepr(lhs), fs)
+                self.assertTrue(sp.srepr(m.Ts) == sp.srepr(rhs), fs)
+        for (mc, m) in zip(Lc, L):
+            self.assertTrue(mc.Ts == m.Ts and mc.Td == m.Td, fs)
+        #   lazy set: the rest of the equations one at a time, in the same order
+        fs = 'lazy equation set FAIL'
+        M.mequation_start = 3
+        L3 = M.get_mequation_set()
+        self.assertTrue(len(L3) == 3 and L3[2].Td == L[2].Td, fs)
+        for k in range(3, len(L)):
+            m = M.next_mequation()
+            self.assertTrue(m.Td == L[k].Td and m.Ts == L[k].Ts, fs)
+        self.assertTrue(M.next_mequation() is None, fs)
+        M.mequation_start = None
+
+        fs = 'chain product cache FAIL'
+        m32 = M.get_mequation(3, 2)   # a new left/right combination: ... = T34
+        self.assertTrue(m32.Ts[0,3] == l_4, fs)
+        self.assertTrue(m32.Ts[0,0] == sp.cos(th_4), fs)
+
+        #   Test process pool simplification (must match the serial path)
+        fs = 'parallel trigsimp FAIL'
+        T = M.T_01*M.T_12*M.T_23
+        self.assertTrue(trigsimp_transform(T, 2) == sp.trigsimp(T), fs)
+        m2 = M.get_mequation(2, 0)
+        M.nprocs = 2
+        M.simplify_mequations([m2])
+        self.assertTrue(m2.Ts[0,3] == sp.trigsimp(L[2].Ts[0,3]), fs)
+        self.assertTrue(m2.Td[2,3] == sp.trigsimp(L[2].Td[2,3]), fs)
+        #   (the default set by kinematics_cache(simplify=True))
+        Ms = mechanism(dh, params, v)
+        Ms.nprocs = 2
+        Ms.mequation_simplify = True
+        Ms.forward_kinematics()
+        Ls = Ms.get_mequation_set()
+        self.assertTrue(Ls[2].Ts[0,3] == m2.Ts[0,3] and Ls[2].Td[2,3] == m2.Td[2,3], fs)
+
+
+        print(' --- Numerical Jacobian ---')
+        fs = 'numerical Jacobian FAIL'
+        q = np.array([[20*deg, 45*deg, 15*deg, -21.7*deg], [0.0, 0.0, 0.0, 0.0]])
+        J = M.jacobian_numeric(q, params)
+        self.assertTrue(J.shape == (2,6,4), fs)
+        self.assertTrue(M.jnum is J, fs)
+        self.assertTrue(mechanism(dh, params, v).jnum.shape == (1,6,4), fs)   # (before any batch)
+        pose = {th_1: q[0,0], th_2: q[0,1], th_3: q[0,2], th_4: q[0,3]}
+        pose.update(params)
+        Jsym = np.array(sp.N(M.J66[:, 0:4].subs(pose))).astype(float)
+        self.assertTrue(np.allclose(J[0], Jsym), fs)
+        mu = manipulability(J)
+        cn = condition_number(J)
+        self.assertTrue(mu.shape == (2,) and cn.shape == (2,), fs)
+        self.assertTrue(np.isclose(mu[0], np.sqrt(np.linalg.det(J[0].T @ J[0]))), fs)
+        self.assertTrue(cn[0] >= 1.0, fs)
 
         #print '\n\n\n            kin_cl.py PASSES all tests \n\n'
 
@@ -0,0 +1,167 @@
+#!/usr/bin/python
+#
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import unittest
+import sympy as sp
+
+######################################################################
+#
+#   Trig expressions of joint angles as polynomials in s_i, c_i
+#
+#   sin(th_i) -> s_i, cos(th_i) -> c_i turns a product of link transforms
+#   into a polynomial.  It is reduced to normal form modulo the ideal
+#   generated by  s_i**2 + c_i**2 - 1  (these polynomials are a Groebner
+#   basis for lex order with s_i > c_i, so the normal form just replaces
+#   s_i**2 by 1 - c_i**2).  For consecutive parallel axes the bilinear
+#   terms
+#         A*(c_i*c_j - s_i*s_j) + B*(s_i*c_j + c_i*s_j)
+#   are recognized as A*cos(th_i+th_j) + B*sin(th_i+th_j) (or th_i-th_j).
+#   This takes the place of trigsimp() for the FK products.
+#
+
+class trig_poly:
+    #  angles:   joint angle symbols (th_1, th_2, ...)
+    #  parallel: pairs (th_i, th_j) of consecutive joints with parallel axes,
+    #            in order along the chain
+    def __init__(self, angles, parallel=[]):
+        self.angles = list(angles)
+        self.parallel = list(parallel)
+        self.sc = {}          # angle -> (s, c) polynomial variables
+        self.to_vars = {}     # sin(th_1) -> s_1 etc.
+        self.from_vars = {}   # s_1 -> sin(th_1) etc.
+        for th in self.angles:
+            self.add_angle(th)
+
+    # new variables s, c for an angle (or a sum of angles)
+    def add_angle(self, angle):
+        if angle in self.sc:
+            return self.sc[angle]
+        s = sp.Dummy('s_' + str(angle))
+        c = sp.Dummy('c_' + str(angle))
+        self.sc[angle] = (s, c)
+        self.to_vars[sp.sin(angle)] = s
+        self.to_vars[sp.cos(angle)] = c
+        self.from_vars[s] = sp.sin(angle)
+        self.from_vars[c] = sp.cos(angle)
+        return (s, c)
+
+    def gens(self, angles):
+        g = []
+        for th in angles:
+            g += list(self.sc[th])
+        return g
+
+    def to_poly(self, expr):
+        return sp.expand(sp.sympify(expr).xreplace(self.to_vars))
+
+    def from_poly(self, P):
+        return P.xreplace(self.from_vars)
+
+    # normal form of P modulo s**2 + c**2 - 1 for every angle
+    def reduce(self, P):
+        angles = [th for th in self.angles if P.has(self.sc[th][0])]
+        if len(angles) == 0:
+            return P
+        p = sp.Poly(P, *self.gens(angles))
+        if p.is_zero:
+            return sp.S.Zero
+        result = []
+        for (mon, coef) in p.terms():
+            t = coef.as_expr()
+            for k in range(len(angles)):
+                (s, c) = self.sc[angles[k]]
+                es = mon[2*k]
+                t = t * s**(es % 2) * (1 - c**2)**(es//2) * c**mon[2*k+1]
+            result.append(t)
+        return sp.expand(sp.Add(*result))
+
+    #  recognize sum (or difference) of angles ga, gb in polynomial P
+    #   returns [new P, new angle] (new angle is None if no match)
+    def combine(self, P, ga, gb):
+        (sa, ca) = self.sc[ga]
+        (sb, cb) = self.sc[gb]
+        if not (P.has(sa) or P.has(ca)) or not (P.has(sb) or P.has(cb)):
+            return [P, None]
+        terms = dict(sp.Poly(P, sa, ca, sb, cb).terms())
+        bilinear = [(0,1,0,1), (1,0,1,0), (1,0,0,1), (0,1,1,0)]
+        for mon in terms.keys():
+            if mon[0] + mon[1] > 0 and mon[2] + mon[3] > 0 and mon not in bilinear:
+                return [P, None]   # not linear in each angle's sin/cos
+        [A1, A2, A3, A4] = [terms.get(mon, sp.S.Zero).as_expr() for mon in bilinear]
+        if A1 == 0 and A2 == 0 and A3 == 0 and A4 == 0:
+            return [P, None]
+        rest = sp.expand(P - (A1*ca*cb + A2*sa*sb + A3*sa*cb + A4*ca*sb))
+        if sp.expand(A1 + A2) == 0 and sp.expand(A3 - A4) == 0:
+            angle = ga + gb      # A1*cos(a+b) + A3*sin(a+b)
+        elif sp.expand(A1 - A2) == 0 and sp.expand(A3 + A4) == 0:
+            angle = ga - gb      # A1*cos(a-b) + A3*sin(a-b)
+        else:
+            return [P, None]
+        (s, c) = self.add_angle(angle)
+        return [sp.expand(rest + A1*c + A3*s), angle]
+
+    #  trig expression -> simplified trig expression
+    def simplify(self, expr):
+        P = self.reduce(self.to_poly(expr))
+        group = {}   # joint angle -> angle (sum) it has been combined into
+        for (thi, thj) in self.parallel:
+            ga = group.get(thi, thi)
+            gb = group.get(thj, thj)
+            [P, angle] = self.combine(P, ga, gb)
+            if angle is not None:
+                group[thi] = angle
+                group[thj] = angle
+        return self.from_poly(P)
+
+    def simplify_matrix(self, A):
+        return A.applyfunc(self.simplify)
+
+
+class TestSolver012(unittest.TestCase):
+    def runTest(self):
+        th_1, th_2, th_3, a_2 = sp.symbols('th_1 th_2 th_3 a_2')
+        tp = trig_poly([th_1, th_2, th_3], [(th_1, th_2), (th_2, th_3)])
+        (s1, c1) = tp.sc[th_1]
+        fs = 'polynomial reduction FAIL'
+        self.assertTrue(tp.reduce(s1**2 + c1**2) == 1, fs)
+        self.assertTrue(tp.reduce(s1**3) == s1 - s1*c1**2, fs)
+        G = [s1**2 + c1**2 - 1]
+        P = s1**4*a_2 + c1*s1**2
+        self.assertTrue(tp.reduce(P) == sp.expand(sp.reduced(P, G, s1, c1, order='lex')[1]), fs)
+
+        fs = 'sum of angles FAIL'
+        e = sp.cos(th_1)*sp.cos(th_2) - sp.sin(th_1)*sp.sin(th_2) + a_2*sp.cos(th_1)
+        self.assertTrue(tp.simplify(e) == sp.cos(th_1 + th_2) + a_2*sp.cos(th_1), fs)
+        e = sp.sin(th_1)*sp.cos(th_2) - sp.cos(th_1)*sp.sin(th_2)
+        self.assertTrue(tp.simplify(e) == sp.sin(th_1 - th_2), fs)
+        # three parallel axes
+        R = sp.Matrix([[sp.cos(th_1), -sp.sin(th_1)], [sp.sin(th_1), sp.cos(th_1)]])
+        R2 = R.subs(th_1, th_2)
+        R3 = R.subs(th_1, th_3)
+        self.assertTrue(tp.simplify((R*R2*R3)[1,0]) == sp.sin(th_1 + th_2 + th_3), fs)
+        # sin**2 + cos**2
+        e = sp.sin(th_3)**2*a_2 + sp.cos(th_3)**2*a_2
+        self.assertTrue(tp.simplify(e) == a_2, fs)
+
+
+def run_test():
+    print('\n\n===============  Test polytrig.py =====================')
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSolver012)
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
+
+if __name__ == "__main__":
+    run_test()
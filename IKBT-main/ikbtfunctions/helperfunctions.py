@@ -22,6 +22,7 @@
 
 import unittest
 import sys as sys
+import random
 import sympy as sp
 
 #######################################################################3
@@ -41,28 +42,256 @@ def theta_expand(x):
     return x.replace(r'th_', r'\theta_') # convert 'th' to '\theta' for nicer latex
 
 
+#
+#   Memos which are only useful within one solve (cleared by clear_memos()).
+#     A bounded_memo is a dict which is also cleared when it has more than
+#     maxsize entries.  Keys which can't be hashed (e.g. a mutable
+#     sp.Matrix) are not memoized: get() gives the default, put() does
+#     nothing.
+#
+MEMO_MAX = 20000    # entries kept before a memo is cleared
+solve_memos = []
+
+def clear_memos():
+    for memo in solve_memos:
+        memo.clear()
+
+class bounded_memo(dict):
+    def __init__(self, maxsize=MEMO_MAX):
+        dict.__init__(self)
+        self.maxsize = maxsize
+        solve_memos.append(self)
+
+    def get(self, key, default=None):
+        try:
+            return dict.get(self, key, default)
+        except TypeError:       # unhashable
+            return default
+
+    def put(self, key, value):
+        if len(self) > self.maxsize:
+            self.clear()
+        try:
+            self[key] = value
+        except TypeError:
+            pass
+        return value
+
+#
+#   Expression index: the free symbols and the arguments of sin()/cos() in
+#     an expression.  sympy expressions are immutable, so this is computed
+#     once per expression and then every "does expr contain th_1 / sin(th_1)"
+#     question is a set lookup instead of a walk of the expression tree.
+#
+expr_index_memo = bounded_memo()
+
+def expr_index(expr):
+    info = expr_index_memo.get(expr)
+    if info is None:
+        e = sp.sympify(expr)
+        info = (frozenset(e.free_symbols),
+                frozenset([a.args[0] for a in e.atoms(sp.sin)]),
+                frozenset([a.args[0] for a in e.atoms(sp.cos)]))
+        expr_index_memo.put(expr, info)
+    return info
+
+# same as expr.has(sym), expr.has(sp.sin(sym)), expr.has(sp.cos(sym))
+def has_symbol(expr, sym):
+    return sym in expr_index(expr)[0]
+
+def has_sin(expr, sym):
+    return sym in expr_index(expr)[1]
+
+def has_cos(expr, sym):
+    return sym in expr_index(expr)[2]
+
+# ... for either side of a kequation
+def eqn_has(e, sym):
+    return has_symbol(e.LHS, sym) or has_symbol(e.RHS, sym)
+
+def eqn_has_sin(e, sym):
+    return has_sin(e.LHS, sym) or has_sin(e.RHS, sym)
+
+def eqn_has_cos(e, sym):
+    return has_cos(e.LHS, sym) or has_cos(e.RHS, sym)
+
+#
+#   Decompose expr = A*sin(sym) + B*cos(sym) + C  (A, B are the
+#     coefficients of sin(sym) and cos(sym) after collecting on them).
+#     Returns [A, B, C, collected expr], or None if C still has sym in it
+#     (e.g. sin(sym)**2 or sin(sym)*cos(sym) terms, which .coeff() does not
+#     pick up).  Shared by the ID and solve leaves: keyed by (expr, sym),
+#     so an equation that gets rewritten simply has a new key.  The
+#     collected expr is entered too, since that is what the ID leaves hand
+#     on to the solvers.
+#
+trig_terms_memo = bounded_memo()
+
+def trig_terms(expr, sym, expand=False):
+    key = (expr, sym, expand)
+    d = trig_terms_memo.get(key)
+    if d is None:
+        e = sp.sympify(expr)
+        if expand:
+            e = e.expand()
+        s = sp.sin(sym)
+        c = sp.cos(sym)
+        col = sp.collect(e, [s, c])
+        A = col.coeff(s)
+        B = col.coeff(c)
+        C = col - A*s - B*c
+        if has_symbol(C, sym):
+            d = False       # (memo entry for None)
+        else:
+            d = [A, B, C, col]
+        trig_terms_memo.put(key, d)
+        trig_terms_memo.put((col, sym, False), d)
+    if d is False:
+        return None
+    return d
+
+# ... of RHS-LHS of a kequation
+def eqn_trig_terms(e, sym, expand=False):
+    return trig_terms(e.RHS - e.LHS, sym, expand)
+
+#
+#   Zero testing: is expr identically zero?  expr == 0 only sees structural
+#     zeros and sp.simplify() is slow, so expr is first evaluated at a few
+#     random points (all free symbols in (0.1, 2), ZERO_TEST_DIGITS digits).
+#     The points are drawn from a generator seeded with srepr(expr), so the
+#     answer for an expression does not depend on what was tested before.
+#     A value that is clearly not zero settles it.  If every point gives
+#     zero, sp.simplify() has the last word (confirm=True) or the numbers
+#     are taken as they are (confirm=False, for dedup/pruning where a rare
+#     wrong answer only costs a missed or extra try).
+#
+ZERO_TEST_POINTS = 3
+ZERO_TEST_DIGITS = 30
+is_zero_memo = bounded_memo()
+
+# value of expr at point, and the sum of |terms| (for the tolerance)
+#   None if expr can't be evaluated there (e.g. a singularity)
+def zero_test_value(expr, point):
+    terms = expr.args if expr.is_Add else (expr,)
+    v = sp.S.Zero
+    scale = sp.S.Zero
+    for t in terms:
+        tv = t.evalf(ZERO_TEST_DIGITS, subs=point)
+        if not tv.is_number or tv.has(sp.nan, sp.zoo, sp.oo, -sp.oo):
+            return None
+        v += tv
+        scale += abs(tv)
+    return [abs(v), scale]
+
+def numeric_zero(expr):
+    syms = sorted(expr.free_symbols, key=str)
+    rng = random.Random(sp.srepr(expr))    # (a str seed is the same in every process)
+    tol = sp.Float(10)**(8 - ZERO_TEST_DIGITS)
+    npoints = 0
+    for i in range(3*ZERO_TEST_POINTS):
+        point = {}
+        for x in syms:
+            point[x] = sp.Float(rng.uniform(0.1, 2.0), ZERO_TEST_DIGITS)
+        r = zero_test_value(expr, point)
+        if r is None:
+            continue
+        if r[0] > tol*r[1]:
+            return False
+        npoints += 1
+        if npoints == ZERO_TEST_POINTS:
+            return True
+    return None     # no usable points
+
+def is_zero(expr, confirm=True):
+    e = sp.sympify(expr)
+    if e == 0:
+        return True
+    key = (e, confirm)
+    z = is_zero_memo.get(key)
+    if z is None:
+        z = numeric_zero(e)
+        if z is None or (z and confirm):
+            z = sp.simplify(e) == 0
+        is_zero_memo.put(key, z)
+    return z
+
+def equivalent(e1, e2, confirm=True):
+    return is_zero(e1 - e2, confirm)
+
+#
+#   Assumptions made while solving one robot (e.g. a coefficient cancelled
+#     by tan_id is nonzero).  These used to go into sympy's process wide
+#     global_assumptions, which only grows and is seen by every later
+#     ask()/refine() (also for the next robot).  Instead each solve keeps
+#     its own context on the blackboard ('assumptions') and passes it to
+#     the simplifications which should use it.
+#
+class assumption_context:
+    def __init__(self, facts=[]):
+        self.facts = []
+        for f in facts:
+            self.add(f)
+
+    def add(self, fact):
+        if fact not in self.facts:
+            self.facts.append(fact)
+
+    def clear(self):
+        self.facts = []
+
+    def __len__(self):
+        return len(self.facts)
+
+    def __repr__(self):
+        return 'assumptions: ' + str(self.facts)
+
+    def condition(self):
+        return sp.And(*self.facts)
+
+    def ask(self, prop):
+        return sp.ask(prop, self.condition())
+
+    def refine(self, expr):
+        if len(self.facts) == 0:
+            return expr
+        return sp.refine(expr, self.condition())
+
+    def simplify(self, expr):
+        return sp.simplify(self.refine(expr))
+
+# the assumption context of the current solve (made on first use)
+def get_assumptions(bb):
+    ctx = bb.get('assumptions')
+    if ctx is None:
+        ctx = assumption_context()
+        bb.set('assumptions', ctx)
+    return ctx
+
 ## how many unknowns are in expr?
 def count_unknowns(unknowns, expr):
+    syms = expr_index(expr)[0]
     n = 0
     for u in unknowns:
-        if(expr.has(u.symbol) and u.solved == False):
+        if(u.symbol in syms and u.solved == False):
             n += 1
     return n
 
 #return a list of unknown objects that exsits in a expression
 def get_unknowns(unknowns, expr):
+    syms = expr_index(expr)[0]
     us = []
     for u in unknowns:
-        if(expr.has(u.symbol) and u.solved == False):
+        if(u.symbol in syms and u.solved == False):
             us.append(u)
     return us
 
 #return a list of unknown objects that which are dependencies of a solution
 def get_deps(unknowns, expr):
+    syms = expr_index(expr)[0]
     us = set()
     problem = False
     for u in unknowns:
-        if expr.has(u.symbol):
+        if u.symbol in syms:
             if u.solved:
                 us.add(u)
             else:
@@ -76,14 +305,56 @@ def get_deps(unknowns, expr):
 #    belong to a list of variables.
 
 def get_variables(variables, expr):
+    syms = expr_index(expr)[0]
     vs = []
     #print 'get_variables: ', expr
     for v in variables:
         #print 'get_variables: ', v.symbol
-        if(expr.has(v.symbol)):
+        if(v.symbol in syms):
             vs.append(v)
     return vs
 
+#
+#   Index of a set of kequations by unknown:
+#     which equations contain each unknown and how many unsolved
+#     unknowns each equation has.  When unknowns are solved the owner
+#     recounts the equations listed under them (recount()).
+#
+class eqn_index:
+    def __init__(self, eqns, unknowns):
+        self.unknowns = list(unknowns)
+        self.eqns = []
+        self.by_symbol = {}   # unknown symbol -> list of equation numbers
+        self.nunk = []        # number of unsolved unknowns in each equation
+        for e in eqns:
+            self.add(e)
+
+    def add(self, e):
+        k = len(self.eqns)
+        self.eqns.append(e)
+        n = 0
+        for u in self.unknowns:
+            if eqn_has(e, u.symbol):
+                self.by_symbol.setdefault(u.symbol, []).append(k)
+                if not u.solved:
+                    n += 1
+        self.nunk.append(n)
+        return k
+
+    # number of unsolved unknowns in equation number k
+    def count(self, k):
+        return self.nunk[k]
+
+    # count the unsolved unknowns in equation k again
+    def recount(self, k, unknowns):
+        e = self.eqns[k]
+        n = 0
+        for u in unknowns:
+            if not u.solved and eqn_has(e, u.symbol):
+                n += 1
+        self.nunk[k] = n
+        return n
+
 # get the varible(unknown) object by its symbol
 def find_obj(th_sym, unknowns):
     for unk in unknowns:
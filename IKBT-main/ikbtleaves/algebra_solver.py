@@ -127,12 +127,11 @@ class algebra_id(b3.Action):    # action leaf for
                         print("         ", count_unknowns(unknowns, e.RHS), " unknowns in RHS\n")
                     e.RHS = spZconv(e.RHS)
                     e.LHS = spZconv(e.LHS)
-                    if (e.RHS.has(sp.sin(u.symbol)) or e.RHS.has(sp.cos(u.symbol)) or\
-                        e.LHS.has(sp.sin(u.symbol)) or e.LHS.has(sp.cos(u.symbol))):
+                    if (eqn_has_sin(e, u.symbol) or eqn_has_cos(e, u.symbol)):
                         continue   # this shouldbe caught by another ID
                     
                     # since we're not solving the equation here, simply count the unknowns will suffice for the identification
-                    if(e.RHS.has(u.symbol) or e.LHS.has(u.symbol)):
+                    if(eqn_has(e, u.symbol)):
                         u.readytosolve = True
                         tmp = e.RHS - e.LHS
                         tmp = tmp.expand()
@@ -29,6 +29,23 @@ from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics
 import b3 as b3          # behavior trees
 
 
+#
+#   State of the current unknown for b3.UtilityPriority (0-3):
+#     +1 if prismatic (d_n) instead of rotary (th_n)
+#     +2 if there is more than one single-unknown equation for it
+#
+def unknown_state(tick):
+    u = tick.blackboard.get("curr_unk")
+    if u is None:
+        return 0
+    s = 0
+    if not str(u.symbol).startswith('th_'):
+        s += 1
+    L1 = tick.blackboard.get("eqns_1u")
+    if L1 is not None and len([e for e in L1 if eqn_has(e, u.symbol)]) > 1:
+        s += 2
+    return s
+
 class assigner(b3.Action):
     def tick(self, tick):
         unknowns = tick.blackboard.get("unknowns")
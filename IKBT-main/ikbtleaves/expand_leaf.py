@@ -0,0 +1,121 @@
+# Add matrix equations to the Robot when the solver stalls
+#
+#   With mechanism.mequation_start set, the Robot starts out with only the
+#   first few matrix equations.  This leaf is ticked at the start of each
+#   outer solve loop: if the previous loop solved nothing and added no aux
+#   equations, the next equation of the set (next left/right inverse
+#   combination, see mechanism.next_mequation()) is added.
+#   SUCCESS, except (in this lazy mode) when the solver has stalled and all
+#   the equations have been added: then FAILURE.  Without mequation_start the
+#   Robot has all the equations from the start and this is always SUCCESS.
+
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import sympy as sp
+import unittest
+
+from ikbtfunctions.helperfunctions import *
+from ikbtbasics.kin_cl import *
+
+import b3 as b3          # behavior trees
+
+class expand_mequations(b3.Action):
+    def tick(self, tick):
+        R = tick.blackboard.get('Robot')
+        unknowns = tick.blackboard.get('unknowns')
+
+        progress = (len([u for u in unknowns if u.solved]), len(R.kequation_aux_list))
+        last = tick.blackboard.get('progress', tick.tree.id, self.id)
+        M = getattr(R, 'Mech', None)
+        status = b3.SUCCESS
+        if last == progress and M is not None and getattr(M, 'mequation_start', None) is not None:
+            m = M.next_mequation()
+            if m is not None:
+                R.mequation_list.append(m)
+                if self.BHdebug:
+                    print('expand_mequations: stalled, now ', len(R.mequation_list), ' matrix equations')
+            else:
+                status = b3.FAILURE     # stalled with all the equations
+        tick.blackboard.set('progress', progress, tick.tree.id, self.id)
+        tick.blackboard.set('Robot', R)
+        return status
+
+
+class TestSolver014(unittest.TestCase):
+    def runTest(self):
+        self.test_expand()
+
+    def test_expand(self):
+        sp.var('l_1 l_2 th_1 th_2 th_3')
+        dh = sp.Matrix([
+            [0,   0, 0, th_1],
+            [0, l_1, 0, th_2],
+            [0, l_2, 0, th_3]
+            ])
+        M = mechanism(dh, [l_1, l_2], [1,1,1])
+        M.mequation_start = 3
+        M.forward_kinematics()
+
+        class robot:    # (just the parts of a Robot this leaf uses)
+            pass
+        R = robot()
+        R.Mech = M
+        R.mequation_list = M.get_mequation_set()
+        R.kequation_aux_list = []
+        self.assertEqual(len(R.mequation_list), 3)
+        self.assertEqual(len(M.mequation_pending), 1)
+        u1 = unknown(th_1)
+        unknowns = [u1, unknown(th_2)]
+
+        bt = b3.BehaviorTree()
+        bt.root = expand_mequations()
+        bt.root.BHdebug = False
+        bb = b3.Blackboard()
+        bb.set('Robot', R)
+        bb.set('unknowns', unknowns)
+
+        fs = 'expand_mequations FAIL'
+        # first tick: no earlier progress to compare with
+        self.assertEqual(bt.tick('test', bb), b3.SUCCESS, fs)
+        self.assertEqual(len(R.mequation_list), 3, fs)
+        # progress since the last tick: nothing added
+        u1.solved = True
+        self.assertEqual(bt.tick('test', bb), b3.SUCCESS, fs)
+        self.assertEqual(len(R.mequation_list), 3, fs)
+        R.kequation_aux_list.append(kequation(th_1, th_2))
+        self.assertEqual(bt.tick('test', bb), b3.SUCCESS, fs)
+        self.assertEqual(len(R.mequation_list), 3, fs)
+        # stalled: the next equation of the set is added
+        self.assertEqual(bt.tick('test', bb), b3.SUCCESS, fs)
+        self.assertEqual(len(R.mequation_list), 4, fs)
+        self.assertEqual(R.mequation_list[3].Ts, M.get_mequation(1, 1).Ts, fs)
+        self.assertEqual(len(M.mequation_pending), 0, fs)
+        # stalled again, none left
+        self.assertEqual(bt.tick('test', bb), b3.FAILURE, fs)
+        self.assertEqual(len(R.mequation_list), 4, fs)
+
+        # not lazy: the Robot has all the equations, nothing to add
+        M.mequation_start = None
+        self.assertEqual(bt.tick('test', bb), b3.SUCCESS, fs)
+        self.assertEqual(len(R.mequation_list), 4, fs)
+
+
+def run_test():
+    print('\n\n===============  Test expand_leaf.py =====================')
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSolver014)
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
+
+if __name__ == "__main__":
+    run_test()
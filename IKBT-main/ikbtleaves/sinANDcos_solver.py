@@ -114,26 +114,20 @@ class sinandcos_id(b3.Action):    # action leaf for sincosid
               #print "Looking for unknown: ", u.symbol, " in equation: ", 
               print(e)
               
-              tmp = e.RHS-e.LHS
               lhs = l_1 - l_1
-              if (tmp.has(sp.sin(u.symbol)) and tmp.has(sp.cos(u.symbol))):
-
-                  es = tmp.expand()
-                  # collect terms in sin(x) and cos(x)
-                  es = es.collect(sp.sin(u.symbol))
-                  es = es.collect(sp.cos(u.symbol))
-
-
+              if (eqn_has_sin(e, u.symbol) and eqn_has_cos(e, u.symbol)):
+                  # expand, collect terms in sin(x) and cos(x)
                   d ={}
-                  d[Aw] = es.coeff(sp.sin(u.symbol))
-                  d[Bw] = es.coeff(sp.cos(u.symbol))
-                  d[Cw] = es - d[Aw]*sp.sin(u.symbol) - d[Bw]*sp.cos(u.symbol)
+                  t = eqn_trig_terms(e, u.symbol, expand=True)
+                  if t is None:     # not A*sin(x) + B*cos(x) + C
+                      continue
+                  [d[Aw], d[Bw], d[Cw], es] = t
 
                   if(self.BHdebug):
                       print('Sin AND Cos identifying: ', es)
                       print('Aw: ', d[Aw], ' Bw: ', d[Bw], ' Cw: ', d[Cw])
                   
-                  if not d[Cw].has(u.symbol):
+                  if not has_symbol(d[Cw], u.symbol):
                       u.readytosolve = True
                       u.eqntosolve   = kc.kequation(lhs, es)
                       u.solvemethod += 'sinANDcos'
@@ -170,9 +164,10 @@ class sinandcos_solve(b3.Action):    # Solve asincos equation pairs
 
                 l1  = u.eqntosolve.LHS
                 rhs = u.eqntosolve.RHS
-                A = rhs.coeff(sp.sin(u.symbol))
-                B = rhs.coeff(sp.cos(u.symbol))
-                C = A*sp.sin(u.symbol) + B*sp.cos(u.symbol) - rhs
+                t = trig_terms(rhs, u.symbol)   # as found by sinandcos_id
+                assert(t is not None), 'Somethings Wrong: not A*sin(x) + B*cos(x) + C'
+                [A, B, C, rhs] = t
+                C = -C
 
                 if self.BHdebug:
                   print("\n find the A, B ,C")
@@ -196,7 +191,7 @@ class sinandcos_solve(b3.Action):    # Solve asincos equation pairs
                     
                 # targument = C/r
                 # u.argument = targument
-                if not C == 0:
+                if not is_zero(C):
                   t = sp.sqrt(A*A + B*B - C*C)
                   u.solutions.append(sp.atan2(A, B) + sp.atan2(t, C))
                   u.solutions.append(sp.atan2(A, B) + sp.atan2(-t, C))
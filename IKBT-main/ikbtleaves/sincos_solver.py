@@ -122,10 +122,10 @@ class sincos_id(b3.Action):    # action leaf for sincosid
                     print("Looking for unknown: ", u.symbol, " in equation: ", )
                     e.prt()
                     print("  which has one unknown(s)")
-                if (e.RHS.has(sp.sin(u.symbol)) or e.LHS.has(sp.sin(u.symbol)) ) \
-                    and (e.RHS.has(sp.cos(u.symbol)) or e.LHS.has(sp.cos(u.symbol))):
+                if helperfunctions.eqn_has_sin(e, u.symbol) \
+                    and helperfunctions.eqn_has_cos(e, u.symbol):
                     continue   # this shouldbe caught by another ID
-                if e.RHS.has(sp.sin(u.symbol)) or e.LHS.has(sp.sin(u.symbol)):   # we found  X = Asin(x)
+                if helperfunctions.eqn_has_sin(e, u.symbol):   # we found  X = Asin(x)
                     if(self.BHdebug):
                         print('I found an sin() equation to ID: ', e)
                     u.eqntosolve = e
@@ -137,7 +137,7 @@ class sincos_id(b3.Action):    # action leaf for sincosid
                     found = True
                     break
                     
-                if e.RHS.has(sp.cos(u.symbol)) or e.LHS.has(sp.cos(u.symbol)):   # we found X = Acos(x)
+                if helperfunctions.eqn_has_cos(e, u.symbol):   # we found X = Acos(x)
                     if(self.BHdebug):
                         print('I found an cos() equation to ID: ', e)
                     u.eqntosolve = e
@@ -177,19 +177,13 @@ class sincos_solve(b3.Action):    # Solve asincos equation pairs
                 print("  Using the ", u.solvemethod, " on:")
                 print(u.eqntosolve)
 
-            # parse the equation RHS 
-            terms = [sp.sin(u.symbol), sp.cos(u.symbol)]
-            rhs = sp.collect(u.eqntosolve.RHS, terms)
-            Aw  = sp.Wild("Aw")
-            Bw  = sp.Wild("Bw")                        
+            # parse the equation RHS:  A*sin(th) + B  or  A*cos(th) + B
+            t = helperfunctions.trig_terms(u.eqntosolve.RHS, u.symbol)
+            assert(t is not None),  "sincos_solve: Somethings Wrong!"
+            [As, Ac, B, rhs] = t
             if  'arcsin' in u.solvemethod: 
-                d   = rhs.match(Aw*sp.sin(u.symbol)+Bw)  
-                assert(d is not None),  "sincos_solve (arcsin branch): Somethings Wrong!"
-                A = d[Aw]
-                if(d[Bw] is not None):
-                    B = d[Bw]
-                else:
-                    B = 0
+                A = As
+                assert(A != 0),  "sincos_solve (arcsin branch): Somethings Wrong!"
                     
                 targument = (u.eqntosolve.LHS-B)/A 
                 sol1 = sp.asin( targument  )
@@ -209,17 +203,11 @@ class sincos_solve(b3.Action):    # Solve asincos equation pairs
                 solvedanything = True
                 
             elif  "arccos" in u.solvemethod:
-                d   = rhs.match(Aw*sp.cos(u.symbol)+Bw)  
-                if(d is None):
+                A = Ac
+                if helperfunctions.is_zero(A):
                     print("sincos_solve (arccos branch):  Somethings Wrong!")
                     return b3.FAILURE                    
                 else:        
-                    A = d[Aw]
-                    if(d[Bw] is not None):
-                        B = d[Bw]
-                    else:
-                        B = 0
-                            
                     targument = (u.eqntosolve.LHS-B)/A 
                     sol1 =   sp.acos( targument  )
                     sol2 = - sp.acos( targument  )  
@@ -29,6 +29,7 @@ from sys import exit
 from ikbtfunctions.helperfunctions import *
 from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+from ikbtleaves.updateL import equation_lists
 
 import b3 as b3          # behavior trees
 
@@ -84,11 +85,68 @@ class test_sub_transform(b3.Action):    # tester for your ID
         tick.blackboard.set('Robot',R)    
         return b3.SUCCESS
 
+#
+#   Subexpression index of the entries of a matrix: which entries contain
+#     a given expression.  e2.has(e1) is True only if e1 is a subtree of e2,
+#     or (for e1 an Add or Mul) some Add/Mul in e2 has all the args of e1
+#     (a + b + c "has" a + b), so the lookup gives every candidate and
+#     .has() then only runs on those.
+#
+subexpr_memo = bounded_memo()
+
+def subexpressions(expr):
+    nodes = subexpr_memo.get(expr)
+    if nodes is None:
+        nodes = frozenset(sp.preorder_traversal(expr))
+        subexpr_memo.put(expr, nodes)
+    return nodes
+
+class subexpr_index:
+    def __init__(self, T, rows, cols):
+        self.nodes = {}   # subexpression -> entries (i,j) containing it
+        self.args = {}    # (Add or Mul, arg) -> entries with such a node
+        self.entries = {}
+        for i in rows:
+            for j in cols:
+                self.add((i,j), T[i,j])
+
+    def add(self, pos, e):
+        self.entries[pos] = e
+        for n in subexpressions(e):
+            self.nodes.setdefault(n, set()).add(pos)
+            if n.is_Add or n.is_Mul:
+                for a in n.args:
+                    self.args.setdefault((n.func, a), set()).add(pos)
+
+    def remove(self, pos):
+        for n in subexpressions(self.entries.pop(pos)):
+            self.nodes[n].discard(pos)
+            if n.is_Add or n.is_Mul:
+                for a in n.args:
+                    self.args[(n.func, a)].discard(pos)
+
+    def update(self, pos, e):
+        if self.entries.get(pos) is not e:
+            self.remove(pos)
+            self.add(pos, e)
+
+    # entries which may contain e
+    def containing(self, e):
+        found = set(self.nodes.get(e, ()))
+        if e.is_Add or e.is_Mul:
+            s = None
+            for a in e.args:
+                p = self.args.get((e.func, a), set())
+                s = p if s is None else s & p
+            found |= s
+        return found
+
+
 class sub_transform(b3.Action):    # action leaf for  
     
     def tick(self, tick):
         unknowns = tick.blackboard.get('unknowns')   # the current list of unknowns (read-only here)
-        R = tick.blackboard.get('Robot')   # the current robot instance
+        R = tick.blackboard.modify('Robot')   # the current robot instance (Ts changed in place)
         if(self.BHdebug):
             print("running: ", self.Name)
             print('number of matrix equations: ', len(R.mequation_list))
@@ -99,9 +157,8 @@ class sub_transform(b3.Action):    # action leaf for
                 print(u.symbol, ', solved: ',u.solved)
             print('')
             
-        #   We're going to look at the first N equations in the mequation_list
-        N = 1   #  were only looking at first few (1 or 2) matrix equations (at least for now)          
-        assert (N <= len(R.mequation_list)), 'sub_transform test wants too many meqns '
+        #   With the subexpression index we can look at all the matrix equations
+        N = len(R.mequation_list)
         
         # identify elements of eqns where another element can be substituted in
         #    to eliminate unknowns
@@ -113,14 +170,33 @@ class sub_transform(b3.Action):    # action leaf for
         
         cols = [0,1,2,3]
         rows = [0,1,2]     # we don't care about row 4 ([0,0,0,1])!
+
+        # matrix equations which are the same as after the last pass (with the
+        #   same unknowns solved) can't give anything new
+        state = (tuple([u.symbol for u in unknowns]),
+                 frozenset([u.symbol for u in unknowns if u.solved]))
+        done = getattr(R, 'sub_transform_keys', {})
         
         for m in range(0,N):
+            Tm = R.mequation_list[m]
+            key = (Tm, Tm.version, state)    # (the same equation object, unchanged)
+            if done.get(m) == key:
+                continue
+            index = subexpr_index(Tm.Ts, rows, cols)
+            # entries (as they were at the start, like e2 below) which may
+            #   contain e1 (or -e1): e1 -> [entries with e1, entries with -e1]
+            where = {}
             for i in rows:
                 for j in cols:
-                    e2 = R.mequation_list[m].Ts[i,j]
+                    e2 = Tm.Ts[i,j]
                     for k in rows:
                         for l in cols:
-                            e1 = R.mequation_list[m].Ts[k,l]
+                            e1 = Tm.Ts[k,l]
+                            if e1 not in where:
+                                where[e1] = [index.containing(e1), index.containing(-e1)]
+                            [plus, minus] = where[e1]
+                            if (i,j) not in plus and (i,j) not in minus:
+                                continue
                             # substitute with e1 or -e1      ####################################3    *******    adapt ".has" to both LHS and RHS??
                             if((e1 != e2) and e2 != z and e2.has(e1)):  # we found a substitution
                                 if(self.BHdebug):
@@ -129,13 +205,14 @@ class sub_transform(b3.Action):    # action leaf for
                                     print(e1, ' / ',  e2)
                                     print('new: ', e2, ' = ',  e2.subs(e1, e2) )
                                 nold = count_unknowns(unknowns, e2)
-                                new = e2.subs(e1, R.mequation_list[m].Td[k,l])   # substitute
+                                new = e2.subs(e1, Tm.Td[k,l])   # substitute
                                 nnew = count_unknowns(unknowns, new)
                                 if(self.BHdebug):
                                     print('Unknowns: old/new:', nold, '/', nnew)
                                     print('Prop Sub: ', e2, '/', new)
                                 if(nnew < nold):
-                                    R.mequation_list[m].Ts[i,j] = new
+                                    Tm.Ts[i,j] = new
+                                    Tm.changed()
                                     found = True
                                         
                             elif((e1 != e2) and e2 != z and e2.has(-e1)):  # we found a substitution -e1
@@ -143,19 +220,22 @@ class sub_transform(b3.Action):    # action leaf for
                                     print(self.Name, ' found a (-) sub transform')
                                     print(e1, '/',  e2)
                                 nold = count_unknowns(unknowns, e2)
-                                new = e2.subs(-e1, -R.mequation_list[m].Td[k,l])   # substitute with -e1
+                                new = e2.subs(-e1, -Tm.Td[k,l])   # substitute with -e1
                                 nnew = count_unknowns(unknowns, new)
                                 if(self.BHdebug):
                                     print('Unknowns: old/new:', nold, '/', nnew)
                                     print('Prop Sub: ', e2, '/', new)
                                 if(nnew < nold): # only do this to *reduce* # of unknowns!
-                                    R.mequation_list[m].Ts[i,j] = new
+                                    Tm.Ts[i,j] = new
+                                    Tm.changed()
                                     found = True
+            done[m] = (Tm, Tm.version, state)
+        R.sub_transform_keys = done
                                 
-                                        
         if found:
             #  put the tmp_eqns list back into R !!!!  ******************************
-            [L1, L2, L3p] = R.scan_for_equations(unknowns)
+            #    (scanned again only if a matrix equation has changed)
+            [L1, L2, L3p] = equation_lists(R, unknowns)
             tick.blackboard.set('eqns_1u', L1)
             tick.blackboard.set('eqns_2u', L2)
             tick.blackboard.set('eqns_3pu', L3p)
@@ -184,6 +264,8 @@ class TestSolver006(unittest.TestCase):    # change TEMPLATE to unique name (2 p
     
     def runTest(self):
         self.test_subber()
+        self.test_order()
+        self.test_rollback()
             
     def test_subber(self):
         sub_tester = b3.BehaviorTree()
@@ -212,6 +294,69 @@ class TestSolver006(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         self.assertTrue(Tm.Ts[0,1]==sp.sin(r_11), fs)
         print('\n\n        Passed 6 assertions\n\n')
 
+        # the index finds every entry that .has() an expression
+        fs = " subexpr_index FAIL"
+        index = subexpr_index(Tm.Ts, [0,1,2], [0,1,2,3])
+        for e in [sp.sin(th_1)*sp.cos(th_2), d + r_33, r_33, sp.sin(th_5), b*r_31]:
+            has = set([(i,j) for i in range(3) for j in range(4) if Tm.Ts[i,j].has(e)])
+            self.assertTrue(has <= index.containing(e), fs)
+        self.assertTrue((2,1) in index.containing(d + r_33), fs)
+        self.assertTrue((2,1) not in index.containing(a + d), fs)
+        index.update((2,1), a + d)
+        self.assertTrue((2,1) in index.containing(a + d), fs)
+        self.assertTrue((2,1) not in index.containing(r_33), fs)
+
+    def test_order(self):
+        # each entry is substituted into with every other entry in turn (as
+        #   it was at the start of its turn), so the last reduction wins:
+        #   a+b+c -> r_12+c, then a+b+c -> a+r_13
+        sp.var('a b c r_12 r_13')
+        Ts = sp.zeros(4)
+        Ts[0,0] = a + b + c
+        Ts[0,1] = a + b
+        Ts[0,2] = b + c
+        R = Robot()
+        R.mequation_list = [matrix_equation(ik_lhs(), Ts)]
+        bb = b3.Blackboard()
+        bb.set('Robot', R)
+        bb.set('unknowns', [unknown(a), unknown(b), unknown(c)])
+        sub_tester = b3.BehaviorTree()
+        sub_tester.root = sub_transform()
+        sub_tester.root.BHdebug = False
+        sub_tester.tick("Test the substitution order", bb)
+        fs = " sub_transform order FAIL"
+        Tm = R.mequation_list[0]
+        self.assertTrue(Tm.Ts[0,0] == a + r_13, fs)
+        self.assertTrue(Tm.Ts[0,1] == a + b, fs)
+        self.assertTrue(Tm.Ts[0,2] == b + c, fs)
+
+    def test_rollback(self):
+        # a rolled back tick leaves the robot as it was
+        sp.var('a b c r_12 r_13')
+        Ts = sp.zeros(4)
+        Ts[0,0] = a + b + c
+        Ts[0,1] = a + b
+        Ts[0,2] = b + c
+        R = Robot()
+        R.mequation_list = [matrix_equation(ik_lhs(), Ts)]
+        bb = b3.Blackboard()
+        bb.set('Robot', R)
+        bb.set('unknowns', [unknown(a), unknown(b), unknown(c)])
+        sub_tester = b3.BehaviorTree()
+        sub_tester.root = sub_transform()
+        sub_tester.root.BHdebug = False
+        snap = bb.snapshot()
+        sub_tester.tick("Test the substitution rollback", bb)
+        fs = " sub_transform rollback FAIL"
+        R2 = bb.get('Robot')
+        self.assertTrue(R2 is not R, fs)
+        self.assertTrue(R2.mequation_list[0].Ts[0,0] == a + r_13, fs)
+        self.assertTrue(R.mequation_list[0].Ts[0,0] == a + b + c, fs)
+        bb.rollback(snap)
+        self.assertTrue(bb.get('Robot') is R, fs)
+        self.assertTrue(R.mequation_list[0].Ts[0,0] == a + b + c, fs)
+        self.assertTrue(R.mequation_list[0].Ts[0,1] == a + b, fs)
+
 #
 #    Can run your test from command line by invoking this file
 #
@@ -26,70 +26,95 @@ from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics
 import b3 as b3          # behavior trees     
  
 
+#
+#   Sum of angles detection is incremental:  soa_find() is memoized per
+#     expression, a matrix equation is skipped if it is the same as when it
+#     was last scanned (with nothing found), and the substitutions found for
+#     a matrix are done with one xreplace().
+#
+soa_memo = bounded_memo()
+
+thx = sp.Wild('thx')   # sympy wildcards for template matching
+thy = sp.Wild('thy')
+sgn = sp.Wild('sgn')
+
+#  first sin(thx + sgn*thy) or cos(thx + sgn*thy) in expr
+#    returns the match (dict) or None
+def soa_find(expr):
+    d = soa_memo.get(expr, False)     # (None: no sum of angles)
+    if d is not False:
+        return d
+    # need new ways to identify thx +/- thy
+    # notation_squeeze does not pick up - cases
+    sub_sin = expr.find(sp.sin(thx + sgn * thy)) #returns a subset of expressions with the query pattern, this finds sin(thx) too
+    sub_cos = expr.find(sp.cos(thx + sgn * thy))
+        
+    found = False
+    while len(sub_sin) > 0 and not found:
+        sin_expr = sub_sin.pop()
+        d = sin_expr.match(sp.sin(thx + sgn * thy))
+        if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0: #has to be joint variable
+            found = True
+
+        
+    while len(sub_cos) > 0 and not found:
+        cos_expr = sub_cos.pop()
+        d = cos_expr.match(sp.cos(thx + sgn * thy))
+        if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:
+            found = True
+
+    if not found:
+        d = None
+    return soa_memo.put(expr, d)
+
+#  replacement map for xreplace() equivalent to .subs(thx + sgn*thy, th_xy)
+#    for each of sums (in order).  subs() with a sum replaces sub-sums of
+#    Add nodes too (th_1+th_2+th_3 -> th_1+th_23), so map the Add nodes.
+def soa_map(exprs, sums):
+    rep = {}
+    for e in exprs:
+        for n in sp.preorder_traversal(e):
+            if n.is_Add and n not in rep:
+                new = n
+                for (s, th_xy) in sums:
+                    new = new.subs(s, th_xy)
+                if new != n:
+                    rep[n] = new
+    return rep
+
+
 class sum_id(b3.Action):   ##  we should change this name since its a transform
 
     def tick(self, tick):
-        R = tick.blackboard.get('Robot')  
+        R = tick.blackboard.modify('Robot')    # (aux equations, Ts, Td changed in place)
         #matr_equ = tick.blackboard.get('Tm')                # current matrix equation  
 
         L1 = tick.blackboard.get('eqns_1u')  # eqns w/ 1 unknown
         L2 = tick.blackboard.get('eqns_2u')  # eqns w/ 2 unknowns
         L3p = tick.blackboard.get('eqns_3pu')  # eqns w/ 3 unknowns
-        unknowns = tick.blackboard.get("unknowns")
+        unknowns = tick.blackboard.modify("unknowns")
         unknownsOrig = unknowns.copy()
+
+        clean = getattr(R, 'sum_id_keys', {})  # matrix equations scanned with nothing found
                 
-                
-        for matr_equ in R.mequation_list:
+        for (m, matr_equ) in enumerate(R.mequation_list):
             
             Tmatrix = matr_equ
+            key = (matr_equ, matr_equ.version,    # (the same equation object, unchanged)
+                   tuple([(e.LHS, e.RHS) for e in matr_equ.auxeqns]))
+            if clean.get(m) == key:
+                continue
             
-            #print 'sum_transform.py: working on ', Tmatrix
-            #Tmatrix_squeeze = sp.simplify(notation_squeeze(Tmatrix))
-            
-            #if(self.BHdebug):
-                ##print 'sum of angles transform: input: '
-                ##sp.pprint(matr_equ.Ts)
-                ###print out the squeezed form
-                #print 'sum of angles transform: squeezed test input:'
-                #sp.pprint(Tmatrix_squeeze)
-                
             unkn_sums_sym = set() #keep track of joint variable symbols
-            
-            thx = sp.Wild('thx')   # sympy wildcards for template matching
-            thy = sp.Wild('thy')
-            sgn = sp.Wild('sgn')
+            sums = []             # (thx + sgn*thy, th_xy) to substitute
             
             success_flag = False
             
             Tmlist = Tmatrix.get_kequation_list() # convert to list of equns
             for Teqn in Tmlist:   
                 for expr in [Teqn.LHS, Teqn.RHS]:
-                        # need new ways to identify thx +/- thy
-                        # notation_squeeze does not pick up - cases
-                        #eLHS = expr.LHS
-                        #eRHS = expr.RHS
-    
-                        
-                        #print 'sum_of_angles_ID: ', expr 
-                    
-                        sub_sin = expr.find(sp.sin(thx + sgn * thy)) #returns a subset of expressions with the query pattern, this finds sin(thx) too
-                        sub_cos = expr.find(sp.cos(thx + sgn * thy))
-                            
-                        found = False
-                        while len(sub_sin) > 0 and not found:
-                            sin_expr = sub_sin.pop()
-                            d = sin_expr.match(sp.sin(thx + sgn * thy))
-                            if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0: #has to be joint variable
-                                found = True
-
-                            
-                        while len(sub_cos) > 0 and not found:
-                            cos_expr = sub_cos.pop()
-                            d = cos_expr.match(sp.cos(thx + sgn * thy))
-                            if d[thx] != 0 and d[sgn] != 0 and d[thy] != 0:
-                                found = True
-                            
-                        if found:
+                        d = soa_find(expr)
+                        if d is not None:
                             print('- - - - - - - - >>>> test: found:', expr)
                             success_flag = True
                             th_xy = find_xy(d[thx], d[thy])
@@ -119,8 +144,19 @@ class sum_id(b3.Action):   ##  we should change this name since its a transform
                                 R.kequation_aux_list.append(tmpeqn)
                                 print(d[thx] + d[sgn]*d[thy])
                                 #substitute all thx +/- thy expression with th_xy
-                                matr_equ.Ts = matr_equ.Ts.subs(d[thx] + d[sgn] * d[thy], th_xy)
-                                matr_equ.Td = matr_equ.Td.subs(d[thx] + d[sgn] * d[thy], th_xy) 
+                                sums.append((d[thx] + d[sgn] * d[thy], th_xy))
+
+            if success_flag:
+                if len(sums) > 0:
+                    rep = soa_map(list(matr_equ.Ts) + list(matr_equ.Td), sums)
+                    matr_equ.Ts = matr_equ.Ts.xreplace(rep)
+                    matr_equ.Td = matr_equ.Td.xreplace(rep)
+                    if len(rep) > 0:
+                        matr_equ.changed()
+                clean.pop(m, None)    # look again next time
+            else:
+                clean[m] = key
+        R.sum_id_keys = clean
         
         tick.blackboard.set('Robot', R)
 
@@ -37,7 +37,6 @@ from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics
 from ikbtleaves.updateL import *
 from ikbtleaves.comp_detect import *
 from ikbtleaves.assigner_leaf  import *
-from sympy.assumptions.assume import global_assumptions
 
 import b3 as b3          # behavior trees
 
@@ -79,10 +78,9 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
 
 
                 # fix the eqn, but not changing the original equation - DZ
-                tmp = e.RHS-e.LHS
                 sp.var('dummy')
                 lhs =  dummy-dummy  # x-x is not same thing as 0 (!)
-                if(not (tmp).has(u.symbol)):
+                if(not eqn_has(e, u.symbol)):
                     continue        # only look at equations having the current unknown in them
                 if(self.BHdebug):
                     print("\n\n  tan_id:        Looking for unknown: ", u.symbol, " in equation: ", )
@@ -90,41 +88,45 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
                     print("  which has ", count_unknowns(unknowns, e.RHS), " unknown(s) in RHS")
                     print("     and    ", count_unknowns(unknowns, e.LHS), " unknown(s) in LHS")
             
-                if (tmp.has(sp.sin(u.symbol)) and tmp.has(sp.cos(u.symbol))):
+                if (eqn_has_sin(e, u.symbol) and eqn_has_cos(e, u.symbol)):
                     continue   # this should be caught by sinANDcos solver
                     
                 
 
-                if tmp.has(sp.sin(u.symbol)):
+                if eqn_has_sin(e, u.symbol):
                     sin_eqn.append(e)
-                if tmp.has(sp.cos(u.symbol)):
+                if eqn_has_cos(e, u.symbol):
                     cos_eqn.append(e)
 
 
 
 
             for es in sin_eqn:
-                estst = (es.RHS - es.LHS).collect(terms)  # get all the sin(th)s collected
-                d1 = estst.match(Aw*sp.sin(u.symbol) + Bw)
+                # 0 = Aw*sin(th_XX) + Bw   (sin(th)s collected)
+                t = eqn_trig_terms(es, u.symbol)
+                if t is None:       # (e.g. a sin(th)**2 term)
+                    continue
+                [A1, B0, B1, estst] = t
                 if self.BHdebug: 
                     print('---')
                     print("\nsin equ: ")
                     print(u.eqntosolve)
                     print("\nsin(): coefficients are : ")
-                    print(d1[Aw] )
+                    print(A1 )
                     print('---')
                 for ec in cos_eqn:  
-                    ectst = (ec.RHS - ec.LHS).collect(terms)  # get all the cos(th)s collected
-                    d2 = ectst.match(Cw*sp.cos(u.symbol) + Dw)
+                    # 0 = Cw*cos(th_XX) + Dw   (cos(th)s collected)
+                    t = eqn_trig_terms(ec, u.symbol)
+                    if t is None:
+                        continue
+                    [C0, C2, D2, ectst] = t
                     if self.BHdebug: 
                         print("\ncos equ: ")
                         print(u.secondeqn)
                         print("\ncos(): coefficients")
-                        print(d2[Cw]          )
+                        print(C2          )
                     
-                    # check some things about potential solvable equations
-                    assert(d1 is not None and d2 is not None), 'somethings wrong!'
-                    co = d1[Aw]/d2[Cw]   # take ratio
+                    co = A1/C2   # take ratio
                     # it's not solvable if (simplified) coefficient contains unknowns, or other parts have unknowns
                 
                     #print 
@@ -134,7 +136,7 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
                     
                     
                     too_many_unknowns = False
-                    if count_unknowns(unknowns, co) > 0 or count_unknowns(unknowns, d1[Bw]) >0 or count_unknowns(unknowns, d2[Dw]) > 0:
+                    if count_unknowns(unknowns, co) > 0 or count_unknowns(unknowns, B1) >0 or count_unknowns(unknowns, D2) > 0:
                         too_many_unknowns = True
 
 
@@ -147,7 +149,7 @@ class tan_id(b3.Action):    # action leaf for ID eqns solved by atan2()
                         # u.eqntosolve and secondeqn are already set up above 
                         print('tan_id:  able to solve', u.symbol)
                         if count_unknowns(unknowns, co) > 0: #cancellable unsolved term, add the nonzero assumption
-                            global_assumptions.add(sp.Q.nonzero(d2[Cw]))                            
+                            get_assumptions(tick.blackboard).add(sp.Q.nonzero(C2))
                         u.solvemethod += "atan2(y,x)"
                         u.solvable_tan = True
                         
@@ -213,39 +215,40 @@ class tan_solve(b3.Action):    # Solve sin cos equation pairs
                 print(u.eqntosolve)
                 
             rhs = u.eqntosolve.RHS
-            Aw = sp.Wild("Aw")
-            Bw = sp.Wild("Bw")
-            d  = rhs.match(Aw*sp.sin(u.symbol)+Bw)
+            #  rhs = A*sin(th) + B  (same decomposition as tan_id)
+            t = trig_terms(rhs, u.symbol)
+            assert(t is not None), fs
+            [A, A0, B, rhsc] = t
             
-            assert(d != None), fs
-            assert(count_unknowns(unknowns, d[Bw])==0), fs
+            assert(count_unknowns(unknowns, B)==0), fs
             
             # now the second equation for this variable
             x2 = u.secondeqn.LHS # it's 0
             rhs2 = u.secondeqn.RHS
-            d2 = rhs2.match(Aw*sp.cos(u.symbol)+Bw)
+            t = trig_terms(rhs2, u.symbol)
+            assert(t is not None), fs
+            [C0, A2, B2, rhs2c] = t
             
-            assert(d2 != None), fs
-            assert(count_unknowns(unknowns, d2[Bw])==0), fs
+            assert(count_unknowns(unknowns, B2)==0), fs
 
             #construct solutions
-            print('tan_solver Denominators: ', d[Aw], d2[Aw])
+            print('tan_solver Denominators: ', A, A2)
 
-            co = d[Aw]/d2[Aw] #coefficients of Y and X
-            Y = x-d[Bw]
-            X = x2-d2[Bw]
+            co = A/A2 #coefficients of Y and X
+            Y = x-B
+            X = x2-B2
             
-            # the reason it can only test one d[Aw] is that 
+            # the reason it can only test one A is that 
             # the two eqn are pre-screened by the ID
             # safer way to do it is to get the unsolved unknown number 
-            # from d[Aw] and d2[Aw] and use the max
-            co_unk = get_variables(unk_unsol, d[Aw]) #get the cancelled unknown in the coefficients
+            # from A and A2 and use the max
+            co_unk = get_variables(unk_unsol, A) #get the cancelled unknown in the coefficients
             fsolved = True
             # if coefficient doesn't have unsolved unknowns
             if len(co_unk) == 0: 
                 # this is critical for "hidden dependency"
                 # can't use 'co', since it might have cancelled the parent (solved) variable
-                sol = sp.atan2(Y/d[Aw],X/d2[Aw]) 
+                sol = sp.atan2(Y/A,X/A2) 
                 u.solutions.append(sol)
                 u.tan_solutions.append(sol)
                 u.tan_eqnlist.append(u.eqntosolve)
@@ -263,8 +266,9 @@ class tan_solve(b3.Action):    # Solve sin cos equation pairs
                 
                 u.tan_eqnlist.append(u.eqntosolve)
                 u.tan_eqnlist.append(u.secondeqn)
-                u.assumption.append(sp.Q.positive(d[Aw]))  # right way to say "non-zero"?
-                u.assumption.append(sp.Q.negative(d[Aw]))                                                   
+                u.assumption.append(sp.Q.positive(A))  # right way to say "non-zero"?
+                u.assumption.append(sp.Q.negative(A))                                                   
+                get_assumptions(tick.blackboard).add(sp.Q.nonzero(A))  # either way
                 u.nsolutions = 2
 
                 # note that set_solved is doen in ranker (ranking sincos, and tan sols)
@@ -480,8 +484,14 @@ class TestSolver004(unittest.TestCase):    # change TEMPLATE to unique name (2 p
 
         self.assertTrue(ntests == 5, 'tan_solver:   Assert count    FAIL')
         print('Passed: ', ntests, ' asserts')
-        print("global assumptions")
-        print(global_assumptions)
+        print("solve assumptions")
+        print(get_assumptions(bb2))
+        #  only in this solve's context, not in sympy's global_assumptions
+        fs = 'tan_solver assumption context FAIL'
+        from sympy.assumptions.assume import global_assumptions
+        self.assertTrue(len(get_assumptions(bb2)) > 0, fs)
+        self.assertTrue(len(global_assumptions) == 0, fs)
+        self.assertTrue(get_assumptions(b3.Blackboard()).facts == [], fs)
         
 
 
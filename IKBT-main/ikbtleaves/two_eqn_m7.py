@@ -89,8 +89,8 @@ class simu_id(b3.Action):
                 eq1 = e_flat
                 for j in range(i+1, len(eqn_list)):
                     e_flat = eqn_list[j]
-                    if e_flat - eq1 == 0 or e_flat + eq1 == 0:
-                        continue
+                    if is_zero(e_flat - eq1, False) or is_zero(e_flat + eq1, False):
+                        continue   # same equation
 
                     d2 = {}
                     d2[Aw] = e_flat.coeff(sp.cos(curr_unk.symbol))
@@ -102,8 +102,8 @@ class simu_id(b3.Action):
                         print(d2[Aw],'\n',d2[Bw])
 
                     eq2 = e_flat
-                    if (d1[Aw] == d2[Aw] or d1[Aw] == -d2[Aw]) \
-                        and (d1[Bw] == d2[Bw] or d1[Bw] == -d2[Bw]):
+                    if (equivalent(d1[Aw], d2[Aw]) or equivalent(d1[Aw], -d2[Aw])) \
+                        and (equivalent(d1[Bw], d2[Bw]) or equivalent(d1[Bw], -d2[Bw])):
                         found = True
                         if self.BHdebug:
                             print("found two equ two unknown")
@@ -111,8 +111,8 @@ class simu_id(b3.Action):
                             print(eq2)
                     # it's also possible the order is reversed
                     # if that's the case, swap
-                    elif (d1[Aw] == d2[Bw] or d1[Aw] == -d2[Bw]) \
-                        and (d1[Bw] == d2[Aw] or d1[Bw] == -d2[Aw]):
+                    elif (equivalent(d1[Aw], d2[Bw]) or equivalent(d1[Aw], -d2[Bw])) \
+                        and (equivalent(d1[Bw], d2[Aw]) or equivalent(d1[Bw], -d2[Aw])):
                         print("reverse order")
                         found = True
                         temp = eq1
@@ -141,14 +141,15 @@ class simu_solver(b3.Action):
         A = eq1.coeff(sp.sin(curr_unk.symbol))
         B = eq1.coeff(sp.cos(curr_unk.symbol))
 
+        ctx = get_assumptions(tick.blackboard)
         C = A*sp.sin(curr_unk.symbol) + B*sp.cos(curr_unk.symbol) - eq1
-        C = C.simplify()
+        C = ctx.simplify(C)
 
         D = A*sp.cos(curr_unk.symbol) - B*sp.sin(curr_unk.symbol) - eq2
-        D = D.simplify()
+        D = ctx.simplify(D)
 
 
-        if C == 0 and D == 0:
+        if is_zero(C) and is_zero(D):
             print("Simultaneous Eqn Unsuccessful: divded by 0")
             return b3.FAILURE
 
@@ -27,6 +27,7 @@ from sys import exit
 from ikbtfunctions.helperfunctions import *
 from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+from ikbtbasics.fk_cache import kinematics_cache
 
 import b3 as b3          # behavior trees
 
@@ -34,6 +35,44 @@ import b3 as b3          # behavior trees
 from ikbtfunctions.ik_robots import *
 import pickle     # for storing pre-computed FK eqns
 
+#
+#   R.scan_for_equations() is run again only when something it looks at has
+#     changed: a matrix equation (added, or changed, see
+#     matrix_equation.changed()), the aux equations, the list of unknowns or
+#     which of them are solved.  Otherwise the lists of the last scan (kept
+#     in R) are used.
+#   An equation already in the lists (same canonical form, see
+#     kequation.canonical()) is only kept once.
+#
+def scan_key(R, variables):
+    return (tuple([(id(m), m.version, len(m.auxeqns)) for m in R.mequation_list]),
+            len(R.kequation_aux_list),
+            tuple([(u.symbol, u.solved) for u in variables]))
+
+# equations of L which are not in keys (canonical forms), keys is updated
+def new_equations(L, keys):
+    Lnew = []
+    for e in L:
+        k = e.canonical()
+        if k not in keys:
+            keys.add(k)
+            Lnew.append(e)
+    return Lnew
+
+#  [L1, L2, L3p]: the equations with 1, 2, 3+ unsolved unknowns
+#    (R.scan_for_equations(), only scanned again when needed)
+def equation_lists(R, variables):
+    key = scan_key(R, variables)
+    scan = getattr(R, 'eqn_scan', None)
+    if scan is None or scan[0] != key:
+        keys = set()
+        lists = [new_equations(L, keys) for L in R.scan_for_equations(variables)]
+        # (the matrix equations are kept so their ids are not reused)
+        scan = [key, list(R.mequation_list), lists]
+        R.eqn_scan = scan
+    return [list(L) for L in scan[2]]   # (copies: callers add to them)
+
+
 class updateL(b3.Action):    # Set up (update) the equation lists
     def tick(self, tick):
         R = tick.blackboard.get('Robot')   # the current matrix equation
@@ -41,11 +80,13 @@ class updateL(b3.Action):    # Set up (update) the equation lists
 
         # below was a time waster!!!
         #R.sum_of_angles_transform(variables)
-        [L1, L2, L3p] = R.scan_for_equations(variables)   # get the equation lists
+        [L1, L2, L3p] = equation_lists(R, variables)   # get the equation lists
+        keys = set([e.canonical() for L in [L1, L2, L3p] for e in L])
         # aux equation (e.g. th_45 = th_4+th+5
         for e in R.kequation_aux_list:
-            sp.var('x')
             e1 = kequation(0, e.LHS-e.RHS)  # simplified form
+            if len(new_equations([e1], keys)) == 0:
+                continue
             cu = count_unknowns(variables, e1.RHS)
             if cu == 1:
                 L1.append(e1)
@@ -53,7 +94,7 @@ class updateL(b3.Action):    # Set up (update) the equation lists
                 L2.append(e1)
             elif cu == 3:
                 L3p.append(e1)
-        
+
         tick.blackboard.set('eqns_1u', L1)  # eqns w/ 1 unknown
         tick.blackboard.set('eqns_2u', L2)  # eqns w/ 2 unknowns
         tick.blackboard.set('eqns_3pu', L3p)  # eqns w/ 3 unknowns
@@ -74,8 +115,42 @@ class TestSolver007(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         # return
 
     def runTest(self):
+        self.test_scan_key()
         self.test_updateL()
 
+    def test_scan_key(self):
+        # equation_lists() scans again only after a change
+        sp.var('Px Py Pz')
+        class robot:    # (the parts of a Robot used here, counts the scans)
+            def __init__(self):
+                self.mequation_list = [matrix_equation(ik_lhs(), sp.eye(4))]
+                self.kequation_aux_list = []
+                self.nscans = 0
+            def scan_for_equations(self, variables):
+                self.nscans += 1
+                e = kequation(Px, sp.cos(th_1))
+                return [[e, kequation(-Px, -sp.cos(th_1))], [kequation(Py, th_1 + th_2)], []]
+        R = robot()
+        unks = [unknown(th_1), unknown(th_2)]
+        fs = 'updateL: equation_lists() scans   FAIL'
+        [L1, L2, L3p] = equation_lists(R, unks)
+        self.assertTrue(R.nscans == 1 and len(L1) == 1 and len(L2) == 1, fs)  # (duplicate dropped)
+        L1.append(kequation(Pz, 0))     # (a copy)
+        self.assertTrue(len(equation_lists(R, unks)[0]) == 1 and R.nscans == 1, fs)
+        R.mequation_list[0].changed()
+        equation_lists(R, unks)
+        self.assertTrue(R.nscans == 2, fs)
+        unks[1].solved = True
+        equation_lists(R, unks)
+        self.assertTrue(R.nscans == 3, fs)
+        R.kequation_aux_list.append(kequation(th_2, 0))
+        equation_lists(R, unks)
+        R.mequation_list.append(matrix_equation(ik_lhs(), sp.eye(4)))
+        equation_lists(R, unks)
+        self.assertTrue(R.nscans == 5, fs)
+        equation_lists(R, unks)
+        self.assertTrue(R.nscans == 5, fs)
+
     def test_updateL(self):
         #
         #     Set up robot equations for further solution by BT
@@ -93,19 +168,14 @@ class TestSolver007(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         if PickleFK:
             print('\n------------')
             print('Current dir: ', os.getcwd())
-            pickname = 'IKBT/fk_eqns/Puma_pickle.p'
-            if(os.path.isfile(pickname)):
-                print('a pickle file will be used to speed up')
-            else:
-                print('There was no pickle file')
             print('------------')
 
             #return [dh, vv, params, pvals, variables]
             robot = 'Puma'
             [dh, vv, params, pvals, unknowns] = robot_params(robot)  # see ik_robots.py
-            #def kinematics_pickle(rname, dh, constants, pvals, vv, unks, test):
+            #def kinematics_cache(rname, dh, constants, pvals, vv, unks, test):
             Test = True
-            [M, R, unk_Puma] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, Test)
+            [M, R, unk_Puma] = kinematics_cache(robot, dh, params, pvals, vv, unknowns, Test)
             #print 'Starting Sum of Angle scan/transform'
             #R.sum_of_angles_transform(unknowns)
             #print 'Completed Sum of Angles scan/transform'
@@ -114,9 +184,6 @@ class TestSolver007(unittest.TestCase):    # change TEMPLATE to unique name (2 p
 
             R.name = 'test: '+ robot # ??? TODO: get rid of this (but fix report)
 
-            ##   check the pickle in case DH params were changed
-            check_the_pickle(M.DH, dh)   # check that two mechanisms have identical DH params
-
             testerbt = b3.BehaviorTree()
             setup = updateL()
             setup.BHdebug = True
@@ -186,8 +253,14 @@ class TestSolver007(unittest.TestCase):    # change TEMPLATE to unique name (2 p
 
         fs = 'Sum of Angles Transform  (2-way)   FAIL'
         self.assertTrue(L2[0].RHS == -a_2*sp.sin(th_2)-a_3*sp.sin(th_23) + d_1 - d_4*(sp.cos(th_23)), fs)
-        self.assertTrue(L2[1].RHS == -a_2*sp.sin(th_2) - a_3*sp.sin(th_23) - d_4*sp.cos(th_23), fs)
         self.assertTrue(L2[0].LHS == Pz, fs)
+        #  Pz-d_1 = ...  is the same equation (only kept once by updateL)
+        e = kequation(Pz - d_1, -a_2*sp.sin(th_2) - a_3*sp.sin(th_23) - d_4*sp.cos(th_23))
+        self.assertTrue(e.canonical() in [e2.canonical() for e2 in L2], fs)
+        if PickleFK:
+            fs = 'updateL: duplicate equations   FAIL'
+            for L in [L1, L2, bb.get('eqns_3pu')]:
+                self.assertTrue(len(set([e.canonical() for e in L])) == len(L), fs)
 
         #########################################
         # test R.set_solved
@@ -206,6 +279,30 @@ class TestSolver007(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         self.assertTrue(    u.solved      , fs)
         self.assertTrue(R.solveN == 1, fs)  # when initialized solveN=0 set_solved should increment it
 
+        if PickleFK:
+            #  the same lists as a new scan (with the same order)
+            testerbt.tick('test', bb)
+            [S1, S2, S3p] = R.scan_for_equations(unk_Puma)
+            fs = 'updateL: kept equation lists   FAIL'
+            for (L, S) in [(bb.get('eqns_1u'), S1), (bb.get('eqns_2u'), S2)]:
+                keys = set()
+                S = new_equations(S, keys)
+                self.assertTrue([e.canonical() for e in L[0:len(S)]] == [e.canonical() for e in S], fs)
+
+            #  nothing changed: no new scan
+            scan = R.eqn_scan
+            testerbt.tick('test', bb)
+            self.assertTrue(R.eqn_scan is scan, fs)
+
+            #  a changed matrix equation: scanned again
+            m = R.mequation_list[1]
+            m.Ts[0,3] = m.Ts[0,3] + th_6
+            m.changed()
+            new = kequation(m.Td[0,3], m.Ts[0,3])
+            testerbt.tick('test', bb)
+            self.assertTrue(R.eqn_scan is not scan, fs)
+            self.assertTrue(new.canonical() in [e.canonical() for e in bb.get('eqns_1u') + bb.get('eqns_2u') + bb.get('eqns_3pu')], fs)
+
         # solutiontreenodes no longer used
         #self.assertTrue(len(R.solutiontreenodes) == 3, fs)  # we should now have three nodes (root + two solns)
 
@@ -36,10 +36,12 @@
 import sympy as sp  
 import numpy as np
 from sys import exit
+import time
 
 from ikbtfunctions.helperfunctions import *
 from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+from ikbtbasics.fk_cache import kinematics_cache
 from ikbtfunctions.ik_robots import *
 
 
@@ -120,13 +122,9 @@ class test_x2z2(b3.Action):    # tester for your ID
 
         print('Testing x2z2transform with Puma Kinematics')
         testflag = False # deprecated but needed(!)
-        # read kinematic model from pickle file / or compute it from scratch
-        [M, R, variables ] = kinematics_pickle(robot, dh, params, pvals, vv, variables, testflag)
-        #def kinematics_pickle(rname, dh, constants, pvals, vv, unks, test):
-
-        ##   check the pickle in case DH params were changed in robot_params making the 
-        #       pickle obsolete.
-        check_the_pickle(dh_Puma560, M.DH) 
+        # read kinematic model from the FK cache / or compute it from scratch
+        [M, R, variables ] = kinematics_cache(robot, dh, params, pvals, vv, variables, testflag)
+        #def kinematics_cache(rname, dh, constants, pvals, vv, unks, test):
         
         R.name = 'Puma x2z2 Test Robot' 
         # set th_1 to solved 
@@ -148,12 +146,55 @@ class test_x2z2(b3.Action):    # tester for your ID
         return b3.SUCCESS
 
 
+#
+#   Squaring and adding two equations (and simplify()ing) is expensive, so
+#     the pairs are first scored cheaply from the unknowns and position
+#     symbols in each equation, pairs which can't give an equation in the
+#     current unknown are dropped, and only the best few are simplified
+#     (within a budget: max_simplify, time_budget, set in ikSolver).  The
+#     square of each equation side and the simplified sums of each pair are
+#     kept for the solve (in the node memory of the blackboard), so nothing
+#     is squared or simplified twice.  (The squares are not expanded: the
+#     sums simplify() to the same forms as before.)
+#
+position_symbols = [Px, Py, Pz]
+X2Z2_PAIRS_MAX = 500     # most pair results kept
+
+#  unknowns (symbols, unsolved) in the LHS and RHS and position symbols
+def x2z2_signature(unknowns, e):
+    l = frozenset([u.symbol for u in get_unknowns(unknowns, e.LHS)])
+    r = frozenset([u.symbol for u in get_unknowns(unknowns, e.RHS)])
+    p = frozenset([s for s in position_symbols if eqn_has(e, s)])
+    return [l, r, p]
+
+#  score of a pair of equations (smaller is better) or None if squaring
+#    and adding can't leave one unknown, or the current unknown u isn't in it
+def x2z2_score(unknowns, u, e1, e2):
+    [l1, r1, p1] = x2z2_signature(unknowns, e1)
+    [l2, r2, p2] = x2z2_signature(unknowns, e2)
+    if l1 != l2:     # unknowns on the left have to cancel out (e.g. th_1 in
+        return None  #   (Px*cos(th_1) + Py*sin(th_1))**2 + (-Px*sin(th_1) + Py*cos(th_1))**2)
+    r = r1 | r2
+    if len(r1 & r2) == 0 or len(r) > 2:
+        return None  # at most one unknown is eliminated
+    reach = set(r)   # (sums of angles are expanded after the simplify)
+    for s in r:
+        if s in soa_expansions:
+            reach |= soa_expansions[s].free_symbols
+    if u.symbol not in reach:
+        return None  # nothing for this unknown (the pair is tried for its own)
+    return (len(l1),               # no unknowns on the left first
+            len(r),
+            p1 == p2)              # different position components
+
 class x2z2_transform(b3.Action):     
     # Eff Dec 2021, x2z2 is NOW a transform which only generates a 1-unk equation
     # for *other* leaves to solve. 
-    def __init__(self):
+    def __init__(self, max_simplify=8, time_budget=60.0):
         super().__init__()             
         self.SolvedOneFlag = False      # turn off this expensive leaf after it has worked once
+        self.max_simplify = max_simplify  # most sums of squares to simplify() in one tick
+        self.time_budget = time_budget    # seconds of simplify() in one tick
 
     def tick(self, tick):
         #if self.SolvedOneFlag:           #  we will only get lucky with this method once (HACK!)
@@ -182,17 +223,11 @@ class x2z2_transform(b3.Action):
 
         eqn_ls = []
         
-
-        # note: x2y2 is somewhat costly,  
-        #  This is a hack exploiting it seems to be needed only for
-        #   Th 2 or Th_3 on the Puma and Kawasaki robot
-        if not u.symbol == th_3 or u.symbol == th_2 :
+        if u.solved:
             return b3.FAILURE
 
-            
         for e in (two_unk): # only two-unk list is enough
-            tmp = e.RHS + e.LHS
-            if (tmp.has(Py) or tmp.has(Px) or tmp.has(Pz)):
+            if (eqn_has(e, Py) or eqn_has(e, Px) or eqn_has(e, Pz)):
                 eqn_ls.append(e)
 
         found = False
@@ -202,50 +237,94 @@ class x2z2_transform(b3.Action):
             print("found potential eqn list: ", len(eqn_ls))
             print(eqn_ls)
             
-        
-        # find any two equations and add their squares of each side
+        # score the pairs (cheap), best first
         #   ( we can't count on just [0,3],[2,3])
-        #
+        scored = []
         for i in range(len(eqn_ls)):  
+            for j in range(i+1, len(eqn_ls)):
+                score = x2z2_score(unknowns, u, eqn_ls[i], eqn_ls[j])
+                if score is not None:
+                    scored.append((score, i, j))
+        scored.sort()
+        if len(scored) == 0:
+            return b3.FAILURE
+
+        # pair results of this solve: (l1, r1, l2, r2) -> [temp_l, temp_r]
+        pairs = tick.blackboard.get('x2z2_pairs', tick.tree.id, self.id)
+        # squares of the equation sides: expr -> expr*expr
+        squares = tick.blackboard.get('x2z2_squares', tick.tree.id, self.id)
+        if pairs is None or len(pairs) > X2Z2_PAIRS_MAX:
+            pairs = {}
+            squares = {}
+            tick.blackboard.set('x2z2_pairs', pairs, tick.tree.id, self.id)
+            tick.blackboard.set('x2z2_squares', squares, tick.tree.id, self.id)
+        def square(e):
+            sq = squares.get(e)
+            if sq is None:
+                sq = e*e
+                squares[e] = sq
+            return sq
+
+        # square and add the most promising pairs
+        t0 = time.perf_counter()
+        ntried = 0
+        def budget_left():
+            if ntried >= self.max_simplify or time.perf_counter() - t0 > self.time_budget:
+                print('x2z2: budget used up after', ntried, 'sums of squares')
+                return False
+            return True
+
+        for (score, i, j) in scored:
             eqn1 = eqn_ls[i]
             r1 = eqn1.RHS
             l1 = eqn1.LHS
-            for j in range(i+1, len(eqn_ls)):
-                eqn2 = eqn_ls[j]
-                r2 = eqn2.RHS
-                l2 = eqn2.LHS
-                
+            eqn2 = eqn_ls[j]
+            r2 = eqn2.RHS
+            l2 = eqn2.LHS
+            
+            key = (l1, r1, l2, r2)
+            if key not in pairs:
+                if not budget_left():
+                    break
+                ntried += 1
                 if (self.BHdebug):
                     print("currently evaluating: ")
                     print(eqn1)
                     print(eqn2)
                     print("\n")
                     
-                temp_l = l1*l1 + l2*l2
+                temp_l = square(l1) + square(l2)
                 temp_l = temp_l.simplify()
+                pairs[key] = [temp_l, None]
                 
-                if count_unknowns(unknowns, temp_l) == 0:
-                    
-                    temp_r = r1*r1 + r2*r2
+            [temp_l, temp_r] = pairs[key]
+            if count_unknowns(unknowns, temp_l) == 0:
+                if temp_r is None:
+                    if not budget_left():
+                        break
+                    ntried += 1
+                    temp_r = square(r1) + square(r2)
 
                     temp_r = temp_r.simplify()
                     
                     temp_r = temp_r.subs(soa_expansions)
                     
                     temp_r = temp_r.simplify()
-                
+                    pairs[key] = [temp_l, temp_r]
 
-                    if count_unknowns(unknowns, temp_r) == 1:
-                        print("X2Z2 found a useful eqn!")
-                        found = True
-                if found:
+                if count_unknowns(unknowns, temp_r) == 1 and \
+                    kequation(temp_l, temp_r) not in R.kequation_aux_list:
+                    print("X2Z2 found a useful eqn!")
+                    found = True
                     break
-            if found:
-                break
 
         if not found:
             print("x2y2 did not find suitable eqns")
             return b3.FAILURE
+
+        # the unknown and the aux equations are changed in place
+        unknowns = tick.blackboard.modify('unknowns')
+        R = tick.blackboard.modify('Robot')
         
         # find the current unknown
         for u in unknowns:
@@ -315,6 +394,38 @@ class TestSolver010(unittest.TestCase):
                #  a new (but simpler) equation to the list unsolved equations
                assert 'x2z2 transform' in u.solvemethod, fs 
         
+        # once the equation is there, another pass adds nothing
+        #    (and re-uses the squared and added pair: no budget needed)
+        R = bb.get('Robot')
+        naux = len(R.kequation_aux_list)
+        pairs = bb.get('x2z2_pairs', ik_tester.id, x2z2_work.id)
+        assert len(pairs) > 0, fs
+        x2z2_work.max_simplify = 0
+        again = b3.BehaviorTree()
+        again.id = ik_tester.id
+        again.root = x2z2_work
+        again.tick("test x2z2 Transform (1) again", bb)
+        assert len(R.kequation_aux_list) == naux, fs
+
+        # a new solve (blackboard) starts without pair results, and with
+        #   no budget nothing is simplified
+        bb2 = b3.Blackboard()
+        for k in ['unknowns', 'Robot', 'eqns_1u', 'eqns_2u', 'eqns_3pu', 'curr_unk']:
+            bb2.set(k, bb.get(k))
+        R.kequation_aux_list = []
+        assert again.tick("test x2z2 Transform (1) no budget", bb2) == b3.FAILURE, fs
+        assert len(bb2.get('x2z2_pairs', again.id, x2z2_work.id)) == 0, fs
+        x2z2_work.max_simplify = 8
+
+        # pairs which can't leave one unknown are not tried
+        unks = [unknown(th_1), unknown(th_2), unknown(th_23), unknown(th_3)]
+        e1 = kequation(Px, a_2*sp.cos(th_2) + a_3*sp.cos(th_23))
+        e2 = kequation(Pz, a_2*sp.sin(th_2) + a_3*sp.sin(th_23))
+        e3 = kequation(Py, a_2*sp.sin(th_1) + a_3*sp.sin(th_3))
+        assert x2z2_score(unks, unks[3], e1, e2) is not None, fs
+        assert x2z2_score(unks, unks[3], e1, e3) is None, fs
+        assert x2z2_score(unks, unks[0], e1, e2) is None, fs   # no th_1 in the pair
+        
         print('      x2z2 PASSED test 1')
         print('')
         print('              = = =   Test X2Z2 transform (Puma)  = = = ')
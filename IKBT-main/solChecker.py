@@ -1,6 +1,7 @@
 from ikbtbasics.ik_classes import *
 from ikbtfunctions.ik_robots import * 
 from ikbtbasics.kin_cl import *
+from ikbtbasics.fk_cache import kinematics_cache
 from math import *
 import os
 
@@ -18,7 +19,7 @@ sp.var('Px Py Pz')
 #   Get the robot model 
 [dh, vv, params, pvals, unknowns] = robot_params(robot)  # see ik_robots.py 
 
-[M, R, unknowns] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, testing)
+[M, R, unknowns] = kinematics_cache(robot, dh, params, pvals, vv, unknowns, testing)
 
 # need to type in the poses
 pose = {th_1: 30*deg, th_2: 50*deg, th_3: 40*deg, th_4: 45*deg, th_5: 120*deg, \
@@ -50,15 +51,11 @@ def convert_to_degrees(solution_list):
     return solution_in_degree
 
 def verify_T_matrices(pose_list, variable_template, M, params_num):
-    T_mat_list = []
-
-    for one_pose in pose_list:
-        pose = {}
-        for i in range(len(one_pose)):
-            pose[variable_template[i]] = one_pose[i]*deg
-
-        T = forward_kinematics_N(M, pose, params_num)
-        T_mat_list.append(T)
+    # all poses in one call to the compiled FK
+    cols = [variable_template.index(v) for v in M.joint_vars()]
+    q = np.array(pose_list, dtype=float)[:, cols]*deg
+    T_all = M.fk_numeric(q, params_num)
+    T_mat_list = [np.matrix(T) for T in T_all]
     return T_mat_list
 
 
@@ -27,6 +27,7 @@ from ikbtbasics.pykinsym import *
 from ikbtfunctions.helperfunctions import *
 from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+from ikbtbasics.fk_cache import kinematics_cache
 from ikbtfunctions.ik_robots import *
 
 
@@ -160,20 +161,16 @@ robot = 'Wrist'
 #
 #     Set up robot equations for further solution by BT
 #
-#   Check for a pickle file of pre-computed Mech object. If the pickle
-#       file is not there, compute the kinematic equations
+#   Re-use any stages of the kinematic equations which are in the FK cache
+#       (fk_eqns/), compute the rest
 
 testing = False
-[M, R, unknowns] = kinematics_pickle(robot, dh, params, pvals, vv, unknowns, testing)
+[M, R, unknowns] = kinematics_cache(robot, dh, params, pvals, vv, unknowns, testing)
 print('GOT HERE: robot name: ', R.name)
 
 R.name = robot
 R.params = params
 
-##   check the pickle in case DH params were changed
-dhp = M.DH
-check_the_pickle(dhp, dh)   # check that two mechanisms have identical DH params
-
 sp.var('A B C')
 i=0
 # for each solution, compare FK(sol) with T01
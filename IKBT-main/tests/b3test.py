@@ -0,0 +1,351 @@
+#!/usr/bin/python
+#
+#     Test the behavior tree (b3) additions
+#
+# Copyright 2017 University of Washington
+
+# Developed by Dianmu Zhang and Blake Hannaford
+# BioRobotics Lab, University of Washington
+
+# Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+
+# 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+
+# 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the documentation and/or other materials provided with the distribution.
+
+# 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this software without specific prior written permission.
+
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+import unittest
+import os
+import json
+import tempfile
+import b3
+
+#
+#  Small nodes which act like the solver leaves on a stand-in unknown
+#
+class fake_unknown:
+    def __init__(self):
+        self.solutions = []
+        self.solvemethod = ''
+        self.deps = set()
+        self.nsolutions = 0
+
+test_memo = {}    # stands in for the helperfunctions memos
+
+class add_solution(b3.Action):
+    def __init__(self, sol, method, ok=True):
+        super(add_solution, self).__init__()
+        self.Name = 'add ' + method
+        self.sol = sol
+        self.method = method
+        self.ok = ok
+        self.Cost = 2
+
+    def tick(self, tick):
+        u = tick.blackboard.get('curr_unk')
+        test_memo[self.method] = self.sol
+        if not self.ok:
+            return b3.FAILURE
+        u.solutions.append(self.sol)
+        if len(u.solvemethod) > 0:
+            u.solvemethod += ', '
+        u.solvemethod += self.method
+        u.deps.add(self.method)
+        u.nsolutions = 1
+        tick.blackboard.set('curr_unk', u)
+        return b3.SUCCESS
+
+class set_key(b3.Action):
+    def tick(self, tick):
+        tick.blackboard.set('other', [1])
+        return b3.SUCCESS
+
+class record(b3.Action):
+    def __init__(self, name, status, log):
+        super(record, self).__init__()
+        self.Name = name
+        self.status = status
+        self.log = log
+
+    def tick(self, tick):
+        self.log.append(self.Name)
+        return self.status
+
+#####################################################################################
+# Test code for the b3 additions
+#
+class TestSolver013(unittest.TestCase):
+    def setUp(self):
+        self.DB = False  # debug flag
+        return
+
+    def runTest(self):
+        self.test_parallel_ornode()
+        self.test_blackboard_version()
+        self.test_blackboard_transactions()
+        self.test_utility_priority()
+        self.test_node_stats()
+        self.test_profiler()
+        return
+
+    # tree with the pair of children under `composite`, its blackboard and unknown
+    def or_tree(self, composite):
+        tree = b3.BehaviorTree()
+        children = [add_solution('tan', 'atan2(y,x)'),
+                    add_solution('nope', 'arccos', ok=False),
+                    add_solution('sin', 'arcsin')]
+        tree.root = b3.Sequence([composite(children), b3.Succeeder()])
+        bb = b3.Blackboard()
+        u = fake_unknown()
+        bb.set('curr_unk', u)
+        return [tree, bb, u]
+
+    def test_parallel_ornode(self):
+        fs = 'ParallelOrNode  FAIL'
+        [t1, bb1, u1] = self.or_tree(b3.OrNode)
+        test_memo.clear()
+        s1 = t1.tick(None, bb1)
+        memo1 = dict(test_memo)
+
+        def parallel(children):
+            return b3.ParallelOrNode(children, merge=['curr_unk'], memos=[test_memo])
+        [t2, bb2, u2] = self.or_tree(parallel)
+        self.assertTrue(t2.root.children[0].parallel(), fs)
+        test_memo.clear()
+        s2 = t2.tick(None, bb2)
+
+        self.assertTrue(s1 == s2 == b3.SUCCESS, fs)
+        self.assertTrue(u2.solutions == u1.solutions == ['tan', 'sin'], fs)
+        self.assertTrue(u2.solvemethod == u1.solvemethod == 'atan2(y,x), arcsin', fs)
+        self.assertTrue(u2.deps == u1.deps and u2.nsolutions == u1.nsolutions, fs)
+        self.assertTrue(test_memo == memo1 and len(memo1) == 3, fs)   # worker memo entries
+        self.assertTrue(bb2.get('TotalCost') == bb1.get('TotalCost') > 0, fs)
+        self.assertTrue(bb2.get('node_count', t2.id) == bb1.get('node_count', t1.id) == 6, fs)
+        for (n1, n2) in zip(t1.root.children[0].children, t2.root.children[0].children):
+            self.assertTrue(bb2.get('is_open', t2.id, n2.id) == bb1.get('is_open', t1.id, n1.id) == False, fs)
+            for f in ['N_ticks_all', 'N_success', 'N_tik2', 'N_suc2']:
+                self.assertTrue(getattr(n1, f) == getattr(n2, f), fs)
+
+        # a child may only set the merge keys
+        tree = b3.BehaviorTree()
+        tree.root = b3.ParallelOrNode([set_key(), b3.Succeeder()], merge=['curr_unk'])
+        self.assertRaises(ValueError, tree.tick, None, b3.Blackboard())
+        return
+
+    def test_blackboard_version(self):
+        fs = 'Blackboard version  FAIL'
+        [tree, bb, u] = self.or_tree(b3.OrNode)
+        v = bb.version
+        bb.inc('TotalCost', 5)
+        bb.set('is_open', True, tree.id, 'node')
+        self.assertTrue(bb.version == v, fs)      # bookkeeping and node memory
+        tree.tick(None, bb)
+        v = bb.version
+        bb.set('x', 1)
+        self.assertTrue(bb.version == v + 1, fs)
+        bb.modify('curr_unk')
+        self.assertTrue(bb.version == v + 2, fs)
+        return
+
+    def test_blackboard_transactions(self):
+        fs = 'Blackboard transactions  FAIL'
+        bb = b3.Blackboard()
+        u = fake_unknown()
+        bb.set('curr_unk', u)
+        bb.set('unknowns', [u])
+        bb.set('x', 1)
+        bb.set('m', 'a', 'tree', 'node')
+
+        # commit keeps the changes
+        snap = bb.snapshot()
+        bb.set('x', 2)
+        bb.modify('curr_unk').solutions.append(1)
+        bb.commit(snap)
+        self.assertTrue(bb.get('x') == 2, fs)
+        self.assertTrue(bb.get('curr_unk').solutions == [1], fs)
+        self.assertTrue(bb.get('unknowns')[0].solutions == [1], fs)
+        u = bb.get('curr_unk')
+
+        # rollback restores every scope and the objects changed in place
+        snap = bb.snapshot()
+        bb.set('x', 3)
+        bb.set('y', 3)
+        bb.set('m', 'b', 'tree', 'node')
+        bb.inc('TotalCost', 4)
+        v = bb.modify('curr_unk')
+        v.solutions.append(2)
+        bb.modify('unknowns')[0].nsolutions = 1
+        self.assertTrue(bb.get('unknowns')[0] is v, fs)   # still one object
+        self.assertTrue(v is not u and u.solutions == [1], fs)
+        bb.rollback(snap)
+        self.assertTrue(bb.get('x') == 2 and bb.get('y') is None, fs)
+        self.assertTrue(bb.get('m', 'tree', 'node') == 'a', fs)
+        self.assertTrue(bb.get('TotalCost') == 0, fs)
+        self.assertTrue(bb.get('curr_unk') is u and u.solutions == [1], fs)
+        self.assertTrue(bb.get('unknowns')[0] is u and u.nsolutions == 0, fs)
+
+        # nested: the inner rollback keeps the outer changes
+        outer = bb.snapshot()
+        bb.modify('curr_unk').solutions.append(3)
+        bb.set('x', 4)
+        inner = bb.snapshot()
+        bb.modify('curr_unk').solutions.append(4)
+        bb.set('x', 5)
+        bb.rollback(inner)
+        self.assertTrue(bb.get('curr_unk').solutions == [1, 3], fs)
+        self.assertTrue(bb.get('x') == 4, fs)
+        bb.rollback(outer)
+        self.assertTrue(bb.get('curr_unk').solutions == [1] and bb.get('x') == 2, fs)
+
+        # no live snapshot: modify() changes the stored object
+        self.assertTrue(bb.modify('curr_unk') is u, fs)
+        return
+
+    def test_utility_priority(self):
+        fs = 'UtilityPriority  FAIL'
+        log = []
+        [a, b, c, d] = [record(n, b3.FAILURE, log) for n in 'abcd']
+        up = b3.UtilityPriority([a, b, c, d])
+
+        # untested children first, in the original order
+        self.assertTrue(up.order(0) == [a, b, c, d], fs)
+        # ties keep the original order, higher utility (P(success)/time) first
+        for (node, nsuc, t) in [(a, 1, 1.0), (b, 2, 1.0), (c, 1, 1.0), (d, 2, 0.5)]:
+            node.N_tik2[0] = 2
+            node.N_suc2[0] = nsuc
+            node.T_tik2[0] = t
+        self.assertTrue(up.order(0) == [d, b, a, c], fs)
+        self.assertTrue(up.order(1) == [a, b, c, d], fs)   # nothing known in state 1
+
+        # ticks in that order, with the same counters as b3.Priority
+        tree = b3.BehaviorTree()
+        tree.root = up
+        log[:] = []
+        self.assertTrue(tree.tick(None, b3.Blackboard()) == b3.FAILURE, fs)
+        self.assertTrue(log == ['d', 'b', 'a', 'c'], fs)
+        for node in [a, b, c, d]:
+            self.assertTrue(node.N_tik2[0] == 3 and node.N_ticks == 0, fs)
+            self.assertTrue(node.N_ticks_all == 1, fs)
+        pr = b3.Priority([record('p', b3.FAILURE, [])])
+        tree.root = pr
+        tree.tick(None, b3.Blackboard())
+        self.assertTrue(pr.children[0].N_ticks == 0, fs)
+        return
+
+    def stats_tree(self):
+        tree = b3.BehaviorTree()
+        tree.root = b3.Priority([record('a', b3.FAILURE, []), record('b', b3.SUCCESS, [])])
+        return tree
+
+    def test_node_stats(self):
+        fs = 'node stats FAIL'
+        tree = self.stats_tree()
+        tree.tick(None, b3.Blackboard())
+        tree.tick(None, b3.Blackboard())
+        [a, b] = tree.root.children
+        # every node is timed, not only the UtilityPriority children
+        self.assertTrue(a.N_tik2[0] == 2 and a.T_tik2[0] > 0, fs)
+        self.assertTrue(b.N_suc2[0] == 2 and b.N_success == 2, fs)
+
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, 'stats.json')
+            # missing file
+            t2 = self.stats_tree()
+            self.assertTrue(t2.load_stats(fn) == 0, fs)
+            # round trip
+            tree.save_stats(fn)
+            self.assertTrue(t2.load_stats(fn) == 3, fs)
+            for (n1, n2) in zip(tree.root.children, t2.root.children):
+                for f in ['N_ticks_all', 'N_success', 'N_tik2', 'N_suc2', 'T_tik2']:
+                    self.assertTrue(getattr(n1, f) == getattr(n2, f), fs)
+            # bad files
+            for bad in ['{not json', '[1, 2]', '{"version": 1}', '{"version": 1, "nodes": 3}']:
+                with open(fn, 'w') as f:
+                    f.write(bad)
+                self.assertTrue(self.stats_tree().load_stats(fn) == 0, fs)
+            # bad fields are skipped, the good ones loaded
+            tree.save_stats(fn)
+            with open(fn) as f:
+                data = json.load(f)
+            for s in data['nodes'].values():
+                s['N_tik2'] = [1, 2]
+                s['N_success'] = 'many'
+            with open(fn, 'w') as f:
+                json.dump(data, f)
+            t3 = self.stats_tree()
+            self.assertTrue(t3.load_stats(fn) == 3, fs)
+            [a3, b3_] = t3.root.children
+            self.assertTrue(a3.N_tik2 == [0, 0, 0, 0] and b3_.N_success == 0, fs)
+            self.assertTrue(a3.N_ticks_all == 2, fs)
+        return
+
+    def test_profiler(self):
+        fs = 'Profiler  FAIL'
+        log = []
+        [a, b, c] = [record('a', b3.SUCCESS, log), record('b', b3.FAILURE, log),
+                     record('c', b3.SUCCESS, log)]
+        pr = b3.Priority([b, c])
+        tree = b3.BehaviorTree()
+        tree.root = b3.Sequence([a, pr])
+        tree.profiler = b3.Profiler('curr_unk')
+        bb = b3.Blackboard()
+        bb.set('curr_unk', 'th_1')
+        tree.tick(None, bb)
+        tree.tick(None, bb)
+        st = tree.profiler.stats
+        self.assertTrue(st[a.id]['calls'] == 2 and st[a.id]['status'] == {'S': 2}, fs)
+        self.assertTrue(st[b.id]['calls'] == 2 and st[b.id]['status'] == {'F': 2}, fs)
+        self.assertTrue(st[pr.id]['calls'] == 2 and st[tree.root.id]['calls'] == 2, fs)
+        self.assertTrue(tree.profiler.ctx_stats[(c.id, 'th_1')]['calls'] == 2, fs)
+        for s in st.values():
+            self.assertTrue(s['incl'] >= s['excl'] >= 0.0, fs)
+        # a parent's inclusive time covers its children
+        self.assertTrue(st[pr.id]['incl'] >= st[b.id]['incl'] + st[c.id]['incl'], fs)
+        self.assertTrue(abs(st[pr.id]['excl'] - (st[pr.id]['incl'] - st[b.id]['incl'] - st[c.id]['incl'])) < 1.0e-9, fs)
+        self.assertTrue('*Sequence*;*Priority*;b' in tree.profiler.stacks, fs)
+        self.assertTrue('a' in tree.profiler.report(), fs)
+
+        # the report file is written when the tree finishes (not RUNNING)
+        with tempfile.TemporaryDirectory() as d:
+            fname = os.path.join(d, 'profile.txt')
+            run = record('r', b3.RUNNING, log)
+            t3 = b3.BehaviorTree()
+            t3.root = b3.Sequence([run])
+            t3.profiler = b3.Profiler(report_file=fname)
+            t3.tick(None, b3.Blackboard())
+            self.assertTrue(not os.path.isfile(fname), fs)
+            t3.profiler.write()
+            self.assertTrue(os.path.isfile(fname), fs)
+            os.remove(fname)
+            t3.root = b3.Sequence([a])
+            t3.tick(None, b3.Blackboard())
+            self.assertTrue(os.path.isfile(fname), fs)
+
+        # the children of a ParallelOrNode are timed in the workers
+        def parallel(children):
+            return b3.ParallelOrNode(children, merge=['curr_unk'])
+        [t2, bb2, u2] = self.or_tree(parallel)
+        t2.profiler = b3.Profiler()
+        t2.tick(None, bb2)
+        st = t2.profiler.stats
+        por = t2.root.children[0]
+        for n in por.children:
+            self.assertTrue(st[n.id]['calls'] == 1, fs)
+            self.assertTrue(st[n.id]['status'] == {'S': 1} or st[n.id]['status'] == {'F': 1}, fs)
+        self.assertTrue(st[por.id]['calls'] == 1 and st[por.id]['excl'] >= 0.0, fs)
+        self.assertTrue('*Sequence*;*ParallelOrNode*;add_arcsin' in t2.profiler.stacks, fs)
+        return
+
+#
+#    Can run your test from command line by invoking this file
+#
+#      - or - call your TestSolver013()  from elsewhere
+#
+
+if __name__ == "__main__":
+
+    print('\n\n===============  Test b3 additions =====================')
+    testsuite = unittest.TestLoader().loadTestsFromTestCase(TestSolver013)
+    unittest.TextTestRunner(verbosity=2).run(testsuite)
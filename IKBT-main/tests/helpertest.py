@@ -45,6 +45,10 @@ class TestSolver009(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         self.test_findobj()
         self.test_get_vars()
         self.test_get_unknowns()
+        self.test_eqn_index()
+        self.test_trig_terms()
+        self.test_is_zero()
+        self.test_assumption_context()
         return
             
     def test_lhs(self):
@@ -82,6 +86,105 @@ class TestSolver009(unittest.TestCase):    # change TEMPLATE to unique name (2 p
         self.assertTrue(len(unks) == 1, fs)
         self.assertTrue(unks[0] == self.uth4)
         return
+
+    def test_eqn_index(self):
+        fs = 'expression index FAIL'
+        self.assertTrue(has_symbol(self.expression01, th_2), fs)
+        self.assertTrue(has_sin(self.expression01, th_4), fs)
+        self.assertFalse(has_cos(self.expression01, th_4), fs)
+        self.assertFalse(has_sin(sp.sin(th_4+th_5), th_4), fs)  # like expr.has(sp.sin(th_4))
+
+        fs = 'eqn_index FAIL'
+        e1 = kc.kequation(sp.cos(th_3), th_2 + d_1)
+        e2 = kc.kequation(0, sp.sin(th_4)*th_5)
+        e3 = kc.kequation(1, d_1*th_5)
+        self.uth2.solved = False
+        idx = eqn_index([e1, e2, e3], self.vars)
+        self.assertTrue(eqn_has_cos(e1, th_3) and not eqn_has_sin(e1, th_3), fs)
+        self.assertTrue(idx.by_symbol[th_5] == [1, 2], fs)
+        self.assertTrue([idx.count(k) for k in range(3)] == [3, 2, 2], fs)
+        self.ud1.solved = True
+        for k in idx.by_symbol[d_1]:
+            idx.recount(k, self.vars)
+        self.assertTrue([idx.count(k) for k in range(3)] == [2, 2, 1], fs)
+        self.ud1.solved = False
+
+        fs = 'clear_memos FAIL'
+        expr_index(e1.RHS)
+        self.assertTrue(len(expr_index_memo) > 0, fs)
+        clear_memos()
+        for memo in solve_memos:
+            self.assertTrue(len(memo) == 0, fs)
+
+        fs = 'bounded_memo FAIL'
+        memo = bounded_memo(2)
+        self.assertTrue(memo in solve_memos, fs)
+        for i in range(3):
+            memo.put(i, i)
+        self.assertTrue(len(memo) == 3 and memo.get(2) == 2, fs)
+        memo.put(3, 3)      # (more than 2 entries: cleared first)
+        self.assertTrue(len(memo) == 1 and memo.get(0) is None, fs)
+        # an unhashable key (mutable Matrix) is not memoized
+        M = sp.Matrix([[th_4, sp.sin(th_2)]])
+        self.assertTrue(memo.get(M, 5) == 5 and memo.put(M, 6) == 6 and len(memo) == 1, fs)
+        self.assertTrue(has_symbol(M, th_4) and has_sin(M, th_2), fs)
+        solve_memos.remove(memo)
+        return
+
+    def test_trig_terms(self):
+        fs = 'trig_terms()  FAIL'
+        s3 = sp.sin(th_3)
+        c3 = sp.cos(th_3)
+        expr = d_1*s3 + th_2*s3 + th_5*c3 + th_4
+        [A, B, C, col] = trig_terms(expr, th_3)
+        self.assertTrue(A == d_1 + th_2, fs)
+        self.assertTrue(B == th_5, fs)
+        self.assertTrue(C == th_4, fs)
+        self.assertTrue(sp.expand(col - expr) == 0, fs)
+        # same answer as the Wild match the leaves used before
+        Aw = sp.Wild('Aw')
+        Bw = sp.Wild('Bw')
+        d = sp.collect(expr - th_5*c3, [s3, c3]).match(Aw*s3 + Bw)
+        self.assertTrue(trig_terms(expr - th_5*c3, th_3)[0] == d[Aw], fs)
+        self.assertTrue(trig_terms(expr - th_5*c3, th_3)[2] == d[Bw], fs)
+        e = kc.kequation(th_4, th_5*c3)
+        self.assertTrue(eqn_trig_terms(e, th_3)[1:3] == [th_5, -th_4], fs)
+        self.assertTrue(trig_terms(col, th_3) is trig_terms(expr, th_3), fs)
+        # sin(x)**2 (or sin(x)*cos(x)) is not A*sin(x) + B*cos(x) + C
+        self.assertTrue(trig_terms(d_1*s3**2 + th_5*c3, th_3) is None, fs)
+        self.assertTrue(trig_terms(d_1*s3*c3 + th_4, th_3) is None, fs)
+        self.assertTrue(trig_terms(d_1*s3**2 + th_5*c3, th_3) is None, fs)   # (memo)
+        return
+
+    def test_is_zero(self):
+        fs = 'is_zero()  FAIL'
+        s3 = sp.sin(th_3)
+        c3 = sp.cos(th_3)
+        self.assertTrue(is_zero(d_1*s3**2 + d_1*c3**2 - d_1), fs)
+        self.assertTrue(is_zero(sp.sin(th_2 + th_3) - sp.sin(th_2)*c3 - sp.cos(th_2)*s3, False), fs)
+        self.assertTrue(not is_zero(s3 - c3), fs)
+        self.assertTrue(not is_zero(s3**2 + c3**2 - 1 + sp.Rational(1, 10**12)), fs)
+        self.assertTrue(not is_zero(1/(th_2 - th_2 + 0*d_1)), fs)    # zoo
+        self.assertTrue(equivalent((th_2 + d_1)**2, th_2**2 + 2*th_2*d_1 + d_1**2), fs)
+        # the test points depend only on the expression
+        e = sp.sin(th_2 + th_3) - sp.sin(th_2)*c3 - sp.cos(th_2)*s3
+        z = numeric_zero(e)
+        numeric_zero(s3 - c3)
+        self.assertTrue(numeric_zero(e) == z, fs)
+        return
+
+    def test_assumption_context(self):
+        fs = 'assumption_context  FAIL'
+        ctx = assumption_context()
+        ctx.add(sp.Q.positive(d_1))
+        ctx.add(sp.Q.positive(d_1))
+        self.assertTrue(len(ctx) == 1, fs)
+        self.assertTrue(ctx.ask(sp.Q.nonzero(d_1)), fs)
+        self.assertTrue(ctx.refine(sp.sqrt(d_1**2)) == d_1, fs)
+        self.assertTrue(assumption_context().refine(sp.sqrt(d_1**2)) == sp.sqrt(d_1**2), fs)
+        ctx.clear()
+        self.assertTrue(ctx.ask(sp.Q.nonzero(d_1)) is None, fs)
+        return
         
 
 #
@@ -36,9 +36,11 @@ sys.path.append('../ikbtfunctions')   # allow this test to go 'up' to project ma
 
 from ikbtfunctions.helperfunctions import *
 from tests.helpertest import *    # had to separate tests form helperfunctions b/c of circular imports
+from tests.b3test import *
 
 from ikbtbasics.kin_cl import *
 from ikbtbasics.ik_classes import *     # special classes for Inverse kinematics in sympy
+from ikbtbasics.fk_cache import kinematics_cache
 
 from ikbtleaves.algebra_solver import *
 from ikbtleaves.sinANDcos_solver import *
@@ -47,6 +49,7 @@ from ikbtleaves.tan_solver import *
 from ikbtleaves.sub_transform import *
 from ikbtleaves.updateL import *
 from ikbtleaves.x2y2_transform import *
+from ikbtleaves.expand_leaf import *
 
 
 import b3 as b3          # behavior trees
@@ -193,16 +196,13 @@ class TestIkClass(unittest.TestCase):
         robot = 'SOA Test Robot'
 
         testing = False  # not using this now
-        [m, R, tmpvars] = kinematics_pickle(robot, dh, params, pvals, vv, variables, testing)
+        [m, R, tmpvars] = kinematics_cache(robot, dh, params, pvals, vv, variables, testing)
         print('GOT HERE: robot name: ', R.name)
 
         variables = tmpvars
         R.name = robot
         R.params = params
 
-        ##   check the pickle in case DH params were changed
-        check_the_pickle(m.DH, dh)   # check that two mechanisms have identical DH params
-
         print('\n the variables: ', variables)
         assert len(variables) == 9, 'wrong number of variables'
         print('\n\n')
@@ -414,7 +414,9 @@ if __name__ == '__main__':
     suite3 = unittest.TestLoader().loadTestsFromTestCase(TestSolver006)  # sub_transform.py
     suite3.addTest(TestSolver010())   # x2y2_transform.py
     suite3.addTest(TestSolver007())   # updateL.py  # updating matrix equation lists
+    suite3.addTest(TestSolver014())   # expand_leaf.py  # lazy matrix equation set
     suite1.addTest(TestSolver009())   # helperfunctions.py
+    suite1.addTest(TestSolver013())   # b3 additions (tests/b3test.py)
 
     if(not HTML):
         print('\n\n>>>>>>>>>>>>>>>>>>>>  Test ik_classes >>>>>>>>>>>>>>>>>>>>\n')
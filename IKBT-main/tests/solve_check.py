@@ -0,0 +1,77 @@
+#!/usr/bin/python
+#
+#  Whole-solve regression check
+#
+#  This test performs the following for each robot (default: Puma):
+#
+#  1) run the full solver (ikSolver.py <robot>) and time it
+#  2) compare the generated Python IK code (CodeGen/Python/IK_equations<robot>.py)
+#          with the reference copy in tests/solve_reference/
+#  3) compare the solve time with the reference time
+#
+#  The first run for a robot (no reference yet) stores the reference, so
+#  run it once on a known good version before changing any solver leaves
+#  (e.g. x2z2_transform, sub_transform), then again after the change.
+#
+#  Running instructions:
+#
+#   > cd IKBT/
+#   > python -m tests.solve_check                  (Puma)
+#   > python -m tests.solve_check Puma Kawasaki    (any robots in ik_robots.py)
+#
+#  Remove tests/solve_reference/<robot>* to record a new reference.
+#
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+
+REFERENCE_DIR = 'tests/solve_reference/'
+CODE_DIR = 'CodeGen/Python/'
+TIME_FACTOR = 1.5     # slower than this * reference time: FAIL
+
+def solve_check(robot):
+    t0 = time.perf_counter()
+    result = subprocess.run([sys.executable, 'ikSolver.py', robot],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    seconds = time.perf_counter() - t0
+    if result.returncode != 0:
+        print(result.stderr)
+        print(robot, ': solver FAILED')
+        return False
+
+    code = CODE_DIR + 'IK_equations' + robot + '.py'
+    ref_code = REFERENCE_DIR + robot + '_IK_equations.py'
+    ref_time = REFERENCE_DIR + robot + '_time.json'
+    if not os.path.isfile(ref_code):
+        os.makedirs(REFERENCE_DIR, exist_ok=True)
+        shutil.copyfile(code, ref_code)
+        with open(ref_time, 'w') as f:
+            json.dump({'seconds': seconds}, f)
+        print(robot, ': reference stored ({:.1f} s)'.format(seconds))
+        return True
+
+    ok = True
+    with open(code) as f:
+        new = f.read()
+    with open(ref_code) as f:
+        ref = f.read()
+    if new != ref:
+        print(robot, ': generated code differs from ', ref_code)
+        ok = False
+    with open(ref_time) as f:
+        t_ref = json.load(f)['seconds']
+    print(robot, ': solve time {:.1f} s (reference {:.1f} s)'.format(seconds, t_ref))
+    if seconds > TIME_FACTOR * t_ref:
+        print(robot, ': solve time FAIL')
+        ok = False
+    print(robot, ': ', 'OK' if ok else 'FAIL')
+    return ok
+
+if __name__ == '__main__':
+    robots = sys.argv[1:] or ['Puma']
+    results = [solve_check(r) for r in robots]
+    if not all(results):
+        sys.exit(1)